@@ -0,0 +1,259 @@
+import itertools
+import json
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+from config import Config
+from database import db_connection
+
+CANAL = "agendamentos_eventos"
+
+
+class Assinante:
+    def __init__(self, tamanho_fila):
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        # Marcado quando a fila enche: o stream é encerrado e o navegador reconecta
+        # com Last-Event-ID, retomando pelo buffer em vez de travar o publicador.
+        self.atrasado = False
+
+
+class Broadcaster:
+    """
+    Distribui eventos para os streams SSE abertos neste processo.
+    Guarda os últimos eventos, na ordem de chegada, para retomada via Last-Event-ID.
+    """
+
+    def __init__(self, tamanho_buffer, tamanho_fila):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=tamanho_buffer)
+        self._ids = set()
+        self._assinantes = set()
+        self._tamanho_fila = tamanho_fila
+
+    def distribuir(self, evento):
+        with self._lock:
+            if evento["id"] in self._ids:
+                return  # já recebido (ex.: entregue localmente e depois via NOTIFY)
+            if len(self._buffer) == self._buffer.maxlen:
+                self._ids.discard(self._buffer[0]["id"])
+            self._buffer.append(evento)
+            self._ids.add(evento["id"])
+            assinantes = list(self._assinantes)
+
+        for a in assinantes:
+            if a.atrasado:
+                continue
+            try:
+                a.fila.put_nowait(evento)
+            except queue.Full:
+                a.atrasado = True
+
+    def assinar(self, ultimo_id=None):
+        """
+        Retorna (assinante, pendentes, completo). pendentes são os eventos do buffer
+        depois de ultimo_id; completo=False quando o buffer já não tem esse id.
+        """
+        a = Assinante(self._tamanho_fila)
+        with self._lock:
+            self._assinantes.add(a)
+            if ultimo_id is None:
+                return a, [], True
+            if ultimo_id not in self._ids:
+                return a, [], False
+            eventos = list(self._buffer)
+            posicao = next(i for i, e in enumerate(eventos) if e["id"] == ultimo_id)
+            return a, eventos[posicao + 1:], True
+
+    def cancelar(self, assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+
+broadcaster = Broadcaster(Config.EVENTOS_BUFFER, Config.EVENTOS_FILA_MAX)
+
+_ids_locais = itertools.count(1)
+# Outros canais escutados pela mesma conexão: canal -> (ao_notificar(payload), ao_conectar())
+_canais_extras = {}
+_listener_pid = None
+_listener_ok = threading.Event()
+_listener_lock = threading.Lock()
+_streams_abertos = 0
+_streams_lock = threading.Lock()
+
+
+def _usar_postgres():
+    return Config.EVENTOS_BACKEND == "postgres"
+
+
+def _escutar():
+    """Thread: LISTEN no canal e repassa cada NOTIFY ao broadcaster. Reconecta sozinha."""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(Config.DATABASE_URL, sslmode="require")
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {CANAL};")
+            for canal, (_, ao_conectar) in _canais_extras.items():
+                conn.cursor().execute(f"LISTEN {canal};")
+                # Avisos enviados enquanto estávamos desconectados foram perdidos
+                if ao_conectar is not None:
+                    ao_conectar()
+            _listener_ok.set()
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    conn.cursor().execute("SELECT 1")  # mantém a conexão viva
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    if n.channel != CANAL:
+                        _repassar(n)
+                        continue
+                    try:
+                        broadcaster.distribuir(json.loads(n.payload))
+                    except ValueError:
+                        pass
+        except Exception as e:
+            _listener_ok.clear()
+            print(f"⚠️ Listener de eventos desconectado, nova tentativa em 5 s: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+
+
+def _repassar(notificacao):
+    ao_notificar = _canais_extras.get(notificacao.channel, (None, None))[0]
+    if ao_notificar is None:
+        return
+    try:
+        ao_notificar(notificacao.payload)
+    except Exception as e:
+        # Um handler com erro não pode derrubar a thread que atende os streams SSE
+        print(f"⚠️ Erro tratando NOTIFY em {notificacao.channel}: {e}")
+
+
+def escutar_canal(canal, ao_notificar, ao_conectar=None):
+    """
+    Inclui outro canal de NOTIFY no listener deste processo. Registrar na subida
+    da aplicação (create_app), antes de iniciar_listener(). ao_conectar é chamado a
+    cada (re)conexão, para o interessado descartar o que pode ter perdido.
+    """
+    _canais_extras[canal] = (ao_notificar, ao_conectar)
+
+
+def listener_ativo():
+    return _listener_ok.is_set()
+
+
+def iniciar_listener():
+    """Sobe a thread de LISTEN uma vez por processo (depois do fork do gunicorn)."""
+    global _listener_pid
+    if not _usar_postgres():
+        return
+    pid = os.getpid()
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+        threading.Thread(target=_escutar, name="eventos-listener", daemon=True).start()
+    _listener_ok.wait(timeout=2)
+
+
+def publicar(tipo, dados):
+    """
+    Publica um evento de agendamento. Chamar DEPOIS do commit.
+
+    Com EVENTOS_BACKEND=postgres o evento sai via NOTIFY, com id da sequence
+    agendamentos_eventos_seq, e chega a todos os workers. Se o listener deste
+    processo não estiver de pé, o evento também é entregue localmente.
+    Com EVENTOS_BACKEND=local a entrega fica só neste processo.
+
+    Melhor esforço: a escrita já foi commitada, então uma falha aqui só vai para o
+    log (None). Um 500 faria o cliente repetir a operação; o admin se recupera pelo
+    feed de alterações.
+    """
+    if not _usar_postgres():
+        evento = {"id": next(_ids_locais), "tipo": tipo, "dados": dados}
+        broadcaster.distribuir(evento)
+        return evento
+
+    try:
+        iniciar_listener()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                WITH ev AS (
+                    SELECT json_build_object(
+                        'id', nextval('agendamentos_eventos_seq'),
+                        'tipo', %s::text,
+                        'dados', %s::json
+                    ) AS e
+                )
+                SELECT pg_notify(%s, e::text), e::text AS evento FROM ev
+                """,
+                (tipo, json.dumps(dados, default=str), CANAL),
+            )
+            evento = json.loads(cur.fetchone()["evento"])
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ Evento {tipo} não publicado: {e}")
+        return None
+
+    if not _listener_ok.is_set():
+        broadcaster.distribuir(evento)
+    return evento
+
+
+def reservar_stream():
+    """Vaga para mais um stream neste worker (EVENTOS_STREAMS_MAX); liberar com liberar_stream()."""
+    global _streams_abertos
+    with _streams_lock:
+        if _streams_abertos >= Config.EVENTOS_STREAMS_MAX:
+            return False
+        _streams_abertos += 1
+        return True
+
+
+def liberar_stream():
+    global _streams_abertos
+    with _streams_lock:
+        _streams_abertos -= 1
+
+
+def formatar(evento):
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento['dados'], default=str)}\n\n"
+
+
+def stream(ultimo_id=None):
+    """Gerador SSE: retomada, heartbeat e limite de duração por conexão."""
+    iniciar_listener()
+    assinante, pendentes, completo = broadcaster.assinar(ultimo_id)
+    fim = time.monotonic() + Config.EVENTOS_DURACAO_MAX
+
+    try:
+        yield f"retry: {Config.EVENTOS_RETRY_MS}\n\n"
+        if not completo:
+            # Perdemos eventos: o cliente deve recarregar a lista inteira
+            yield "event: recarregar\ndata: {}\n\n"
+        for evento in pendentes:
+            yield formatar(evento)
+
+        while time.monotonic() < fim and not assinante.atrasado:
+            try:
+                evento = assinante.fila.get(timeout=Config.EVENTOS_HEARTBEAT)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield formatar(evento)
+    finally:
+        broadcaster.cancelar(assinante)
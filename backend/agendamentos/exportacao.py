@@ -0,0 +1,89 @@
+"""
+Exportação de agendamentos em CSV ou NDJSON (/api/admin/agendamentos/exportar).
+
+As linhas saem de um cursor do lado do servidor (named cursor), em lotes de
+TAMANHO_LOTE: a memória usada não depende do tamanho do histórico.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from database import db_connection
+
+TAMANHO_LOTE = 2000
+
+# Mesmas colunas aceitas pela importação (id sai para referência; na importação é ignorado)
+COLUNAS = [
+    "id", "nome", "telefone", "servico", "data", "horario", "valor", "status",
+    "forma_pagamento", "data_pagamento", "pago", "created_at",
+]
+_SELECT = """
+    SELECT id, nome, telefone, servico, data::text AS data, TO_CHAR(horario, 'HH24:MI') AS horario,
+           valor, status, forma_pagamento, data_pagamento::text AS data_pagamento, pago, created_at
+    FROM agendamentos
+"""
+
+FORMATOS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def _json_padrao(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _formatar_csv(rows, buffer, escritor):
+    for row in rows:
+        escritor.writerow([row[c] for c in COLUNAS])
+    texto = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return texto
+
+
+def _formatar_ndjson(rows):
+    return "".join(json.dumps(row, default=_json_padrao, ensure_ascii=False) + "\n" for row in rows)
+
+
+def gerar(formato, data_inicio=None, data_fim=None, status=None):
+    """Gerador de pedaços de texto do arquivo, do agendamento mais antigo para o mais novo."""
+    where = ["1=1"]
+    params = []
+    if data_inicio:
+        where.append("data >= %s")
+        params.append(data_inicio)
+    if data_fim:
+        where.append("data <= %s")
+        params.append(data_fim)
+    if status:
+        where.append("status = %s")
+        params.append(status)
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    if formato == "csv":
+        escritor.writerow(COLUNAS)
+        yield _formatar_csv([], buffer, escritor)
+
+    with db_connection() as conn:
+        # Named cursor só existe dentro de transação; o pool faz rollback na devolução
+        cur = conn.cursor(name="exportar_agendamentos")
+        cur.itersize = TAMANHO_LOTE
+        cur.execute(
+            f"{_SELECT} WHERE {' AND '.join(where)} ORDER BY data, horario, id",
+            tuple(params),
+        )
+        while True:
+            rows = cur.fetchmany(TAMANHO_LOTE)
+            if not rows:
+                break
+            yield _formatar_csv(rows, buffer, escritor) if formato == "csv" else _formatar_ndjson(rows)
+        cur.close()
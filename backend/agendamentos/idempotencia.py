@@ -0,0 +1,133 @@
+"""
+Idempotency-Key do POST /api/agendar.
+
+A resposta 201 de cada chave fica na tabela idempotencia_agendamentos (vale para
+todos os workers) e num LRU em memória (repetição no mesmo worker não abre conexão).
+
+A chave é inserida no início da transação do agendamento: uma requisição
+duplicada concorrente fica esperando no INSERT da chave até a primeira terminar;
+se a primeira commitou, devolve a mesma resposta; se deu rollback (conflito de
+horário), segue normalmente.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2.extras
+from flask import jsonify
+
+from config import Config
+from database import db_connection
+
+TAMANHO_MAXIMO_CHAVE = 255
+LIMPEZA_LOTE = 100  # chaves vencidas apagadas por agendamento
+
+_lock = threading.Lock()
+# chave -> (hash da requisição, status, corpo, expira_em em time.monotonic())
+_memo = OrderedDict()
+
+
+def hash_requisicao(dados):
+    """Impressão digital do corpo: mesma chave com outros dados é erro do cliente."""
+    bruto = json.dumps(dados, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+def lembrar(chave, hash_req, status, corpo):
+    with _lock:
+        _memo[chave] = (hash_req, status, corpo, time.monotonic() + Config.IDEMPOTENCIA_TTL_HORAS * 3600)
+        _memo.move_to_end(chave)
+        while len(_memo) > Config.IDEMPOTENCIA_CACHE_TAMANHO:
+            _memo.popitem(last=False)
+
+
+def _consultar(cur, chave):
+    cur.execute(
+        """
+        SELECT hash_requisicao, status, resposta
+        FROM idempotencia_agendamentos
+        WHERE chave = %s AND status IS NOT NULL
+        """,
+        (chave,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    lembrar(chave, row["hash_requisicao"], row["status"], row["resposta"])
+    return row["hash_requisicao"], row["status"], row["resposta"]
+
+
+def buscar(chave):
+    """(hash, status, corpo) já gravado para a chave, ou None. Olha o LRU antes do banco."""
+    with _lock:
+        item = _memo.get(chave)
+        if item is not None and item[3] > time.monotonic():
+            _memo.move_to_end(chave)
+            return item[:3]
+
+    with db_connection() as conn:
+        return _consultar(conn.cursor(), chave)
+
+
+def registrar(cur, chave, hash_req):
+    """
+    Reserva a chave dentro da transação do agendamento. Espera outra transação com a
+    mesma chave terminar; False se ela já tinha commitado (a resposta está gravada).
+    """
+    cur.execute(
+        """
+        INSERT INTO idempotencia_agendamentos (chave, hash_requisicao)
+        VALUES (%s, %s)
+        ON CONFLICT (chave) DO NOTHING
+        RETURNING chave
+        """,
+        (chave, hash_req),
+    )
+    return cur.fetchone() is not None
+
+
+def buscar_apos_conflito(cur, chave):
+    """Resposta gravada pela transação que ganhou a chave (chamar depois do rollback)."""
+    return _consultar(cur, chave)
+
+
+def salvar(cur, chave, status, corpo):
+    """Grava a resposta na mesma transação do agendamento (lembrar() só depois do commit)."""
+    cur.execute(
+        "UPDATE idempotencia_agendamentos SET status = %s, resposta = %s WHERE chave = %s",
+        (status, psycopg2.extras.Json(corpo), chave),
+    )
+
+
+def limpar_expiradas(cur):
+    """
+    Apaga até LIMPEZA_LOTE chaves com mais de IDEMPOTENCIA_TTL_HORAS, na transação do
+    agendamento: cada agendamento grava no máximo uma chave, então a tabela não cresce.
+    SKIP LOCKED: dois agendamentos ao mesmo tempo não disputam as mesmas linhas.
+    """
+    cur.execute(
+        """
+        DELETE FROM idempotencia_agendamentos
+        WHERE chave IN (
+            SELECT chave FROM idempotencia_agendamentos
+            WHERE created_at < NOW() - MAKE_INTERVAL(hours => %s)
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        """,
+        (Config.IDEMPOTENCIA_TTL_HORAS, LIMPEZA_LOTE),
+    )
+
+
+def repetir(salvo, hash_req):
+    hash_salvo, status, corpo = salvo
+    if hash_salvo != hash_req:
+        return jsonify({"error": "Idempotency-Key já usada com outros dados"}), 422
+    resposta = jsonify(corpo)
+    resposta.status_code = status
+    resposta.headers["Idempotent-Replayed"] = "true"
+    return resposta
@@ -0,0 +1,347 @@
+"""
+Importação em lote de agendamentos (/api/admin/agendamentos/importar).
+
+O arquivo (CSV com cabeçalho ou NDJSON) vai direto do corpo da requisição para uma
+tabela temporária via COPY FROM STDIN, sem montar as linhas em memória. A validação
+é feita em SQL sobre a tabela inteira:
+
+- campos obrigatórios e tipos (data, horário, valor, pago...);
+- data/horário repetido no arquivo ou já existente em agendamentos;
+- sobreposição de agendamentos ativos (mesma regra de horarios_ocupados_sem_sobreposicao),
+  contra o banco e entre as linhas do arquivo.
+
+Linhas válidas são inseridas num INSERT ... SELECT só; as rejeitadas voltam no relatório.
+"""
+
+import csv
+import io
+import json
+
+import psycopg2
+
+from database import db_connection
+
+OBRIGATORIAS = ["nome", "telefone", "servico", "data", "horario", "valor"]
+OPCIONAIS = ["status", "forma_pagamento", "data_pagamento", "pago", "created_at"]
+COLUNAS = ["id"] + OBRIGATORIAS + OPCIONAIS
+MAXIMO_ERROS = 100  # linhas rejeitadas listadas no relatório
+TAMANHO_BLOCO = 64 * 1024
+
+
+class ArquivoInvalidoError(ValueError):
+    """Arquivo que não dá para carregar (cabeçalho, CSV ou JSON malformado)."""
+
+
+def _coluna_staging(coluna):
+    # id do sistema de origem só serve para identificar a linha no relatório
+    return "id_origem" if coluna == "id" else coluna
+
+
+def _ler_cabecalho_csv(stream):
+    linha = stream.readline().decode("utf-8-sig").strip()
+    if not linha:
+        raise ArquivoInvalidoError("Arquivo vazio")
+    # Excel em pt-BR salva CSV com ";"
+    separador = ";" if linha.count(";") > linha.count(",") else ","
+    colunas = [c.strip().lower() for c in next(csv.reader([linha], delimiter=separador))]
+
+    desconhecidas = [c for c in colunas if c not in COLUNAS]
+    if desconhecidas:
+        raise ArquivoInvalidoError(f"Colunas desconhecidas: {', '.join(desconhecidas)}")
+    faltando = [c for c in OBRIGATORIAS if c not in colunas]
+    if faltando:
+        raise ArquivoInvalidoError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+    if len(set(colunas)) != len(colunas):
+        raise ArquivoInvalidoError("Coluna repetida no cabeçalho")
+    return colunas, separador
+
+
+class _NdjsonComoCsv:
+    """Arquivo para o copy_expert: converte NDJSON em linhas CSV conforme o COPY lê."""
+
+    def __init__(self, stream):
+        self._blocos = self._gerar(stream)
+        self._pendente = bytearray()
+        self.erro = None  # o psycopg2 troca a exceção do read() por QueryCanceled
+
+    def _gerar(self, stream):
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator="\n")
+        registro = 0
+        for linha in stream:
+            linha = linha.strip()
+            if not linha:
+                continue
+            registro += 1
+            try:
+                obj = json.loads(linha)
+            except ValueError:
+                raise ArquivoInvalidoError(f"Registro {registro}: JSON inválido")
+            if not isinstance(obj, dict):
+                raise ArquivoInvalidoError(f"Registro {registro}: esperado um objeto JSON")
+            desconhecidas = [k for k in obj if k not in COLUNAS]
+            if desconhecidas:
+                raise ArquivoInvalidoError(f"Registro {registro}: colunas desconhecidas: {', '.join(desconhecidas)}")
+
+            # None vira campo vazio sem aspas, que o COPY lê como NULL
+            escritor.writerow([
+                ("true" if v else "false") if isinstance(v, bool) else v
+                for v in (obj.get(c) for c in COLUNAS)
+            ])
+            if buffer.tell() >= TAMANHO_BLOCO:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._pendente) < tamanho:
+            try:
+                bloco = next(self._blocos, None)
+            except ArquivoInvalidoError as e:
+                self.erro = e
+                raise
+            if bloco is None:
+                break
+            self._pendente += bloco
+        if tamanho < 0:
+            tamanho = len(self._pendente)
+        dados = bytes(self._pendente[:tamanho])
+        del self._pendente[:tamanho]
+        return dados
+
+
+def _texto(coluna):
+    return f"NULLIF(TRIM({coluna}), '')"
+
+
+def _pago(coluna):
+    # "sim"/"não" além do que o boolean do PostgreSQL aceita (true/false, t/f, 1/0...)
+    return f"""CASE LOWER({_texto(coluna)})
+        WHEN 'sim' THEN 'true' WHEN 's' THEN 'true' WHEN 'não' THEN 'false' WHEN 'nao' THEN 'false'
+        ELSE {_texto(coluna)} END"""
+
+
+_CRIAR_STAGING = """
+    CREATE TEMP TABLE importacao_agendamentos (
+        registro SERIAL,
+        id_origem TEXT, nome TEXT, telefone TEXT, servico TEXT, data TEXT, horario TEXT, valor TEXT,
+        status TEXT, forma_pagamento TEXT, data_pagamento TEXT, pago TEXT, created_at TEXT,
+        erro TEXT,
+        v_data DATE, v_horario TIME, v_valor NUMERIC, v_data_pagamento DATE, v_pago BOOLEAN,
+        v_created_at TIMESTAMP, v_status TEXT, periodo TSRANGE
+    ) ON COMMIT DROP
+"""
+
+# Cada passo só olha linhas ainda sem erro; a primeira causa encontrada fica registrada
+_VALIDACOES = [
+    f"""
+    UPDATE importacao_agendamentos SET erro = CASE
+        WHEN {_texto('nome')} IS NULL OR {_texto('telefone')} IS NULL OR {_texto('servico')} IS NULL
+          OR {_texto('data')} IS NULL OR {_texto('horario')} IS NULL OR {_texto('valor')} IS NULL
+        THEN 'Campos obrigatórios ausentes (nome, telefone, servico, data, horario, valor)'
+        ELSE agendamentos_importacao_erro(
+            {_texto('data')}, {_texto('horario')}, {_texto('valor')},
+            {_texto('data_pagamento')}, {_pago('pago')}, {_texto('created_at')}
+        )
+    END
+    """,
+    # Duração calculada uma vez por texto de serviço distinto (são poucos)
+    f"""
+    UPDATE importacao_agendamentos i SET
+        v_data = {_texto('i.data')}::date,
+        v_horario = {_texto('i.horario')}::time,
+        v_valor = {_texto('i.valor')}::numeric,
+        v_data_pagamento = {_texto('i.data_pagamento')}::date,
+        v_pago = COALESCE(({_pago('i.pago')})::boolean, FALSE),
+        v_created_at = {_texto('i.created_at')}::timestamp,
+        v_status = COALESCE({_texto('i.status')}, 'pendente'),
+        periodo = TSRANGE(
+            {_texto('i.data')}::date + {_texto('i.horario')}::time,
+            {_texto('i.data')}::date + {_texto('i.horario')}::time + MAKE_INTERVAL(mins => d.duracao)
+        )
+    FROM (
+        SELECT servico, agendamentos_duracao_servico(servico) AS duracao
+        FROM (SELECT DISTINCT servico FROM importacao_agendamentos WHERE erro IS NULL) s
+    ) d
+    WHERE i.erro IS NULL AND i.servico = d.servico
+    """,
+    "ANALYZE importacao_agendamentos",
+    """
+    UPDATE importacao_agendamentos i SET erro = 'Data/horário repetido no arquivo (registro ' || d.primeiro || ')'
+    FROM (
+        SELECT registro, MIN(registro) OVER (PARTITION BY v_data, v_horario) AS primeiro
+        FROM importacao_agendamentos
+        WHERE erro IS NULL
+    ) d
+    WHERE i.registro = d.registro AND d.registro <> d.primeiro
+    """,
+    """
+    UPDATE importacao_agendamentos i SET erro = 'Já existe agendamento nesta data/horário (id ' || a.id || ')'
+    FROM agendamentos a
+    WHERE i.erro IS NULL AND a.data = i.v_data AND a.horario = i.v_horario
+    """,
+    """
+    UPDATE importacao_agendamentos i SET erro = 'Sobrepõe agendamento existente'
+    WHERE i.erro IS NULL AND i.v_status IN ('pendente', 'confirmado')
+      AND EXISTS (
+          SELECT 1 FROM agendamentos a
+          WHERE a.status IN ('pendente', 'confirmado')
+            AND TSRANGE(LOWER(a.periodo), UPPER(a.periodo) + INTERVAL '30 minutes')
+                && TSRANGE(LOWER(i.periodo), UPPER(i.periodo) + INTERVAL '30 minutes')
+      )
+    """,
+    # Entre as linhas do arquivo: ordenado pelo início, sobrepõe se começa antes do
+    # maior fim (com a folga) das anteriores
+    """
+    UPDATE importacao_agendamentos i SET erro = 'Sobrepõe outro agendamento do arquivo'
+    FROM (
+        SELECT registro,
+               LOWER(periodo) < MAX(UPPER(periodo) + INTERVAL '30 minutes') OVER (
+                   ORDER BY LOWER(periodo), registro ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS sobrepoe
+        FROM importacao_agendamentos
+        WHERE erro IS NULL AND v_status IN ('pendente', 'confirmado')
+    ) o
+    WHERE i.registro = o.registro AND o.sobrepoe
+    """,
+]
+
+# Clientes num upsert só (o trigger clientes_vincular faria um por linha), com a
+# mesma regra de clientes_upsert: nome e telefone do agendamento mais recente
+_CLIENTES = """
+    INSERT INTO clientes (telefone_normalizado, telefone, nome, nome_busca, ultimo_agendamento)
+    SELECT DISTINCT ON (telefone_normalizado)
+           telefone_normalizado, telefone, nome, clientes_normalizar_nome(nome), quando
+    FROM (
+        SELECT clientes_normalizar_telefone(TRIM(telefone)) AS telefone_normalizado,
+               TRIM(telefone) AS telefone, TRIM(nome) AS nome,
+               COALESCE(v_created_at, LOCALTIMESTAMP) AS quando, registro
+        FROM importacao_agendamentos
+        WHERE erro IS NULL
+    ) i
+    WHERE telefone_normalizado <> ''
+    ORDER BY telefone_normalizado, quando DESC, registro DESC
+    ON CONFLICT (telefone_normalizado) DO UPDATE SET
+        telefone = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                        THEN EXCLUDED.telefone ELSE clientes.telefone END,
+        nome = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                    THEN EXCLUDED.nome ELSE clientes.nome END,
+        nome_busca = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                          THEN EXCLUDED.nome_busca ELSE clientes.nome_busca END,
+        ultimo_agendamento = GREATEST(clientes.ultimo_agendamento, EXCLUDED.ultimo_agendamento)
+"""
+
+_INSERIR = f"""
+    WITH novos AS (
+        INSERT INTO agendamentos (nome, telefone, servico, data, horario, valor, status,
+                                  forma_pagamento, data_pagamento, pago, created_at, cliente_id)
+        SELECT TRIM(i.nome), TRIM(i.telefone), TRIM(i.servico), i.v_data, i.v_horario, i.v_valor, i.v_status,
+               COALESCE({_texto('i.forma_pagamento')}, 'pendente'), i.v_data_pagamento, i.v_pago,
+               COALESCE(i.v_created_at, CURRENT_TIMESTAMP), c.id
+        FROM importacao_agendamentos i
+        LEFT JOIN clientes c ON c.telefone_normalizado = clientes_normalizar_telefone(TRIM(i.telefone))
+        WHERE i.erro IS NULL
+        ORDER BY i.registro
+        RETURNING id
+    )
+    SELECT COUNT(*)::int AS inseridos, MIN(id) AS primeiro_id, MAX(id) AS ultimo_id FROM novos
+"""
+
+
+def importar(stream, formato, simular=False):
+    """
+    Carrega o arquivo e devolve o relatório. Com simular=True só valida (rollback no fim).
+    Levanta ArquivoInvalidoError se o arquivo não puder ser lido.
+    """
+    with db_connection() as conn:
+        relatorio = importar_na_transacao(conn, stream, formato, simular)
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+    return relatorio
+
+
+def importar_na_transacao(conn, stream, formato, simular=False):
+    """
+    Como importar(), mas na transação de quem chama, sem commit (a migração do SQLite
+    grava o checkpoint do lote junto). Em ArquivoInvalidoError a transação já voltou.
+    """
+    if formato == "csv":
+        colunas, separador = _ler_cabecalho_csv(stream)
+        arquivo = stream
+    else:
+        colunas, separador = COLUNAS, ","
+        arquivo = _NdjsonComoCsv(stream)
+
+    cur = conn.cursor()
+    cur.execute(_CRIAR_STAGING)
+    try:
+        cur.copy_expert(
+            f"COPY importacao_agendamentos ({', '.join(_coluna_staging(c) for c in colunas)}) "
+            f"FROM STDIN WITH (FORMAT csv, DELIMITER '{separador}')",
+            arquivo,
+            size=TAMANHO_BLOCO,
+        )
+    except psycopg2.DataError as e:
+        conn.rollback()
+        contexto = f" ({e.diag.context.strip()})" if e.diag.context else ""
+        raise ArquivoInvalidoError(f"{e.diag.message_primary}{contexto}")
+    except psycopg2.OperationalError:
+        conn.rollback()
+        if getattr(arquivo, "erro", None):
+            raise arquivo.erro
+        raise
+
+    for sql in _VALIDACOES:
+        cur.execute(sql)
+
+    cur.execute(
+        """
+        SELECT COUNT(*)::int AS total, COUNT(*) FILTER (WHERE erro IS NOT NULL)::int AS rejeitados
+        FROM importacao_agendamentos
+        """
+    )
+    contagem = cur.fetchone()
+    cur.execute(
+        """
+        SELECT registro, id_origem, erro
+        FROM importacao_agendamentos
+        WHERE erro IS NOT NULL
+        ORDER BY registro
+        LIMIT %s
+        """,
+        (MAXIMO_ERROS,),
+    )
+    erros = cur.fetchall()
+    cur.execute(
+        """
+        SELECT erro, COUNT(*)::int AS quantidade
+        FROM importacao_agendamentos
+        WHERE erro IS NOT NULL
+        GROUP BY erro
+        ORDER BY quantidade DESC
+        LIMIT 20
+        """
+    )
+    motivos = cur.fetchall()
+
+    inseridos = 0
+    if not simular and contagem["total"] > contagem["rejeitados"]:
+        cur.execute(_CLIENTES)
+        cur.execute(_INSERIR)
+        novos = cur.fetchone()
+        inseridos = novos["inseridos"]
+        # Itens (agendamento_servicos) a partir do texto, como na migração
+        cur.execute("SELECT agendamento_servicos_gerar(%s, %s)", (novos["primeiro_id"], novos["ultimo_id"] + 1))
+
+    return {
+        "simulacao": simular,
+        "total": contagem["total"],
+        "validos": contagem["total"] - contagem["rejeitados"],
+        "inseridos": inseridos,
+        "rejeitados": contagem["rejeitados"],
+        "motivos": motivos,
+        "erros": erros,
+    }
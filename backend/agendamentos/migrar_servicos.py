@@ -0,0 +1,44 @@
+"""
+Gera agendamento_servicos para os agendamentos gravados antes da tabela existir.
+
+Processa faixas de ids em transações curtas; agendamentos novos já são gravados
+com os itens. Pode ser rodado de novo: só gera itens para quem ainda não tem.
+
+Uso (dentro de backend/):
+    python -m agendamentos.migrar_servicos [tamanho_do_lote]
+"""
+
+import sys
+import time
+
+from database import db_connection
+
+LOTE_PADRAO = 5000
+PAUSA_ENTRE_LOTES = 0.05  # segundos, para não disputar I/O com o tráfego normal
+
+
+def executar(lote=LOTE_PADRAO):
+    migrados = 0
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT MIN(id) AS inicio, MAX(id) AS fim FROM agendamentos")
+        faixa = cur.fetchone()
+        conn.commit()
+
+        if faixa["inicio"] is None:
+            return 0
+
+        for inicio in range(faixa["inicio"], faixa["fim"] + 1, lote):
+            cur.execute("SELECT agendamento_servicos_gerar(%s, %s) AS total", (inicio, inicio + lote))
+            migrados += cur.fetchone()["total"]
+            conn.commit()
+            time.sleep(PAUSA_ENTRE_LOTES)
+
+    return migrados
+
+
+if __name__ == "__main__":
+    lote = int(sys.argv[1]) if len(sys.argv) > 1 else LOTE_PADRAO
+    inicio = time.time()
+    migrados = executar(lote)
+    print(f"✅ agendamento_servicos: {migrados} agendamento(s) migrado(s) em {time.time() - inicio:.2f}s")
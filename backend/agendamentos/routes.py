@@ -1,61 +1,296 @@
-from flask import Blueprint, request, jsonify
+import secrets
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import psycopg2.extras
 from psycopg2 import IntegrityError
 
-from auth.decorators import admin_required
-from database import get_db_connection
+from agendamentos import eventos, exportacao, idempotencia, importacao
+from auth import sessoes
+from auth.decorators import admin_required, token_da_requisicao
+from config import Config
+from database import db_connection
+from horarios.logic import horario_valido, horarios_alternativos
+from servicos.cache import ids_servicos, mapa_servicos
+from utils import cursor as cursor_paginacao
 
 agendamentos_bp = Blueprint("agendamentos", __name__)
 
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+# Colunas que podem ser pedidas em ?fields=
+COLUNAS_LISTAGEM = {
+    "id": "id",
+    "nome": "nome",
+    "telefone": "telefone",
+    "servico": "servico",
+    "data": "data::text AS data",
+    "horario": "horario::text AS horario",
+    "valor": "valor",
+    "status": "status",
+    "forma_pagamento": "forma_pagamento",
+    "data_pagamento": "data_pagamento::text AS data_pagamento",
+    "pago": "pago",
+    "created_at": "created_at",
+}
+# Sempre selecionadas porque formam o cursor (data, horario, id)
+COLUNAS_CURSOR = ("id", "data", "horario")
+
+# Feed de alterações: o cursor é o xmin do snapshot (toda transação com id menor já
+# terminou) mais o horário, usado só para a retenção das remoções. Transação aberta
+# segura o cursor, por mais que demore para commitar; o cliente pode receber a mesma
+# linha duas vezes e deve tratar como upsert por id.
+MAXIMO_FEED = 1000
+RETENCAO_REMOVIDOS = timedelta(days=30)
+LIMPEZA_REMOVIDOS_LOTE = 500  # remoções vencidas apagadas por escrita
+
+
+def _codificar_cursor_feed(horizonte, momento):
+    return cursor_paginacao.codificar([str(horizonte), momento.isoformat()])
+
+
+def _decodificar_cursor_feed(cursor):
+    try:
+        horizonte, momento = cursor_paginacao.decodificar(cursor)
+        return int(horizonte), datetime.fromisoformat(momento)
+    except (ValueError, TypeError):
+        return None
+
+
+def _limpar_removidos(cur):
+    """
+    Apaga até LIMPEZA_REMOVIDOS_LOTE remoções mais velhas que RETENCAO_REMOVIDOS (o feed
+    já manda recarregar cursores dessa idade), dentro da transação de uma escrita.
+    """
+    cur.execute(
+        """
+        DELETE FROM agendamentos_removidos
+        WHERE id IN (
+            SELECT id FROM agendamentos_removidos
+            WHERE removido_em < NOW() - %s
+            ORDER BY removido_em
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        """,
+        (RETENCAO_REMOVIDOS, LIMPEZA_REMOVIDOS_LOTE),
+    )
+
+
+def _data_invalida(data_ag):
+    try:
+        datetime.strptime(data_ag, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return True
+    return False
+
+
+def _resposta_conflito(data_ag, horario, servicos, reserva=None):
+    # Chamar fora do "with db_connection()": horarios_alternativos pega outra conexão do pool
+    return jsonify({
+        "error": "Horário indisponível para os serviços escolhidos",
+        "data": data_ag,
+        "horario": horario,
+        "alternativas": horarios_alternativos(data_ag, horario, servicos, ignorar_reserva=reserva),
+    }), 409
+
+
+@agendamentos_bp.post("/api/reservas-horario")
+def criar_reserva_horario():
+    """
+    Segura data/horário por RESERVA_MINUTOS; o token vai em "reserva" no /api/agendar.
+    "substituir": token de uma reserva anterior do mesmo cliente, liberada junto.
+    """
+    data = request.get_json(silent=True) or {}
+    data_ag = data.get("data")
+    horario = data.get("horario")
+    servicos = data.get("servicos") or []
+    anterior = (data.get("substituir") or "").strip() or None
+
+    if not data_ag or not horario or not servicos:
+        return jsonify({"error": "Campos obrigatórios ausentes"}), 400
+    if _data_invalida(data_ag):
+        return jsonify({"error": "Data inválida"}), 400
+
+    catalogo = mapa_servicos()
+    for s in servicos:
+        if s not in catalogo:
+            return jsonify({"error": f"Serviço inválido: {s}"}), 400
+
+    if not horario_valido(data_ag, horario, servicos):
+        return _resposta_conflito(data_ag, horario, servicos, anterior)
+
+    params = {
+        "token": secrets.token_urlsafe(24),
+        "anterior": anterior,
+        "data": data_ag,
+        "horario": horario,
+        "duracao": sum(catalogo[s][1] for s in servicos),
+        "minutos": Config.RESERVA_MINUTOS,
+    }
+    row = None
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "DELETE FROM reservas_horario WHERE expira_em <= LOCALTIMESTAMP OR token = %(anterior)s",
+                params,
+            )
+            cur.execute(
+                """
+                INSERT INTO reservas_horario (token, data, horario, duracao_minutos, periodo, expira_em)
+                VALUES (%(token)s, %(data)s, %(horario)s::time, %(duracao)s,
+                        TSRANGE(%(data)s::date + %(horario)s::time,
+                                %(data)s::date + %(horario)s::time + MAKE_INTERVAL(mins => %(duracao)s)),
+                        LOCALTIMESTAMP + MAKE_INTERVAL(mins => %(minutos)s))
+                RETURNING expira_em
+                """,
+                params,
+            )
+            row = cur.fetchone()
+            conn.commit()
+        except IntegrityError:
+            # Agendamento ou outra reserva no horário (horarios_ocupados_sem_sobreposicao)
+            conn.rollback()
+
+    if not row:
+        return _resposta_conflito(data_ag, horario, servicos, anterior)
+    return jsonify({
+        "token": params["token"],
+        "expira_em": row["expira_em"].isoformat(),
+        "validade_segundos": Config.RESERVA_MINUTOS * 60,
+    }), 201
+
+
+@agendamentos_bp.delete("/api/reservas-horario/<token>")
+def cancelar_reserva_horario(token):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM reservas_horario WHERE token = %s RETURNING id", (token,))
+        row = cur.fetchone()
+        conn.commit()
+
+    if not row:
+        return jsonify({"error": "Reserva não encontrada"}), 404
+    return jsonify({"success": True}), 200
+
 
 @agendamentos_bp.post("/api/agendar")
 def criar_agendamento():
     data = request.get_json(silent=True) or {}
 
+    # Reenvio do mesmo formulário (conexão instável): devolve a resposta original
+    chave = (request.headers.get("Idempotency-Key") or "").strip() or None
+    if chave:
+        if len(chave) > idempotencia.TAMANHO_MAXIMO_CHAVE:
+            return jsonify({"error": "Idempotency-Key muito longa"}), 400
+        hash_req = idempotencia.hash_requisicao(data)
+        salvo = idempotencia.buscar(chave)
+        if salvo:
+            return idempotencia.repetir(salvo, hash_req)
+
     nome = (data.get("nome") or "").strip()
     telefone = (data.get("telefone") or "").strip()
     data_ag = data.get("data")
     horario = data.get("horario")
     servicos = data.get("servicos") or []
     servico_legacy = data.get("servico")
+    reserva = (data.get("reserva") or "").strip() or None  # token de /api/reservas-horario
 
     if not servicos and servico_legacy:
         servicos = [servico_legacy]
 
     if not nome or not telefone or not data_ag or not horario or not servicos:
         return jsonify({"error": "Campos obrigatórios ausentes"}), 400
-
-    conn = get_db_connection()
-    cur = conn.cursor()
+    if _data_invalida(data_ag):
+        return jsonify({"error": "Data inválida"}), 400
 
     # Soma valor dos serviços
-    cur.execute("SELECT nome, valor FROM servicos WHERE ativo = TRUE")
-    mapa_valor = {r["nome"]: float(r["valor"]) for r in cur.fetchall()}
-
+    catalogo = mapa_servicos()
     for s in servicos:
-        if s not in mapa_valor:
-            conn.close()
+        if s not in catalogo:
             return jsonify({"error": f"Serviço inválido: {s}"}), 400
 
-    valor_total = sum(mapa_valor[s] for s in servicos)
-    servicos_str = ", ".join(servicos)
-
-    try:
-        cur.execute(
-            """
-            INSERT INTO agendamentos (nome, telefone, servico, data, horario, valor, status, forma_pagamento, pago)
-            VALUES (%s, %s, %s, %s, %s::time, %s, 'pendente', 'pendente', FALSE)
-            RETURNING id
-            """,
-            (nome, telefone, servicos_str, data_ag, horario, valor_total),
-        )
-        new_id = cur.fetchone()["id"]
-        conn.commit()
-        return jsonify({"success": True, "agendamento_id": new_id, "valor": valor_total}), 201
-    except IntegrityError:
-        conn.rollback()
-        return jsonify({"error": "Horário já está agendado"}), 400
-    finally:
-        conn.close()
+    # Grade, almoço e bloqueios, considerando a duração dos serviços; a sobreposição
+    # com outros agendamentos/reservas é barrada pelo próprio INSERT abaixo
+    if not horario_valido(data_ag, horario, servicos):
+        return _resposta_conflito(data_ag, horario, servicos, reserva)
+
+    valor_total = sum(catalogo[s][0] for s in servicos)
+    params = {
+        "nome": nome,
+        "telefone": telefone,
+        "servico": ", ".join(servicos),
+        "data": data_ag,
+        "horario": horario,
+        "valor": valor_total,
+        "duracao": sum(catalogo[s][1] for s in servicos),
+    }
+
+    new_id = None
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            # Duplicata concorrente espera aqui até a primeira terminar
+            if chave and not idempotencia.registrar(cur, chave, hash_req):
+                conn.rollback()
+                salvo = idempotencia.buscar_apos_conflito(cur, chave)
+                if not salvo:
+                    return jsonify({"error": "Requisição com esta Idempotency-Key em andamento"}), 409
+                return idempotencia.repetir(salvo, hash_req)
+
+            # A reserva do próprio cliente e as vencidas saem na mesma transação; a de outro
+            # cliente ainda vigente barra o INSERT (se ele falhar, o rollback devolve a reserva)
+            cur.execute(
+                "DELETE FROM reservas_horario WHERE expira_em <= LOCALTIMESTAMP OR token = %s",
+                (reserva,),
+            )
+            cur.execute(
+                """
+                INSERT INTO agendamentos (nome, telefone, servico, data, horario, valor, status, forma_pagamento, pago)
+                VALUES (%(nome)s, %(telefone)s, %(servico)s, %(data)s, %(horario)s::time, %(valor)s,
+                        'pendente', 'pendente', FALSE)
+                RETURNING id
+                """,
+                params,
+            )
+            new_id = cur.fetchone()["id"]
+
+            # Itens com preço/duração do catálogo no momento da reserva, na mesma transação
+            ids = ids_servicos()
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO agendamento_servicos (agendamento_id, ordem, servico_id, nome, valor, duracao_minutos)
+                VALUES %s
+                """,
+                [
+                    (new_id, ordem, ids.get(s), s, catalogo[s][0], catalogo[s][1])
+                    for ordem, s in enumerate(servicos, start=1)
+                ],
+            )
+
+            corpo = {"success": True, "agendamento_id": new_id, "valor": valor_total}
+            if chave:
+                idempotencia.salvar(cur, chave, 201, corpo)
+
+            # Limpeza incremental: chaves e remoções vencidas saem aos poucos, a cada escrita
+            idempotencia.limpar_expiradas(cur)
+            _limpar_removidos(cur)
+            conn.commit()
+        except IntegrityError:
+            # Agendamento ou reserva no horário (horarios_ocupados_sem_sobreposicao / UNIQUE)
+            conn.rollback()
+            new_id = None
+
+    if new_id is None:
+        return _resposta_conflito(data_ag, horario, servicos, reserva)
+
+    if chave:
+        idempotencia.lembrar(chave, hash_req, 201, corpo)
+    eventos.publicar("criado", {"id": new_id, "nome": nome, "data": data_ag, "horario": horario[:5], "status": "pendente"})
+    return jsonify(corpo), 201
 
 
 @agendamentos_bp.get("/api/admin/agendamentos")
@@ -86,22 +321,240 @@ def listar_agendamentos_admin():
         where.append("telefone ILIKE %s")
         params.append(f"%{telefone}%")
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        f"""
-        SELECT id, nome, telefone, servico, data::text as data, horario::text as horario,
-               valor, status, forma_pagamento, data_pagamento::text as data_pagamento,
-               pago, created_at
-        FROM agendamentos
-        WHERE {' AND '.join(where)}
-        ORDER BY data DESC, horario DESC
-        """,
-        tuple(params),
+    # Resposta antiga (lista completa, sem paginação) para o admin.js atual
+    if request.args.get("todos", "").lower() in ("1", "true"):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"""
+                SELECT id, nome, telefone, servico, data::text as data, horario::text as horario,
+                       valor, status, forma_pagamento, data_pagamento::text as data_pagamento,
+                       pago, created_at
+                FROM agendamentos
+                WHERE {' AND '.join(where)}
+                ORDER BY data DESC, horario DESC
+                """,
+                tuple(params),
+            )
+            rows = cur.fetchall()
+        return jsonify(rows), 200
+
+    # Paginação por cursor (keyset) em (data, horario, id), do mais recente para o mais antigo
+    try:
+        limite = int(request.args.get("limite", LIMITE_PADRAO))
+    except ValueError:
+        return jsonify({"error": "limite inválido"}), 400
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    fields = [f.strip() for f in (request.args.get("fields") or "").split(",") if f.strip()]
+    invalidos = [f for f in fields if f not in COLUNAS_LISTAGEM]
+    if invalidos:
+        return jsonify({"error": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+    fields = fields or list(COLUNAS_LISTAGEM)
+    selecionadas = list(dict.fromkeys(list(COLUNAS_CURSOR) + fields))
+
+    com_total = request.args.get("total", "1").lower() not in ("0", "false")
+
+    where_pagina = list(where)
+    params_pagina = list(params)
+    cursor = request.args.get("cursor")
+    if cursor:
+        chave = cursor_paginacao.decodificar_keyset(cursor)
+        if not chave:
+            return jsonify({"error": "cursor inválido"}), 400
+        where_pagina.append("(data, horario, id) < (%s::date, %s::time, %s)")
+        params_pagina.extend(chave)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT {', '.join(COLUNAS_LISTAGEM[c] for c in selecionadas)}
+            FROM agendamentos
+            WHERE {' AND '.join(where_pagina)}
+            ORDER BY data DESC, horario DESC, id DESC
+            LIMIT %s
+            """,
+            tuple(params_pagina) + (limite + 1,),
+        )
+        rows = cur.fetchall()
+
+        total = None
+        if com_total:
+            cur.execute(
+                f"SELECT COUNT(*) AS total FROM agendamentos WHERE {' AND '.join(where)}",
+                tuple(params),
+            )
+            total = cur.fetchone()["total"]
+
+    proximo_cursor = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        proximo_cursor = cursor_paginacao.codificar_keyset(rows[-1])
+
+    resposta = {
+        "agendamentos": [{c: r[c] for c in fields} for r in rows],
+        "proximo_cursor": proximo_cursor,
+    }
+    if com_total:
+        resposta["total"] = total
+    return jsonify(resposta), 200
+
+
+@agendamentos_bp.get("/api/admin/agendamentos/changes")
+@admin_required
+def alteracoes_agendamentos():
+    """
+    Linhas inseridas/alteradas e ids removidos desde ?since=<cursor>.
+    Sem since, devolve só o cursor atual (o cliente pede o cursor antes da carga completa).
+    Se houver alterações demais, o cursor for de formato antigo ou mais velho que a
+    retenção das remoções, responde recarregar=true para o cliente refazer a carga completa.
+    """
+    since = request.args.get("since")
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS horizonte,
+                   clock_timestamp()::timestamp AS agora
+            """
+        )
+        row = cur.fetchone()
+        horizonte, agora = int(row["horizonte"]), row["agora"]
+        cursor_atual = _codificar_cursor_feed(horizonte, agora)
+
+        if not since:
+            return jsonify({"cursor": cursor_atual, "alterados": [], "removidos": []}), 200
+
+        chave = _decodificar_cursor_feed(since)
+        if not chave or chave[1] < agora - RETENCAO_REMOVIDOS:
+            return jsonify({"cursor": cursor_atual, "recarregar": True}), 200
+        desde = chave[0]
+
+        # [desde, horizonte): transações que terminaram entre as duas consultas
+        cur.execute(
+            """
+            SELECT id, nome, telefone, servico, data::text as data, horario::text as horario,
+                   valor, status, forma_pagamento, data_pagamento::text as data_pagamento,
+                   pago, created_at
+            FROM agendamentos
+            WHERE alterado_xid >= %s::text::xid8 AND alterado_xid < %s::text::xid8
+            ORDER BY alterado_xid
+            LIMIT %s
+            """,
+            (desde, horizonte, MAXIMO_FEED + 1),
+        )
+        alterados = cur.fetchall()
+
+        cur.execute(
+            """
+            SELECT id
+            FROM agendamentos_removidos
+            WHERE removido_xid >= %s::text::xid8 AND removido_xid < %s::text::xid8
+            ORDER BY removido_xid
+            LIMIT %s
+            """,
+            (desde, horizonte, MAXIMO_FEED + 1),
+        )
+        removidos = [r["id"] for r in cur.fetchall()]
+
+    if len(alterados) > MAXIMO_FEED or len(removidos) > MAXIMO_FEED:
+        return jsonify({"cursor": cursor_atual, "recarregar": True}), 200
+
+    proximo = _codificar_cursor_feed(max(desde, horizonte), agora)
+    return jsonify({"cursor": proximo, "alterados": alterados, "removidos": removidos}), 200
+
+
+@agendamentos_bp.post("/api/admin/agendamentos/stream/ticket")
+@admin_required
+def ticket_stream_agendamentos():
+    """Troca o Bearer token por um ticket de uso único para abrir o EventSource."""
+    username = sessoes.validar_token(token_da_requisicao())
+    ticket = sessoes.emitir_ticket_stream(username)
+    return jsonify({"ticket": ticket, "validade_segundos": Config.EVENTOS_TICKET_VALIDADE}), 201
+
+
+@agendamentos_bp.get("/api/admin/agendamentos/stream")
+def stream_agendamentos():
+    """
+    Server-sent events com criado/atualizado/removido/limpeza.
+    Autenticado por ?ticket= (POST .../stream/ticket), que só vale para uma conexão:
+    a cada reconexão o cliente pede outro ticket e manda ?last_event_id=. O evento
+    "recarregar" avisa que eventos se perderam e a lista deve ser recarregada.
+    """
+    ticket = (request.args.get("ticket") or "").strip()
+    if not ticket or not sessoes.consumir_ticket_stream(ticket):
+        return jsonify({"error": "Não autorizado"}), 401
+
+    ultimo = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        ultimo_id = int(ultimo) if ultimo else None
+    except ValueError:
+        ultimo_id = None
+
+    if not eventos.reservar_stream():
+        resposta = jsonify({"error": "Muitos streams abertos; use /changes"})
+        resposta.status_code = 503
+        resposta.headers["Retry-After"] = "60"
+        return resposta
+
+    resposta = Response(stream_with_context(eventos.stream(ultimo_id)), mimetype="text/event-stream")
+    # Chamado pelo servidor ao fechar a resposta, mesmo que o gerador nem tenha começado
+    resposta.call_on_close(eventos.liberar_stream)
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.headers["X-Accel-Buffering"] = "no"  # nginx não deve bufferizar o stream
+    return resposta
+
+
+@agendamentos_bp.get("/api/admin/agendamentos/exportar")
+@admin_required
+def exportar_agendamentos():
+    formato = (request.args.get("formato") or "csv").lower()
+    if formato not in exportacao.FORMATOS:
+        return jsonify({"error": "formato deve ser csv ou ndjson"}), 400
+    mimetype, extensao = exportacao.FORMATOS[formato]
+
+    gerador = exportacao.gerar(
+        formato,
+        data_inicio=request.args.get("data_inicio"),
+        data_fim=request.args.get("data_fim"),
+        status=request.args.get("status"),
+    )
+    return Response(
+        stream_with_context(gerador),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=agendamentos.{extensao}"},
     )
-    rows = cur.fetchall()
-    conn.close()
-    return jsonify(rows), 200
+
+
+@agendamentos_bp.post("/api/admin/agendamentos/importar")
+@admin_required
+def importar_agendamentos():
+    """
+    Corpo: o arquivo em si (CSV com cabeçalho ou NDJSON, UTF-8).
+    ?formato=csv|ndjson (padrão pelo Content-Type), ?simular=1 só valida.
+    """
+    formato = (request.args.get("formato") or "").lower()
+    if not formato:
+        formato = "ndjson" if "json" in (request.content_type or "") else "csv"
+    if formato not in ("csv", "ndjson"):
+        return jsonify({"error": "formato deve ser csv ou ndjson"}), 400
+    simular = request.args.get("simular", "").lower() in ("1", "true")
+
+    try:
+        relatorio = importacao.importar(request.stream, formato, simular)
+    except importacao.ArquivoInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # Agendamento criado no mesmo horário durante a importação
+        return jsonify({"error": "Conflito com agendamento criado durante a importação; tente novamente"}), 409
+
+    # Um aviso para a importação inteira, depois do commit (não um por linha):
+    # o admin busca as linhas novas no feed de alterações
+    if not simular and relatorio["inseridos"]:
+        eventos.publicar("importacao", {"inseridos": relatorio["inseridos"]})
+    return jsonify(relatorio), 200
 
 
 @agendamentos_bp.get("/api/agendamentos")
@@ -113,20 +566,19 @@ def listar_agendamentos_legacy():
 @agendamentos_bp.get("/api/admin/agendamentos/<int:agendamento_id>")
 @admin_required
 def obter_agendamento(agendamento_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, nome, telefone, servico, data::text as data, horario::text as horario,
-               valor, status, forma_pagamento, data_pagamento::text as data_pagamento,
-               pago, created_at
-        FROM agendamentos
-        WHERE id = %s
-        """,
-        (agendamento_id,),
-    )
-    row = cur.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, nome, telefone, servico, data::text as data, horario::text as horario,
+                   valor, status, forma_pagamento, data_pagamento::text as data_pagamento,
+                   pago, created_at
+            FROM agendamentos
+            WHERE id = %s
+            """,
+            (agendamento_id,),
+        )
+        row = cur.fetchone()
 
     if not row:
         return jsonify({"error": "Agendamento não encontrado"}), 404
@@ -156,50 +608,65 @@ def atualizar_agendamento(agendamento_id):
 
     valores.append(agendamento_id)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        f"""
-        UPDATE agendamentos
-        SET {', '.join(campos)}
-        WHERE id = %s
-        RETURNING id
-        """,
-        tuple(valores),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                UPDATE agendamentos a
+                SET {', '.join(campos)}
+                FROM (SELECT id, data AS data_anterior FROM agendamentos WHERE id = %s FOR UPDATE) ant
+                WHERE a.id = ant.id
+                RETURNING a.id, a.nome, a.data::text AS data, a.horario::text AS horario, a.status,
+                          ant.data_anterior::text AS data_anterior
+                """,
+                tuple(valores),
+            )
+            row = cur.fetchone()
+
+            # Serviço editado como texto: refaz os itens a partir do catálogo
+            if row and "servico" in data:
+                cur.execute("DELETE FROM agendamento_servicos WHERE agendamento_id = %s", (agendamento_id,))
+                cur.execute("SELECT agendamento_servicos_gerar(%s, %s)", (agendamento_id, agendamento_id + 1))
+            conn.commit()
+        except IntegrityError:
+            conn.rollback()
+            return jsonify({"error": "Conflito com outro agendamento neste horário"}), 409
 
     if not row:
         return jsonify({"error": "Agendamento não encontrado"}), 404
 
+    eventos.publicar("atualizado", dict(row, horario=row["horario"][:5]))
     return jsonify({"success": True}), 200
 
 
 @agendamentos_bp.delete("/api/admin/agendamentos/<int:agendamento_id>")
 @admin_required
 def deletar_agendamento(agendamento_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM agendamentos WHERE id = %s RETURNING id", (agendamento_id,))
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM agendamentos WHERE id = %s RETURNING id, data::text AS data, horario::text AS horario",
+            (agendamento_id,),
+        )
+        row = cur.fetchone()
+        _limpar_removidos(cur)
+        conn.commit()
 
     if not row:
         return jsonify({"error": "Agendamento não encontrado"}), 404
 
+    eventos.publicar("removido", dict(row, horario=row["horario"][:5]))
     return jsonify({"success": True}), 200
 
 
 @agendamentos_bp.post("/api/admin/limpar-agendamentos")
 @admin_required
 def limpar_agendamentos():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM agendamentos")
-    total = cur.rowcount
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM agendamentos")
+        total = cur.rowcount
+        conn.commit()
+    eventos.publicar("limpeza", {"total": total})
     return jsonify({"success": True, "message": f"{total} agendamento(s) deletado(s)"}), 200
\ No newline at end of file
@@ -3,6 +3,7 @@ from flask_cors import CORS
 
 from config import Config
 from database import init_db
+from horarios.logic import escutar_disponibilidade
 
 from servicos.routes import servicos_bp
 from horarios.routes import horarios_bp
@@ -26,6 +27,8 @@ def create_app():
     with app.app_context():
         init_db()
 
+    escutar_disponibilidade()
+
     @app.get("/health")
     @app.get("/healthcheck")
     def healthcheck():
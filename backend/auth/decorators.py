@@ -1,34 +1,26 @@
 from functools import wraps
 from flask import request, jsonify
-from database import get_db_connection
+from auth.sessoes import validar_token
+
+
+def token_da_requisicao():
+    # Só o header: token na query string acaba em logs de acesso e no histórico.
+    # O stream SSE usa ticket de uso único (auth.sessoes.consumir_ticket_stream).
+    auth = request.headers.get("Authorization", "")
+    return auth.replace("Bearer ", "").strip()
 
 
 def admin_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        auth = request.headers.get("Authorization", "")
-        token = auth.replace("Bearer ", "").strip()
+        token = token_da_requisicao()
 
         if not token:
             return jsonify({"error": "Não autorizado"}), 401
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT 1
-            FROM admin_sessions
-            WHERE session_token = %s
-              AND expires_at > NOW()
-            """,
-            (token,),
-        )
-        valid = cur.fetchone()
-        conn.close()
-
-        if not valid:
+        if not validar_token(token):
             return jsonify({"error": "Sessão expirada"}), 401
 
         return fn(*args, **kwargs)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -4,7 +4,8 @@ from datetime import datetime, timedelta
 
 from flask import Blueprint, request, jsonify
 
-from database import get_db_connection
+from auth import sessoes
+from database import db_connection
 from utils.security import check_password, hash_password
 
 auth_bp = Blueprint("auth", __name__)
@@ -29,17 +30,17 @@ def admin_login():
     token = secrets.token_urlsafe(32)
     expires_at = datetime.utcnow() + timedelta(hours=8)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO admin_sessions (session_token, username, expires_at)
-        VALUES (%s, %s, %s)
-        """,
-        (token, username, expires_at),
-    )
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO admin_sessions (session_token, username, expires_at)
+            VALUES (%s, %s, %s)
+            """,
+            (token, username, expires_at),
+        )
+        conn.commit()
+    sessoes.registrar(token, username, 28800)
 
     return jsonify({"success": True, "token": token, "expires_in": 28800}), 200
 
@@ -52,24 +53,11 @@ def admin_verify():
     if not token:
         return jsonify({"authenticated": False}), 401
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT username
-        FROM admin_sessions
-        WHERE session_token = %s
-          AND expires_at > NOW()
-        """,
-        (token,),
-    )
-    row = cur.fetchone()
-    conn.close()
-
-    if not row:
+    username = sessoes.validar_token(token)
+    if not username:
         return jsonify({"authenticated": False}), 401
 
-    return jsonify({"authenticated": True, "username": row["username"]}), 200
+    return jsonify({"authenticated": True, "username": username}), 200
 
 
 @auth_bp.post("/api/admin/logout")
@@ -78,10 +66,11 @@ def admin_logout():
     token = auth.replace("Bearer ", "").strip()
 
     if token:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM admin_sessions WHERE session_token = %s", (token,))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM admin_sessions WHERE session_token = %s", (token,))
+            conn.commit()
+        # Depois do DELETE, para uma requisição concorrente não recolocar a sessão no cache
+        sessoes.remover(token)
 
     return jsonify({"success": True}), 200
\ No newline at end of file
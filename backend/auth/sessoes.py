@@ -0,0 +1,107 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from database import db_connection
+
+_lock = threading.Lock()
+# sha256(token) -> (username ou None, expira_em em time.monotonic())
+_cache = OrderedDict()
+
+
+def _chave(token):
+    # Não guarda o token em claro na memória do processo
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _guardar(chave, username, validade):
+    with _lock:
+        _cache[chave] = (username, time.monotonic() + validade)
+        _cache.move_to_end(chave)
+        while len(_cache) > Config.SESSAO_CACHE_TAMANHO:
+            _cache.popitem(last=False)
+
+
+def _buscar_no_banco(token):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT username, EXTRACT(EPOCH FROM (expires_at - NOW())) AS restante
+            FROM admin_sessions
+            WHERE session_token = %s
+              AND expires_at > NOW()
+            """,
+            (token,),
+        )
+        return cur.fetchone()
+
+
+def validar_token(token):
+    """
+    Retorna o username da sessão ou None.
+
+    Sessões válidas ficam em cache por no máximo SESSAO_CACHE_TTL segundos (nunca
+    além do expires_at); tokens inválidos por SESSAO_CACHE_NEGATIVO_TTL. O TTL curto
+    é o que garante que um logout feito em outro worker do gunicorn seja respeitado.
+    """
+    chave = _chave(token)
+    agora = time.monotonic()
+
+    with _lock:
+        item = _cache.get(chave)
+        if item is not None:
+            if item[1] > agora:
+                _cache.move_to_end(chave)
+                return item[0]
+            del _cache[chave]
+
+    row = _buscar_no_banco(token)
+    if not row:
+        _guardar(chave, None, Config.SESSAO_CACHE_NEGATIVO_TTL)
+        return None
+
+    _guardar(chave, row["username"], min(Config.SESSAO_CACHE_TTL, float(row["restante"])))
+    return row["username"]
+
+
+def registrar(token, username, validade):
+    _guardar(_chave(token), username, min(Config.SESSAO_CACHE_TTL, validade))
+
+
+def remover(token):
+    with _lock:
+        _cache.pop(_chave(token), None)
+
+
+def emitir_ticket_stream(username):
+    """Ticket curto e de uso único para abrir o stream SSE (vale em qualquer worker)."""
+    ticket = secrets.token_urlsafe(32)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM admin_stream_tickets WHERE expires_at < NOW()")
+        cur.execute(
+            """
+            INSERT INTO admin_stream_tickets (ticket, username, expires_at)
+            VALUES (%s, %s, NOW() + MAKE_INTERVAL(secs => %s))
+            """,
+            (ticket, username, Config.EVENTOS_TICKET_VALIDADE),
+        )
+        conn.commit()
+    return ticket
+
+
+def consumir_ticket_stream(ticket):
+    """username do ticket, ou None. O DELETE garante o uso único."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM admin_stream_tickets WHERE ticket = %s RETURNING username, expires_at > NOW() AS valido",
+            (ticket,),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    return row["username"] if row and row["valido"] else None
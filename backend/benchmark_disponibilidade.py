@@ -0,0 +1,94 @@
+"""
+Microbenchmark da disponibilidade: lista de horários livres (varredura de
+intervalos mesclados, horarios.logic) e validação de um horário (MapaDia.cabe).
+
+Não acessa o banco: gera dias aleatórios em memória, confere que a varredura e o
+MapaDia dão o mesmo resultado e mede com timeit.
+
+Medições anteriores: na lista de horários do dia o MapaDia empatava com a
+varredura (~0,93x), por isso a lista ficou na varredura. Na validação de um
+horário o cabe() direto ganha (~3x) de gerar a lista e procurar a string.
+
+Uso (dentro de backend/):
+    python benchmark_disponibilidade.py [dias]
+"""
+
+import random
+import sys
+import timeit
+
+from config_horarios.grade import JANELA_PADRAO
+from horarios.logic import (
+    INTERVALO_ENTRE_SERVICOS,
+    _livres,
+    _ocupacao_do_dia,
+    _slots,
+    _to_hhmm,
+)
+from horarios.mapa_dia import MapaDia
+
+
+def _dia_aleatorio(rnd):
+    ocupados = []
+    for _ in range(rnd.randint(0, 8)):
+        inicio = rnd.randrange(JANELA_PADRAO.inicio, JANELA_PADRAO.fim, 30)
+        duracao = rnd.choice((60, 90, 120, 150))
+        ocupados.append((inicio - INTERVALO_ENTRE_SERVICOS, inicio + duracao + INTERVALO_ENTRE_SERVICOS))
+    return ocupados, rnd.choice((60, 90, 150, 240))
+
+
+def _medir(descricao, funcao, repeticoes):
+    tempo = min(timeit.repeat(funcao, number=1, repeat=repeticoes))
+    print(f"   {descricao:<42} {tempo * 1000:8.2f} ms")
+    return tempo
+
+
+def main():
+    total_dias = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    rnd = random.Random(42)
+    dias = [_dia_aleatorio(rnd) for _ in range(total_dias)]
+    janela = JANELA_PADRAO
+
+    # 1) Mesmo resultado: a lista da varredura = os slots em que MapaDia.cabe
+    for ocupados, duracao in dias:
+        mapa = MapaDia.do_dia(janela, ocupados)
+        esperado = [_to_hhmm(t) for t in _slots(janela) if mapa.cabe(t, duracao)]
+        assert _livres(janela, _ocupacao_do_dia(janela, ocupados), duracao) == esperado
+    print(f"✅ {total_dias} dia(s): varredura de intervalos e MapaDia concordam")
+
+    # 2) Lista de horários livres de cada dia (visão do mês / /api/horarios-disponiveis)
+    # Do zero (snapshot frio) e com os intervalos do dia já mesclados (snapshot quente)
+    mesclados = [_ocupacao_do_dia(janela, o) for o, _ in dias]
+    print(f"\n📊 Horários livres de {total_dias} dia(s)")
+    _medir("mescla + varredura", lambda: [_livres(janela, _ocupacao_do_dia(janela, o), d) for o, d in dias], 5)
+    tempo = _medir("varredura (snapshot)", lambda: [_livres(janela, m, d) for m, (_, d) in zip(mesclados, dias)], 5)
+    print(f"   por dia: {tempo / total_dias * 1e6:.1f} µs")
+
+    # 3) Validação de um horário (criar_agendamento): antes gerava a lista e procurava a string
+    consultas = [(o, d, rnd.randrange(janela.inicio, janela.fim, 30)) for o, d in dias]
+    print(f"\n📊 Validação de {total_dias} horário(s)")
+    antes = _medir(
+        "lista de strings + 'in'",
+        lambda: [_to_hhmm(t) in _livres(janela, _ocupacao_do_dia(janela, o), d) for o, d, t in consultas],
+        5,
+    )
+    depois = _medir(
+        "MapaDia.cabe",
+        lambda: [t in _slots(janela) and MapaDia.do_dia(janela, o).cabe(t, d) for o, d, t in consultas],
+        5,
+    )
+    print(f"   razão: {antes / depois:.2f}x")
+
+    # 4) Consultas repetidas no mesmo mapa (ex.: várias durações para o mesmo dia)
+    mapas = [MapaDia.do_dia(janela, o) for o, _ in dias]
+    print("\n📊 cabe() em mapa já montado (48 slots x 4 durações por dia)")
+    tempo = _medir(
+        "MapaDia.cabe",
+        lambda: [m.cabe(t, d) for m in mapas for d in (60, 90, 150, 240) for t in range(0, 1440, 30)],
+        5,
+    )
+    print(f"   por consulta: {tempo / (len(mapas) * 4 * 48) * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Liga os agendamentos antigos à tabela clientes (cliente_id), em lotes.
+
+Não roda na subida da aplicação: rodar uma vez depois do deploy que cria a tabela
+clientes, com pausa entre lotes (para não disputar I/O com o tráfego normal). Os
+agendamentos novos já entram com cliente_id. Pode ser rodado de novo: só mexe em
+linhas com cliente_id vazio, e não mexe em updated_at (não aparece no feed de alterações).
+
+Uso (dentro de backend/):
+    python -m clientes.backfill [tamanho_do_lote]
+"""
+
+import sys
+import time
+
+from database import db_connection, vincular_clientes
+
+LOTE_PADRAO = 5000
+PAUSA_ENTRE_LOTES = 0.05  # segundos, para não disputar I/O com o tráfego normal
+
+
+def executar(lote=LOTE_PADRAO):
+    with db_connection() as conn:
+        return vincular_clientes(conn, lote, PAUSA_ENTRE_LOTES)
+
+
+if __name__ == "__main__":
+    lote = int(sys.argv[1]) if len(sys.argv) > 1 else LOTE_PADRAO
+    inicio = time.time()
+    vinculados = executar(lote)
+    print(f"✅ clientes: {vinculados} agendamento(s) vinculado(s) em {time.time() - inicio:.2f}s")
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from auth.decorators import admin_required
-from database import get_db_connection
+from database import db_connection
 
 clientes_bp = Blueprint("clientes", __name__)
 
@@ -10,30 +10,37 @@ clientes_bp = Blueprint("clientes", __name__)
 def buscar_clientes():
     nome_busca = (request.args.get("nome") or "").strip()
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    if not nome_busca:
-        cur.execute(
-            """
-            SELECT nome, telefone
-            FROM agendamentos
-            ORDER BY created_at DESC
-            LIMIT 20
-            """
-        )
-    else:
-        cur.execute(
-            """
-            SELECT DISTINCT ON (LOWER(nome)) nome, telefone
-            FROM agendamentos
-            WHERE nome ILIKE %s
-            ORDER BY LOWER(nome), created_at DESC
-            LIMIT 20
-            """,
-            (f"%{nome_busca}%",),
-        )
+        if not nome_busca:
+            cur.execute(
+                """
+                SELECT nome, telefone
+                FROM clientes
+                ORDER BY ultimo_agendamento DESC
+                LIMIT 20
+                """
+            )
+        else:
+            # Sem acento/maiúsculas; começa-com vem antes de começa-palavra, que vem antes de contém
+            termo = nome_busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            cur.execute(
+                """
+                SELECT nome, telefone
+                FROM clientes
+                WHERE nome_busca LIKE '%%' || clientes_normalizar_nome(%(termo)s) || '%%'
+                ORDER BY
+                    CASE
+                        WHEN nome_busca LIKE clientes_normalizar_nome(%(termo)s) || '%%' THEN 0
+                        WHEN nome_busca LIKE '%% ' || clientes_normalizar_nome(%(termo)s) || '%%' THEN 1
+                        ELSE 2
+                    END,
+                    ultimo_agendamento DESC
+                LIMIT 20
+                """,
+                {"termo": termo},
+            )
 
-    rows = cur.fetchall()
-    conn.close()
+        rows = cur.fetchall()
     return jsonify(rows), 200
\ No newline at end of file
@@ -2,4 +2,54 @@ import os
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
-    DATABASE_URL = os.getenv("DATABASE_URL")
\ No newline at end of file
+    DATABASE_URL = os.getenv("DATABASE_URL")
+
+    # Pool de conexões PostgreSQL (por processo/worker do gunicorn)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # segundos esperando conexão livre
+    DB_POOL_MAX_LIFETIME = int(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # segundos
+    DB_POOL_HEALTHCHECK_INTERVAL = int(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "30"))  # segundos ociosa
+
+    # Cache em memória do catálogo de serviços ativos (segundos)
+    SERVICOS_CACHE_TTL = int(os.getenv("SERVICOS_CACHE_TTL", "300"))
+
+    # Cache da grade de horários compilada a partir de config_horarios (segundos)
+    GRADE_CACHE_TTL = int(os.getenv("GRADE_CACHE_TTL", "300"))
+
+    # Cache de sessões do admin (admin_required)
+    SESSAO_CACHE_TTL = int(os.getenv("SESSAO_CACHE_TTL", "30"))  # segundos; limita atraso de logout entre workers
+    SESSAO_CACHE_NEGATIVO_TTL = int(os.getenv("SESSAO_CACHE_NEGATIVO_TTL", "5"))  # tokens inválidos
+    SESSAO_CACHE_TAMANHO = int(os.getenv("SESSAO_CACHE_TAMANHO", "1024"))
+
+    # Stream SSE de eventos de agendamentos
+    EVENTOS_BACKEND = os.getenv("EVENTOS_BACKEND", "postgres")  # "postgres" (LISTEN/NOTIFY) ou "local"
+    EVENTOS_BUFFER = int(os.getenv("EVENTOS_BUFFER", "500"))  # eventos guardados para Last-Event-ID
+    EVENTOS_FILA_MAX = int(os.getenv("EVENTOS_FILA_MAX", "100"))  # por cliente; cheia = desconecta
+    EVENTOS_HEARTBEAT = int(os.getenv("EVENTOS_HEARTBEAT", "15"))  # segundos
+    EVENTOS_DURACAO_MAX = int(os.getenv("EVENTOS_DURACAO_MAX", "300"))  # segundos por conexão
+    EVENTOS_RETRY_MS = int(os.getenv("EVENTOS_RETRY_MS", "3000"))
+    EVENTOS_TICKET_VALIDADE = int(os.getenv("EVENTOS_TICKET_VALIDADE", "30"))  # segundos para abrir o stream
+    # Streams abertos por worker: cada um prende uma thread do gthread (--threads 8);
+    # acima disso responde 503 e o admin fica no poll de /changes
+    EVENTOS_STREAMS_MAX = int(os.getenv("EVENTOS_STREAMS_MAX", "4"))
+
+    # Cache do mapa de ocupação (/api/admin/ocupacao)
+    OCUPACAO_CACHE_TTL = int(os.getenv("OCUPACAO_CACHE_TTL", "120"))  # segundos
+    OCUPACAO_CACHE_TAMANHO = int(os.getenv("OCUPACAO_CACHE_TAMANHO", "32"))  # intervalos diferentes
+
+    # Snapshot em memória da disponibilidade pública (invalidado por NOTIFY)
+    DISPONIBILIDADE_DIAS = int(os.getenv("DISPONIBILIDADE_DIAS", "90"))  # dias a partir de hoje
+    DISPONIBILIDADE_SNAPSHOT_TTL = int(os.getenv("DISPONIBILIDADE_SNAPSHOT_TTL", "600"))  # segundos
+
+    # Cache HTTP (ETag + Cache-Control) dos endpoints públicos de leitura; a disponibilidade
+    # sai sempre com no-cache (revalida pela ETag)
+    CACHE_SERVICOS_MAX_AGE = int(os.getenv("CACHE_SERVICOS_MAX_AGE", "60"))  # segundos
+    CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("CACHE_STALE_WHILE_REVALIDATE", "60"))  # segundos
+
+    # Reserva temporária de horário durante o preenchimento do formulário (/api/reservas-horario)
+    RESERVA_MINUTOS = int(os.getenv("RESERVA_MINUTOS", "10"))
+
+    # Idempotency-Key do POST /api/agendar
+    IDEMPOTENCIA_TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+    IDEMPOTENCIA_CACHE_TAMANHO = int(os.getenv("IDEMPOTENCIA_CACHE_TAMANHO", "1024"))  # respostas em memória por worker
@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, timedelta
+
+from config import Config
+from database import db_connection
+from utils.cache import CacheVersionado
+
+# Horários em minutos desde 00:00; almoço é None quando o dia não tem pausa
+JanelaDia = namedtuple("JanelaDia", "ativo inicio fim almoco_inicio almoco_fim")
+
+# Fallback quando não há nenhuma configuração para o dia
+JANELA_PADRAO = JanelaDia(True, 8 * 60, 21 * 60, 12 * 60, 13 * 60)
+
+
+def _minutos(valor):
+    if valor is None:
+        return None
+    return valor.hour * 60 + valor.minute
+
+
+def _janela(row):
+    tem_almoco = row["tem_almoco"] and row["almoco_inicio"] and row["almoco_fim"]
+    return JanelaDia(
+        bool(row["ativo"]),
+        _minutos(row["horario_inicio"]),
+        _minutos(row["horario_fim"]),
+        _minutos(row["almoco_inicio"]) if tem_almoco else None,
+        _minutos(row["almoco_fim"]) if tem_almoco else None,
+    )
+
+
+class GradeHorarios:
+    """
+    config_horarios compilado: 7 modelos semanais + exceções por data.
+    janela(data) responde em O(1), sem acessar o banco.
+    """
+
+    def __init__(self, semanal, excecoes):
+        self.semanal = semanal  # {dia_semana (0=domingo): JanelaDia}
+        self.excecoes = excecoes  # {date: JanelaDia}
+        self.datas_excecao = sorted(excecoes)
+
+    def __eq__(self, outra):
+        return (
+            isinstance(outra, GradeHorarios)
+            and self.semanal == outra.semanal
+            and self.excecoes == outra.excecoes
+        )
+
+    def janela(self, data: date) -> JanelaDia:
+        excecao = self.excecoes.get(data)
+        if excecao is not None:
+            return excecao
+        return self.semanal.get((data.weekday() + 1) % 7, JANELA_PADRAO)
+
+    def minutos_abertos(self, inicio: date, fim: date) -> int:
+        """Minutos de atendimento (sem o almoço) no intervalo [inicio, fim)."""
+        total = 0
+        atual = inicio
+        while atual < fim:
+            j = self.janela(atual)
+            if j.ativo and j.inicio is not None and j.fim is not None:
+                total += max(j.fim - j.inicio, 0)
+                if j.almoco_inicio is not None:
+                    total -= max(min(j.almoco_fim, j.fim) - max(j.almoco_inicio, j.inicio), 0)
+            atual += timedelta(days=1)
+        return total
+
+    def excecoes_entre(self, inicio: date, fim: date):
+        """Datas com exceção no intervalo [inicio, fim), em ordem."""
+        i = bisect_left(self.datas_excecao, inicio)
+        j = bisect_left(self.datas_excecao, fim)
+        return self.datas_excecao[i:j]
+
+
+def _carregar():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT tipo, dia_semana, data_especifica, horario_inicio, horario_fim,
+                   tem_almoco, NULLIF(almoco_inicio::text, '')::time AS almoco_inicio,
+                   NULLIF(almoco_fim::text, '')::time AS almoco_fim, ativo
+            FROM config_horarios
+            ORDER BY id
+            """
+        )
+        rows = cur.fetchall()
+
+    semanal = {}
+    excecoes = {}
+    for r in rows:
+        # Em caso de duplicidade vale a primeira linha, como no LIMIT 1 antigo
+        if r["tipo"] == "data_especifica" and r["data_especifica"] is not None:
+            excecoes.setdefault(r["data_especifica"], _janela(r))
+        elif r["tipo"] == "dia_semana" and r["dia_semana"] is not None:
+            semanal.setdefault(r["dia_semana"], _janela(r))
+
+    return GradeHorarios(semanal, excecoes)
+
+
+_grade = CacheVersionado(_carregar, ttl=Config.GRADE_CACHE_TTL)
+
+
+def obter_grade() -> GradeHorarios:
+    return _grade.obter()
+
+
+def versao():
+    _grade.obter()
+    return _grade.versao
+
+
+def invalidar():
+    _grade.invalidar()
@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from psycopg2 import IntegrityError
 
 from auth.decorators import admin_required
-from database import get_db_connection
+from database import db_connection
+from config_horarios import grade
 
 config_horarios_bp = Blueprint("config_horarios", __name__)
 
@@ -10,20 +11,19 @@ config_horarios_bp = Blueprint("config_horarios", __name__)
 @config_horarios_bp.get("/api/admin/config-horarios")
 @admin_required
 def listar_config_horarios():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, tipo, dia_semana, data_especifica::text as data_especifica,
-               horario_inicio::text as horario_inicio, horario_fim::text as horario_fim,
-               tem_almoco, almoco_inicio::text as almoco_inicio, almoco_fim::text as almoco_fim,
-               ativo
-        FROM config_horarios
-        ORDER BY tipo, dia_semana, data_especifica
-        """
-    )
-    rows = cur.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, tipo, dia_semana, data_especifica::text as data_especifica,
+                   horario_inicio::text as horario_inicio, horario_fim::text as horario_fim,
+                   tem_almoco, almoco_inicio::text as almoco_inicio, almoco_fim::text as almoco_fim,
+                   ativo
+            FROM config_horarios
+            ORDER BY tipo, dia_semana, data_especifica
+            """
+        )
+        rows = cur.fetchall()
     return jsonify(rows), 200
 
 
@@ -42,26 +42,25 @@ def criar_config_horario():
     almoco_fim = data.get("almoco_fim")
     ativo = bool(data.get("ativo", True))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO config_horarios
-            (tipo, dia_semana, data_especifica, horario_inicio, horario_fim, tem_almoco, almoco_inicio, almoco_fim, ativo)
-            VALUES (%s, %s, %s, %s::time, %s::time, %s, %s::time, %s::time, %s)
-            RETURNING id
-            """,
-            (tipo, dia_semana, data_especifica, horario_inicio, horario_fim, tem_almoco, almoco_inicio, almoco_fim, ativo),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return jsonify({"success": True, "id": row["id"]}), 201
-    except IntegrityError:
-        conn.rollback()
-        return jsonify({"error": "Já existe configuração para esse dia/data"}), 400
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO config_horarios
+                (tipo, dia_semana, data_especifica, horario_inicio, horario_fim, tem_almoco, almoco_inicio, almoco_fim, ativo)
+                VALUES (%s, %s, %s, %s::time, %s::time, %s, %s::time, %s::time, %s)
+                RETURNING id
+                """,
+                (tipo, dia_semana, data_especifica, horario_inicio, horario_fim, tem_almoco, almoco_inicio, almoco_fim, ativo),
+            )
+            row = cur.fetchone()
+            conn.commit()
+            grade.invalidar()
+            return jsonify({"success": True, "id": row["id"]}), 201
+        except IntegrityError:
+            conn.rollback()
+            return jsonify({"error": "Já existe configuração para esse dia/data"}), 400
 
 
 @config_horarios_bp.patch("/api/admin/config-horarios/<int:config_id>")
@@ -86,15 +85,15 @@ def atualizar_config_horario(config_id):
 
     valores.append(config_id)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        f"UPDATE config_horarios SET {', '.join(campos)} WHERE id = %s RETURNING id",
-        tuple(valores),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE config_horarios SET {', '.join(campos)} WHERE id = %s RETURNING id",
+            tuple(valores),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    grade.invalidar()
 
     if not row:
         return jsonify({"error": "Configuração não encontrada"}), 404
@@ -104,12 +103,12 @@ def atualizar_config_horario(config_id):
 @config_horarios_bp.delete("/api/admin/config-horarios/<int:config_id>")
 @admin_required
 def deletar_config_horario(config_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM config_horarios WHERE id = %s RETURNING id", (config_id,))
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM config_horarios WHERE id = %s RETURNING id", (config_id,))
+        row = cur.fetchone()
+        conn.commit()
+    grade.invalidar()
 
     if not row:
         return jsonify({"error": "Configuração não encontrada"}), 404
@@ -1,16 +1,266 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 from config import Config
 
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão livre dentro de DB_POOL_TIMEOUT."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Conexão que volta para o pool no close().
+    Assim o código que já faz conn.close() continua funcionando sem alteração.
+    """
+
+    _pool = None
+    _devolvida = False
+    criada_em = 0.0
+    usada_em = 0.0
+
+    def close(self):
+        if self._devolvida:
+            return  # close() repetido não pode mexer numa conexão já devolvida
+        if self._pool is not None and not self.closed:
+            self._pool.putconn(self)
+        else:
+            super().close()
+
+    def fechar_de_verdade(self):
+        self._pool = None
+        if not self.closed:
+            super().close()
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe com tamanho mínimo/máximo, health check no checkout
+    e tempo máximo de vida por conexão.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, timeout, max_lifetime, healthcheck_interval):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = max(maxconn, minconn, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.healthcheck_interval = healthcheck_interval
+
+        self._livres = []  # LIFO: reaproveita a conexão mais "quente"
+        self._total = 0
+        self._cond = threading.Condition()
+
+        for _ in range(self.minconn):
+            conn = self._abrir()
+            with self._cond:
+                self._total += 1
+                self._livres.append(conn)
+
+    def _abrir(self):
+        conn = psycopg2.connect(
+            self.dsn,
+            connection_factory=PooledConnection,
+            cursor_factory=psycopg2.extras.RealDictCursor,
+            sslmode="require",
+        )
+        conn.criada_em = conn.usada_em = time.monotonic()
+        return conn
+
+    def _expirada(self, conn, agora):
+        return self.max_lifetime > 0 and agora - conn.criada_em > self.max_lifetime
+
+    def _saudavel(self, conn, agora):
+        if conn.closed:
+            return False
+        if agora - conn.usada_em < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.fechar_de_verdade()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        limite = time.monotonic() + self.timeout
+
+        while True:
+            conn = None
+            criar = False
+
+            with self._cond:
+                while not self._livres and self._total >= self.maxconn:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolEsgotadoError("Pool de conexões esgotado")
+                    self._cond.wait(restante)
+
+                if self._livres:
+                    conn = self._livres.pop()
+                else:
+                    self._total += 1
+                    criar = True
+
+            if criar:
+                try:
+                    conn = self._abrir()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                agora = time.monotonic()
+                if self._expirada(conn, agora) or not self._saudavel(conn, agora):
+                    self._descartar(conn)
+                    continue
+
+            conn._pool = self
+            conn._devolvida = False
+            return conn
+
+    def putconn(self, conn):
+        conn._pool = None
+        conn._devolvida = True
+        agora = time.monotonic()
+
+        if conn.closed or self._expirada(conn, agora):
+            self._descartar(conn)
+            return
+
+        try:
+            # Nunca devolve conexão com transação aberta/abortada
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._descartar(conn)
+            return
+
+        conn.usada_em = agora
+        with self._cond:
+            self._livres.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            livres, self._livres = self._livres, []
+            self._total -= len(livres)
+        for conn in livres:
+            conn.fechar_de_verdade()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # O pool é criado sob demanda em cada processo (seguro com o fork do gunicorn)
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    Config.DATABASE_URL,
+                    minconn=Config.DB_POOL_MIN,
+                    maxconn=Config.DB_POOL_MAX,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                    healthcheck_interval=Config.DB_POOL_HEALTHCHECK_INTERVAL,
+                )
+                _pool_pid = pid
+    return _pool
+
+
 def get_db_connection():
-    return psycopg2.connect(
-        Config.DATABASE_URL,
-        cursor_factory=psycopg2.extras.RealDictCursor,
-        sslmode="require"
-    )
+    """Pega uma conexão do pool; conn.close() devolve ao pool."""
+    return get_pool().getconn()
 
-def init_db():
+
+@contextmanager
+def db_connection():
+    """
+    Uso:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            ...
+            conn.commit()
+
+    Sempre devolve a conexão ao pool; o que não foi commitado sofre rollback.
+    """
     conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db():
+    with db_connection() as conn:
+        _criar_schema(conn)
+
+
+def vincular_clientes(conn, lote=5000, pausa=0):
+    """
+    Liga os agendamentos ainda sem cliente_id à tabela clientes, em lotes por faixa de id.
+
+    Cada lote é uma transação curta, então o sistema segue recebendo agendamentos
+    durante a carga (os novos já entram com cliente_id pelo trigger). Só mexe em
+    linhas com cliente_id vazio: num banco já carregado não faz nada. Não altera
+    updated_at/alterado_xid (agendamentos_marcar_alteracao ignora cliente_id), então
+    a carga não aparece no feed de alterações. Rodado só via python -m clientes.backfill.
+    Devolve quantos agendamentos foram vinculados.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT MIN(id) AS inicio, MAX(id) AS fim
+        FROM agendamentos
+        WHERE cliente_id IS NULL AND clientes_normalizar_telefone(telefone) <> ''
+    """)
+    faixa = cur.fetchone()
+    conn.commit()
+
+    vinculados = 0
+    if faixa["inicio"] is None:
+        return vinculados
+
+    for inicio in range(faixa["inicio"], faixa["fim"] + 1, lote):
+        cur.execute(
+            """
+            UPDATE agendamentos
+            SET cliente_id = clientes_upsert(telefone, nome, created_at)
+            WHERE id >= %s AND id < %s
+              AND cliente_id IS NULL
+              AND clientes_normalizar_telefone(telefone) <> ''
+            """,
+            (inicio, inicio + lote),
+        )
+        vinculados += cur.rowcount
+        conn.commit()
+        if pausa:
+            time.sleep(pausa)
+
+    return vinculados
+
+
+def _criar_schema(conn):
     cur = conn.cursor()
 
     # AGENDAMENTOS
@@ -34,6 +284,366 @@ def init_db():
     );
     """)
 
+    # Paginação por cursor da listagem do admin: ORDER BY data, horario, id DESC
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_keyset ON agendamentos (data, horario, id);")
+
+    # Filtros do financeiro (_build_filters): período + status/forma/pago
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_data_status ON agendamentos (data, status);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_forma_data ON agendamentos (forma_pagamento, data);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_pago_data ON agendamentos (pago, data);")
+
+    # Busca por cliente (nome ILIKE '%x%') precisa de índice trigram.
+    # pg_trgm é extensão do contrib: se não estiver disponível o schema segue sem ela.
+    cur.execute("SAVEPOINT pg_trgm;")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_nome_trgm ON agendamentos USING gin (nome gin_trgm_ops);")
+        cur.execute("RELEASE SAVEPOINT pg_trgm;")
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT pg_trgm;")
+        print(f"⚠️ pg_trgm indisponível, busca por nome sem índice: {e}")
+
+    # Feed de alterações (/api/admin/agendamentos/changes): id da transação que gravou
+    # cada linha (alterado_xid), mantido por trigger, e "lápides" das linhas removidas.
+    # O feed só entrega transações abaixo do xmin do snapshot (todas já terminadas), então
+    # uma transação longa que commita tarde não fica para trás do cursor.
+    cur.execute("ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_updated_at ON agendamentos (updated_at);")
+    cur.execute("ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS alterado_xid XID8;")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_alterado_xid ON agendamentos (alterado_xid);")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS agendamentos_removidos (
+        id INTEGER PRIMARY KEY,
+        removido_em TIMESTAMP NOT NULL DEFAULT clock_timestamp(),
+        removido_xid XID8 NOT NULL DEFAULT pg_current_xact_id()
+    );
+    """)
+    cur.execute(
+        "ALTER TABLE agendamentos_removidos ADD COLUMN IF NOT EXISTS removido_xid XID8 NOT NULL "
+        "DEFAULT pg_current_xact_id();"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_removidos_em ON agendamentos_removidos (removido_em);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_removidos_xid ON agendamentos_removidos (removido_xid);")
+    cur.execute("DELETE FROM agendamentos_removidos WHERE removido_em < NOW() - INTERVAL '30 days';")
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamentos_marcar_alteracao() RETURNS trigger AS $$
+    BEGIN
+        -- Só cliente_id mudou (clientes.backfill): não é alteração do agendamento
+        IF TG_OP = 'UPDATE' AND to_jsonb(NEW) - 'cliente_id' = to_jsonb(OLD) - 'cliente_id' THEN
+            RETURN NEW;
+        END IF;
+        NEW.updated_at := clock_timestamp();
+        NEW.alterado_xid := pg_current_xact_id();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_agendamentos_updated_at ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_agendamentos_updated_at
+    BEFORE INSERT OR UPDATE ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION agendamentos_marcar_alteracao();
+    """)
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamentos_registrar_remocao() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO agendamentos_removidos (id) VALUES (OLD.id)
+        ON CONFLICT (id) DO UPDATE SET removido_em = EXCLUDED.removido_em, removido_xid = EXCLUDED.removido_xid;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_agendamentos_removidos ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_agendamentos_removidos
+    AFTER DELETE ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION agendamentos_registrar_remocao();
+    """)
+
+    # Ids globais dos eventos SSE (LISTEN/NOTIFY)
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS agendamentos_eventos_seq;")
+
+    # Rollup diário do financeiro: dia x status x forma_pagamento x pago, mantido por trigger
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS financeiro_diario (
+        data DATE NOT NULL,
+        status TEXT NOT NULL,           -- '' quando o agendamento não tem status
+        forma_pagamento TEXT NOT NULL,  -- '' quando NULL
+        pago BOOLEAN NOT NULL,
+        quantidade INTEGER NOT NULL DEFAULT 0,
+        total NUMERIC NOT NULL DEFAULT 0,
+        PRIMARY KEY (data, status, forma_pagamento, pago)
+    );
+    """)
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_diario_somar(
+        p_data DATE, p_status TEXT, p_forma TEXT, p_pago BOOLEAN, p_quantidade INTEGER, p_total NUMERIC
+    ) RETURNS void AS $$
+        INSERT INTO financeiro_diario (data, status, forma_pagamento, pago, quantidade, total)
+        VALUES (p_data, COALESCE(p_status, ''), COALESCE(p_forma, ''), COALESCE(p_pago, FALSE), p_quantidade, p_total)
+        ON CONFLICT (data, status, forma_pagamento, pago) DO UPDATE
+        SET quantidade = financeiro_diario.quantidade + EXCLUDED.quantidade,
+            total = financeiro_diario.total + EXCLUDED.total;
+    $$ LANGUAGE sql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_diario_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM financeiro_diario_somar(OLD.data, OLD.status, OLD.forma_pagamento, OLD.pago, -1, -OLD.valor);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM financeiro_diario_somar(NEW.data, NEW.status, NEW.forma_pagamento, NEW.pago, 1, NEW.valor);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    # INSERT soma por comando (um upsert por grupo, não por linha): importação em lote
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_diario_inserir() RETURNS trigger AS $$
+    BEGIN
+        PERFORM financeiro_diario_somar(data, status, forma_pagamento, pago, quantidade, total)
+        FROM (
+            SELECT data, COALESCE(status, '') AS status, COALESCE(forma_pagamento, '') AS forma_pagamento,
+                   COALESCE(pago, FALSE) AS pago, COUNT(*)::int AS quantidade, SUM(valor) AS total
+            FROM novos
+            GROUP BY 1, 2, 3, 4
+        ) g;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_financeiro_diario ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_financeiro_diario
+    AFTER DELETE OR UPDATE OF data, status, forma_pagamento, pago, valor ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION financeiro_diario_trigger();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_financeiro_diario_inserir ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_financeiro_diario_inserir
+    AFTER INSERT ON agendamentos
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION financeiro_diario_inserir();
+    """)
+
+    # Primeira carga (tabela recém-criada); recargas manuais: python -m financeiro.rollup
+    cur.execute("""
+    INSERT INTO financeiro_diario (data, status, forma_pagamento, pago, quantidade, total)
+    SELECT data, COALESCE(status, ''), COALESCE(forma_pagamento, ''), COALESCE(pago, FALSE), COUNT(*), SUM(valor)
+    FROM agendamentos
+    WHERE NOT EXISTS (SELECT 1 FROM financeiro_diario)
+    GROUP BY 1, 2, 3, 4;
+    """)
+
+    # CLIENTES: uma linha por telefone em E.164, ligada aos agendamentos por cliente_id.
+    # nome_busca = nome em minúsculas e sem acentos, usado no autocomplete do admin.
+    # Os agendamentos antigos são ligados em lotes por vincular_clientes(): python -m clientes.backfill
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION clientes_normalizar_nome(p_nome TEXT) RETURNS TEXT AS $$
+        SELECT LOWER(TRANSLATE(
+            TRIM(p_nome),
+            'ÁÀÂÃÄáàâãäÉÈÊËéèêëÍÌÎÏíìîïÓÒÔÕÖóòôõöÚÙÛÜúùûüÇçÑñ',
+            'AAAAAaaaaaEEEEeeeeIIIIiiiiOOOOOoooooUUUUuuuuCcNn'
+        ));
+    $$ LANGUAGE sql IMMUTABLE;
+    """)
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION clientes_normalizar_telefone(p_telefone TEXT) RETURNS TEXT AS $$
+        -- E.164 com Brasil como padrão: DDD + número (10/11 dígitos) ganha +55;
+        -- zeros à esquerda (0 de longa distância) são descartados.
+        -- Números curtos demais (sem DDD) ficam só com os dígitos.
+        SELECT CASE
+            WHEN d = '' THEN ''
+            WHEN LEFT(LTRIM(COALESCE(p_telefone, '')), 1) = '+' THEN '+' || d
+            WHEN LENGTH(d) IN (10, 11) THEN '+55' || d
+            WHEN LENGTH(d) IN (12, 13) AND LEFT(d, 2) = '55' THEN '+' || d
+            ELSE d
+        END
+        FROM (SELECT LTRIM(REGEXP_REPLACE(COALESCE(p_telefone, ''), '[^0-9]', '', 'g'), '0') AS d) t;
+    $$ LANGUAGE sql IMMUTABLE;
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS clientes (
+        id SERIAL PRIMARY KEY,
+        telefone_normalizado TEXT NOT NULL UNIQUE,
+        telefone TEXT NOT NULL,
+        nome TEXT NOT NULL,
+        nome_busca TEXT NOT NULL,
+        ultimo_agendamento TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nome_busca ON clientes (nome_busca text_pattern_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clientes_ultimo ON clientes (ultimo_agendamento DESC);")
+
+    cur.execute("SAVEPOINT clientes_trgm;")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nome_trgm ON clientes USING gin (nome_busca gin_trgm_ops);")
+        cur.execute("RELEASE SAVEPOINT clientes_trgm;")
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT clientes_trgm;")
+
+    cur.execute(
+        "ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS cliente_id INTEGER "
+        "REFERENCES clientes (id) ON DELETE SET NULL;"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_cliente ON agendamentos (cliente_id, data);")
+
+    # Cria/atualiza o cliente do telefone e devolve o id.
+    # Nome e telefone exibidos são os do agendamento mais recente.
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION clientes_upsert(p_telefone TEXT, p_nome TEXT, p_quando TIMESTAMP)
+    RETURNS INTEGER AS $$
+        INSERT INTO clientes (telefone_normalizado, telefone, nome, nome_busca, ultimo_agendamento)
+        VALUES (
+            clientes_normalizar_telefone(p_telefone), p_telefone, p_nome,
+            clientes_normalizar_nome(p_nome), COALESCE(p_quando, LOCALTIMESTAMP)
+        )
+        ON CONFLICT (telefone_normalizado) DO UPDATE SET
+            telefone = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                            THEN EXCLUDED.telefone ELSE clientes.telefone END,
+            nome = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                        THEN EXCLUDED.nome ELSE clientes.nome END,
+            nome_busca = CASE WHEN EXCLUDED.ultimo_agendamento >= clientes.ultimo_agendamento
+                              THEN EXCLUDED.nome_busca ELSE clientes.nome_busca END,
+            ultimo_agendamento = GREATEST(clientes.ultimo_agendamento, EXCLUDED.ultimo_agendamento)
+        RETURNING id;
+    $$ LANGUAGE sql;
+    """)
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION clientes_vincular() RETURNS trigger AS $$
+    BEGIN
+        -- Importação em lote (agendamentos/importacao.py) já chega com o cliente resolvido
+        IF TG_OP = 'INSERT' AND NEW.cliente_id IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+        IF clientes_normalizar_telefone(NEW.telefone) = '' THEN
+            NEW.cliente_id := NULL;
+        ELSE
+            NEW.cliente_id := clientes_upsert(NEW.telefone, NEW.nome, NEW.created_at);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_clientes_vincular ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_clientes_vincular
+    BEFORE INSERT OR UPDATE OF nome, telefone ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION clientes_vincular();
+    """)
+
+    # Cliente que ficou sem nenhum agendamento sai da lista
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION clientes_limpar() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.cliente_id IS NOT NULL AND (TG_OP = 'DELETE' OR OLD.cliente_id IS DISTINCT FROM NEW.cliente_id) THEN
+            DELETE FROM clientes c
+            WHERE c.id = OLD.cliente_id
+              AND NOT EXISTS (SELECT 1 FROM agendamentos a WHERE a.cliente_id = c.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_clientes_limpar ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_clientes_limpar
+    AFTER DELETE OR UPDATE OF nome, telefone ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION clientes_limpar();
+    """)
+
+    # Ranking por cliente do financeiro sem filtro: total por cliente (chave igual à de
+    # financeiro/routes.py: cliente_id ou, sem vínculo, nome|telefone), mantido por trigger
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS financeiro_clientes (
+        chave TEXT PRIMARY KEY,
+        cliente_id INTEGER,
+        nome TEXT,      -- nome/telefone do agendamento; com cliente_id vale o de clientes
+        telefone TEXT,
+        quantidade INTEGER NOT NULL DEFAULT 0,
+        total NUMERIC NOT NULL DEFAULT 0
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_clientes_total ON financeiro_clientes (total DESC);")
+
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_clientes_somar(
+        p_cliente_id INTEGER, p_nome TEXT, p_telefone TEXT, p_quantidade INTEGER, p_total NUMERIC
+    ) RETURNS void AS $$
+    DECLARE
+        v_chave TEXT := COALESCE('#' || p_cliente_id, p_nome || '|' || p_telefone);
+    BEGIN
+        INSERT INTO financeiro_clientes (chave, cliente_id, nome, telefone, quantidade, total)
+        VALUES (v_chave, p_cliente_id, p_nome, p_telefone, p_quantidade, p_total)
+        ON CONFLICT (chave) DO UPDATE
+        SET quantidade = financeiro_clientes.quantidade + EXCLUDED.quantidade,
+            total = financeiro_clientes.total + EXCLUDED.total;
+        DELETE FROM financeiro_clientes WHERE chave = v_chave AND quantidade <= 0;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_clientes_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM financeiro_clientes_somar(OLD.cliente_id, OLD.nome, OLD.telefone, -1, -OLD.valor);
+        END IF;
+        IF TG_OP = 'UPDATE' THEN
+            PERFORM financeiro_clientes_somar(NEW.cliente_id, NEW.nome, NEW.telefone, 1, NEW.valor);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION financeiro_clientes_inserir() RETURNS trigger AS $$
+    BEGIN
+        PERFORM financeiro_clientes_somar(cliente_id, nome, telefone, quantidade, total)
+        FROM (
+            SELECT MAX(cliente_id) AS cliente_id, MAX(nome) AS nome, MAX(telefone) AS telefone,
+                   COUNT(*)::int AS quantidade, SUM(valor) AS total
+            FROM novos
+            GROUP BY COALESCE('#' || cliente_id, nome || '|' || telefone)
+        ) g;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    # cliente_id muda também pelo ON DELETE SET NULL de clientes (UPDATE feito pela FK)
+    cur.execute("DROP TRIGGER IF EXISTS trg_financeiro_clientes ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_financeiro_clientes
+    AFTER DELETE OR UPDATE OF cliente_id, nome, telefone, valor ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION financeiro_clientes_trigger();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_financeiro_clientes_inserir ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_financeiro_clientes_inserir
+    AFTER INSERT ON agendamentos
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION financeiro_clientes_inserir();
+    """)
+
+    # Primeira carga (tabela recém-criada); recargas manuais: python -m financeiro.rollup
+    cur.execute("""
+    INSERT INTO financeiro_clientes (chave, cliente_id, nome, telefone, quantidade, total)
+    SELECT COALESCE('#' || cliente_id, nome || '|' || telefone), MAX(cliente_id), MAX(nome), MAX(telefone),
+           COUNT(*), SUM(valor)
+    FROM agendamentos
+    WHERE NOT EXISTS (SELECT 1 FROM financeiro_clientes)
+    GROUP BY 1;
+    """)
+
     # SERVICOS
     cur.execute("""
     CREATE TABLE IF NOT EXISTS servicos (
@@ -47,6 +657,106 @@ def init_db():
     );
     """)
 
+    # Itens de cada agendamento: serviço com preço e duração do momento da reserva.
+    # agendamentos.servico (texto "A, B") continua sendo gravado para exibição.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS agendamento_servicos (
+        id SERIAL PRIMARY KEY,
+        agendamento_id INTEGER NOT NULL REFERENCES agendamentos (id) ON DELETE CASCADE,
+        ordem SMALLINT NOT NULL,
+        servico_id INTEGER REFERENCES servicos (id) ON DELETE SET NULL,
+        nome TEXT NOT NULL,
+        valor NUMERIC NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        UNIQUE (agendamento_id, ordem)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_agendamento_servicos_servico ON agendamento_servicos (servico_id);")
+
+    # Gera os itens a partir do texto de agendamentos.servico para os ids em [p_de, p_ate)
+    # que ainda não têm itens (migração dos antigos e edição do serviço pelo admin).
+    # Preço/duração vêm do catalogo atual; com um serviço só, o preço é o valor do agendamento.
+    # Serviço que não existe mais fica sem servico_id, com valor 0 e 60 min (DURACAO_PADRAO).
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamento_servicos_gerar(p_de INTEGER, p_ate INTEGER) RETURNS INTEGER AS $$
+        WITH itens AS (
+            INSERT INTO agendamento_servicos (agendamento_id, ordem, servico_id, nome, valor, duracao_minutos)
+            SELECT a.id, t.ordem, s.id, TRIM(t.nome),
+                   CASE WHEN t.qtd = 1 THEN a.valor ELSE COALESCE(s.valor, 0) END,
+                   COALESCE(s.duracao_minutos, 60)
+            FROM agendamentos a
+            CROSS JOIN LATERAL (
+                SELECT nome, ordem, COUNT(*) OVER () AS qtd
+                FROM UNNEST(STRING_TO_ARRAY(a.servico, ',')) WITH ORDINALITY AS u (nome, ordem)
+                WHERE TRIM(nome) <> ''
+            ) t
+            LEFT JOIN servicos s ON s.nome = TRIM(t.nome)
+            WHERE a.id >= p_de AND a.id < p_ate
+              AND NOT EXISTS (SELECT 1 FROM agendamento_servicos x WHERE x.agendamento_id = a.id)
+            RETURNING agendamento_id
+        )
+        SELECT COUNT(DISTINCT agendamento_id)::int FROM itens;
+    $$ LANGUAGE sql;
+    """)
+
+    # Período ocupado por cada agendamento: [data + horario, + duração dos serviços).
+    # A duração vem dos itens; no INSERT (itens ainda não gravados) ou com o texto de
+    # servico alterado, vem do catálogo, como em agendamento_servicos_gerar.
+    cur.execute("ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS periodo TSRANGE;")
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamentos_duracao_servico(p_servico TEXT) RETURNS INTEGER AS $$
+        SELECT COALESCE(NULLIF(SUM(COALESCE(s.duracao_minutos, 60)), 0), 60)::int
+        FROM UNNEST(STRING_TO_ARRAY(p_servico, ',')) AS u (nome)
+        LEFT JOIN servicos s ON s.nome = TRIM(u.nome)
+        WHERE TRIM(u.nome) <> '';
+    $$ LANGUAGE sql STABLE;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamentos_calcular_periodo() RETURNS trigger AS $$
+    DECLARE
+        v_duracao INTEGER;
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.servico IS NOT DISTINCT FROM OLD.servico THEN
+            SELECT SUM(duracao_minutos) INTO v_duracao
+            FROM agendamento_servicos WHERE agendamento_id = NEW.id;
+        END IF;
+        v_duracao := COALESCE(v_duracao, agendamentos_duracao_servico(NEW.servico));
+        NEW.periodo := TSRANGE(NEW.data + NEW.horario, NEW.data + NEW.horario + MAKE_INTERVAL(mins => v_duracao));
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_agendamentos_periodo ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_agendamentos_periodo
+    BEFORE INSERT OR UPDATE OF data, horario, servico ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION agendamentos_calcular_periodo();
+    """)
+    cur.execute("""
+    UPDATE agendamentos a
+    SET periodo = TSRANGE(a.data + a.horario, a.data + a.horario + MAKE_INTERVAL(mins => COALESCE(
+        (SELECT SUM(s.duracao_minutos)::int FROM agendamento_servicos s WHERE s.agendamento_id = a.id),
+        agendamentos_duracao_servico(a.servico)
+    )))
+    WHERE a.periodo IS NULL;
+    """)
+
+    # Importação em lote (agendamentos/importacao.py): confere os tipos de uma linha da
+    # tabela de staging (tudo TEXT) numa chamada só; devolve a mensagem do erro ou NULL
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION agendamentos_importacao_erro(
+        p_data TEXT, p_horario TEXT, p_valor TEXT, p_data_pagamento TEXT, p_pago TEXT, p_created_at TEXT
+    ) RETURNS TEXT AS $$
+    BEGIN
+        PERFORM p_data::date, p_horario::time, p_valor::numeric,
+                p_data_pagamento::date, p_pago::boolean, p_created_at::timestamp;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN SQLERRM;
+    END;
+    $$ LANGUAGE plpgsql STABLE;
+    """)
+
     # CONFIG HORARIOS
     cur.execute("""
     CREATE TABLE IF NOT EXISTS config_horarios (
@@ -64,6 +774,31 @@ def init_db():
     );
     """)
 
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION disponibilidade_notificar_grade() RETURNS trigger AS $$
+    BEGIN
+        -- Exceção de uma data afeta só aquele dia; o modelo semanal afeta todos
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM pg_notify('disponibilidade', 'grade:' || CASE
+                WHEN OLD.tipo = 'data_especifica' AND OLD.data_especifica IS NOT NULL
+                THEN OLD.data_especifica::text ELSE '*' END);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM pg_notify('disponibilidade', 'grade:' || CASE
+                WHEN NEW.tipo = 'data_especifica' AND NEW.data_especifica IS NOT NULL
+                THEN NEW.data_especifica::text ELSE '*' END);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_disponibilidade_grade ON config_horarios;")
+    cur.execute("""
+    CREATE TRIGGER trg_disponibilidade_grade
+    AFTER INSERT OR DELETE OR UPDATE ON config_horarios
+    FOR EACH ROW EXECUTE FUNCTION disponibilidade_notificar_grade();
+    """)
+
     # HORARIOS BLOQUEADOS
     cur.execute("""
     CREATE TABLE IF NOT EXISTS horarios_bloqueados (
@@ -75,6 +810,177 @@ def init_db():
     );
     """)
 
+    # Avisos para o snapshot de disponibilidade (horarios/snapshot.py) em todos os workers.
+    # O NOTIFY só sai no commit, e payloads repetidos na mesma transação chegam uma vez só.
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION disponibilidade_notificar_dia() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM pg_notify('disponibilidade', OLD.data::text);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM pg_notify('disponibilidade', NEW.data::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    # INSERT em agendamentos avisa por comando, um aviso por dia distinto
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION disponibilidade_notificar_inseridos() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('disponibilidade', data::text) FROM (SELECT DISTINCT data FROM novos) d;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_disponibilidade_agendamentos ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_disponibilidade_agendamentos
+    AFTER DELETE OR UPDATE OF data, horario, status, servico ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION disponibilidade_notificar_dia();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_disponibilidade_agendamentos_inserir ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_disponibilidade_agendamentos_inserir
+    AFTER INSERT ON agendamentos
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION disponibilidade_notificar_inseridos();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_disponibilidade_bloqueios ON horarios_bloqueados;")
+    cur.execute("""
+    CREATE TRIGGER trg_disponibilidade_bloqueios
+    AFTER INSERT OR DELETE OR UPDATE ON horarios_bloqueados
+    FOR EACH ROW EXECUTE FUNCTION disponibilidade_notificar_dia();
+    """)
+
+    # RESERVAS TEMPORÁRIAS: segura um horário por alguns minutos enquanto o cliente
+    # preenche o formulário; /api/agendar consome o token. Contam como ocupadas na
+    # disponibilidade até expira_em (horarios/logic.py); as vencidas são apagadas na
+    # próxima reserva criada ou no próximo agendamento do dia.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS reservas_horario (
+        id SERIAL PRIMARY KEY,
+        token TEXT UNIQUE NOT NULL,
+        data DATE NOT NULL,
+        horario TIME NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        periodo TSRANGE NOT NULL,
+        expira_em TIMESTAMP NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservas_horario_expira ON reservas_horario (expira_em);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservas_horario_data ON reservas_horario (data);")
+    cur.execute("DROP TRIGGER IF EXISTS trg_disponibilidade_reservas ON reservas_horario;")
+    cur.execute("""
+    CREATE TRIGGER trg_disponibilidade_reservas
+    AFTER INSERT OR DELETE ON reservas_horario
+    FOR EACH ROW EXECUTE FUNCTION disponibilidade_notificar_dia();
+    """)
+
+    # HORÁRIOS OCUPADOS: uma linha por agendamento ativo ou reserva temporária, com uma
+    # única restrição de sobreposição (folga de 30 min entre eles, INTERVALO_ENTRE_SERVICOS
+    # em horarios/logic.py). Agendamento e reserva concorrentes caem na mesma restrição,
+    # então o banco decide no INSERT, sem lock nem checagem prévia na aplicação.
+    # Mantida pelos triggers abaixo; a reserva sai daqui junto com ela (ON DELETE CASCADE).
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS horarios_ocupados (
+        id SERIAL PRIMARY KEY,
+        agendamento_id INTEGER UNIQUE REFERENCES agendamentos(id) ON DELETE CASCADE,
+        reserva_id INTEGER UNIQUE REFERENCES reservas_horario(id) ON DELETE CASCADE,
+        periodo TSRANGE NOT NULL,
+        CHECK (num_nonnulls(agendamento_id, reserva_id) = 1),
+        CONSTRAINT horarios_ocupados_sem_sobreposicao
+            EXCLUDE USING gist (TSRANGE(LOWER(periodo), UPPER(periodo) + INTERVAL '30 minutes') WITH &&)
+    );
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION horarios_ocupados_agendamentos_inseridos() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO horarios_ocupados (agendamento_id, periodo)
+        SELECT id, periodo FROM novos WHERE status IN ('pendente', 'confirmado');
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION horarios_ocupados_agendamento_alterado() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM horarios_ocupados WHERE agendamento_id = OLD.id;
+        IF NEW.status IN ('pendente', 'confirmado') THEN
+            INSERT INTO horarios_ocupados (agendamento_id, periodo) VALUES (NEW.id, NEW.periodo);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION horarios_ocupados_reserva_inserida() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO horarios_ocupados (reserva_id, periodo) VALUES (NEW.id, NEW.periodo);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_horarios_ocupados_inseridos ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_horarios_ocupados_inseridos
+    AFTER INSERT ON agendamentos
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION horarios_ocupados_agendamentos_inseridos();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_horarios_ocupados_alterado ON agendamentos;")
+    cur.execute("""
+    CREATE TRIGGER trg_horarios_ocupados_alterado
+    AFTER UPDATE ON agendamentos
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.periodo IS DISTINCT FROM NEW.periodo)
+    EXECUTE FUNCTION horarios_ocupados_agendamento_alterado();
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS trg_horarios_ocupados_reserva ON reservas_horario;")
+    cur.execute("""
+    CREATE TRIGGER trg_horarios_ocupados_reserva
+    AFTER INSERT ON reservas_horario
+    FOR EACH ROW EXECUTE FUNCTION horarios_ocupados_reserva_inserida();
+    """)
+    # Carga inicial (tabela vazia). Base com sobreposições antigas: o segundo de cada par
+    # fica de fora (aviso no log) e volta a ser checado quando for alterado.
+    cur.execute("""
+    WITH vazia AS (SELECT NOT EXISTS (SELECT 1 FROM horarios_ocupados) AS ok),
+    ativos AS (
+        SELECT id, periodo FROM agendamentos
+        WHERE status IN ('pendente', 'confirmado') AND (SELECT ok FROM vazia)
+    ),
+    gravados AS (
+        INSERT INTO horarios_ocupados (agendamento_id, periodo)
+        SELECT id, periodo FROM ativos ORDER BY periodo
+        ON CONFLICT DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM ativos) - (SELECT COUNT(*) FROM gravados) AS fora;
+    """)
+    fora = cur.fetchone()["fora"]
+    if fora:
+        print(f"⚠️ {fora} agendamento(s) ativo(s) sobrepostos a outros ficaram fora de horarios_ocupados")
+
+    # IDEMPOTÊNCIA do POST /api/agendar (agendamentos/idempotencia.py): status/resposta
+    # ficam NULL enquanto a transação que criou a chave não termina
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS idempotencia_agendamentos (
+        chave TEXT PRIMARY KEY,
+        hash_requisicao TEXT NOT NULL,
+        status SMALLINT,
+        resposta JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_idempotencia_agendamentos_created ON idempotencia_agendamentos (created_at);")
+    cur.execute(
+        "DELETE FROM idempotencia_agendamentos WHERE created_at < NOW() - MAKE_INTERVAL(hours => %s);",
+        (Config.IDEMPOTENCIA_TTL_HORAS,),
+    )
+
     # ADMIN SESSIONS
     cur.execute("""
     CREATE TABLE IF NOT EXISTS admin_sessions (
@@ -86,6 +992,15 @@ def init_db():
     );
     """)
 
+    # Tickets de uso único do stream SSE: o EventSource não manda header, e o token
+    # da sessão não pode ir na query string (fica em logs e no histórico)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS admin_stream_tickets (
+        ticket TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL
+    );
+    """)
+
     conn.commit()
     cur.close()
-    conn.close()
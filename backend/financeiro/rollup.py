@@ -0,0 +1,46 @@
+"""
+Reconstrói as tabelas financeiro_diario e financeiro_clientes a partir de agendamentos.
+
+Uso (dentro de backend/):
+    python -m financeiro.rollup
+"""
+
+import time
+
+from database import db_connection
+
+
+def reconstruir():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # SHARE bloqueia escritas em agendamentos durante a recarga (leituras seguem),
+        # assim nenhum trigger roda entre o TRUNCATE e o INSERT
+        cur.execute("LOCK TABLE agendamentos IN SHARE MODE")
+        cur.execute("TRUNCATE financeiro_diario, financeiro_clientes")
+        cur.execute(
+            """
+            INSERT INTO financeiro_diario (data, status, forma_pagamento, pago, quantidade, total)
+            SELECT data, COALESCE(status, ''), COALESCE(forma_pagamento, ''), COALESCE(pago, FALSE),
+                   COUNT(*), SUM(valor)
+            FROM agendamentos
+            GROUP BY 1, 2, 3, 4
+            """
+        )
+        linhas = cur.rowcount
+        cur.execute(
+            """
+            INSERT INTO financeiro_clientes (chave, cliente_id, nome, telefone, quantidade, total)
+            SELECT COALESCE('#' || cliente_id, nome || '|' || telefone), MAX(cliente_id), MAX(nome), MAX(telefone),
+                   COUNT(*), SUM(valor)
+            FROM agendamentos
+            GROUP BY 1
+            """
+        )
+        conn.commit()
+    return linhas
+
+
+if __name__ == "__main__":
+    inicio = time.time()
+    linhas = reconstruir()
+    print(f"✅ financeiro_diario (e financeiro_clientes) reconstruída: {linhas} linha(s) em {time.time() - inicio:.2f}s")
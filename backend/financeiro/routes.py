@@ -1,9 +1,21 @@
+from datetime import date, datetime, timedelta
+
 from flask import Blueprint, request, jsonify
 from auth.decorators import admin_required
-from database import get_db_connection
+from config_horarios.grade import obter_grade
+from database import db_connection
+from utils import cursor as cursor_paginacao
 
 financeiro_bp = Blueprint("financeiro", __name__)
 
+# Parâmetros de _build_filters: com qualquer um deles na requisição o resumo é filtrado
+FILTROS = ("cliente", "cliente_id", "mes", "forma_pagamento", "status", "data_inicio", "data_fim", "pago")
+
+
+def sem_filtro(args):
+    """True quando a requisição não traz nenhum filtro (dashboard padrão)."""
+    return not any(args.get(f) for f in FILTROS)
+
 
 def _build_filters(args):
     """
@@ -13,6 +25,7 @@ def _build_filters(args):
     params = []
 
     cliente = args.get("cliente")
+    cliente_id = args.get("cliente_id")
     mes = args.get("mes")  # YYYY-MM
     forma_pagamento = args.get("forma_pagamento")
     status = args.get("status")
@@ -24,9 +37,20 @@ def _build_filters(args):
         where.append("nome ILIKE %s")
         params.append(f"%{cliente}%")
 
+    if cliente_id:
+        where.append("cliente_id = %s")
+        params.append(cliente_id)
+
     if mes:
-        where.append("TO_CHAR(data, 'YYYY-MM') = %s")
-        params.append(mes)
+        # Intervalo semiaberto [1º dia do mês, 1º dia do mês seguinte): usa índice em data
+        try:
+            inicio = datetime.strptime(mes, "%Y-%m").date()
+        except ValueError:
+            where.append("FALSE")
+        else:
+            fim = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+            where.append("data >= %s AND data < %s")
+            params.extend([inicio, fim])
 
     if forma_pagamento:
         where.append("forma_pagamento = %s")
@@ -54,140 +78,302 @@ def _build_filters(args):
     return " AND ".join(where), tuple(params)
 
 
+# Agrupamento por cliente: pelo cliente_id; agendamentos ainda sem vínculo
+# (antes do backfill ou sem telefone) caem no par nome/telefone como antes
+_CHAVE_CLIENTE = "COALESCE('#' || cliente_id, nome || '|' || telefone)"
+
+
 def _num(v):
     # SUM() pode retornar NULL quando não há linhas
     return float(v or 0)
 
 
-@financeiro_bp.get("/api/admin/financeiro")
-@admin_required
-def obter_dados_financeiros():
-    where_sql, params = _build_filters(request.args)
+def _resumo(cur, where_sql, params, usar_rollup=False, filtrado=True):
+    """
+    Todos os agrupamentos do resumo numa única passada (GROUPING SETS), em vez de
+    uma query por agrupamento.
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    Com usar_rollup=True os totais vêm de financeiro_diario (uma linha por
+    dia/status/forma/pago). O ranking por cliente vem de financeiro_clientes quando
+    filtrado=False (nenhum filtro na requisição, ver sem_filtro); com filtro, lê agendamentos.
+    O where_sql serve nas duas tabelas: as colunas filtradas têm os mesmos nomes.
+    """
+    if usar_rollup:
+        fonte = f"""
+            SELECT NULL::text AS cliente, NULL::int AS cliente_id, NULL::text AS nome, NULL::text AS telefone,
+                   quantidade, total,
+                   NULLIF(status, '') AS status, NULLIF(forma_pagamento, '') AS forma_pagamento,
+                   pago, TO_CHAR(data, 'YYYY-MM') AS mes
+            FROM financeiro_diario
+            WHERE {where_sql}
+        """
+    else:
+        fonte = f"""
+            SELECT {_CHAVE_CLIENTE} AS cliente, cliente_id, nome, telefone,
+                   1 AS quantidade, valor AS total, status, forma_pagamento, pago,
+                   TO_CHAR(data, 'YYYY-MM') AS mes
+            FROM agendamentos
+            WHERE {where_sql}
+        """
 
-    # 1) Lista detalhada (para a tabela)
     cur.execute(
         f"""
-        SELECT
-            id,
-            nome,
-            telefone,
-            servico,
-            data::text AS data,
-            horario::text AS horario,
-            valor::float AS valor, -- importante: frontend consegue toFixed()
-            status,
-            forma_pagamento,
-            pago,
-            data_pagamento::text AS data_pagamento
-        FROM agendamentos
-        WHERE {where_sql}
-        ORDER BY data DESC, horario DESC
+        SELECT g.conjunto, g.forma_pagamento, g.status, g.mes, g.quantidade, g.total, g.total_pago,
+               g.total_nao_pago, COALESCE(c.nome, g.nome) AS nome, COALESCE(c.telefone, g.telefone) AS telefone
+        FROM (
+            SELECT
+                CASE
+                    WHEN GROUPING(forma_pagamento) = 0 THEN 'forma_pagamento'
+                    WHEN GROUPING(status) = 0 THEN 'status'
+                    WHEN GROUPING(cliente) = 0 THEN 'cliente'
+                    WHEN GROUPING(mes) = 0 THEN 'mes'
+                    ELSE 'geral'
+                END AS conjunto,
+                forma_pagamento,
+                status,
+                mes,
+                MAX(cliente_id) AS cliente_id,
+                MAX(nome) AS nome,
+                MAX(telefone) AS telefone,
+                COALESCE(SUM(quantidade), 0)::int AS quantidade,
+                COALESCE(SUM(total), 0)::float AS total,
+                COALESCE(SUM(CASE WHEN pago THEN total ELSE 0 END), 0)::float AS total_pago,
+                COALESCE(SUM(CASE WHEN NOT pago THEN total ELSE 0 END), 0)::float AS total_nao_pago
+            FROM ({fonte}) filtrados
+            GROUP BY GROUPING SETS ((), (forma_pagamento), (status), (cliente), (mes))
+        ) g
+        LEFT JOIN clientes c ON c.id = g.cliente_id
         """,
         params,
     )
-    agendamentos = cur.fetchall()
 
-    # 2) Totais gerais
-    cur.execute(
-        f"""
-        SELECT
-            COALESCE(SUM(valor), 0) AS total_faturado,
-            COALESCE(SUM(CASE WHEN pago THEN valor ELSE 0 END), 0) AS total_recebido,
-            COALESCE(SUM(CASE WHEN pago THEN valor ELSE 0 END), 0) AS total_pago,
-            COALESCE(SUM(CASE WHEN NOT pago THEN valor ELSE 0 END), 0) AS total_nao_pago,
-            COUNT(*) AS total_agendamentos
-        FROM agendamentos
-        WHERE {where_sql}
-        """,
-        params,
-    )
-    totals = cur.fetchone() or {}
+    geral = {"quantidade": 0, "total": 0.0, "total_pago": 0.0, "total_nao_pago": 0.0}
+    total_por_forma_pagamento = {}
+    total_por_status = {}
+    total_por_cliente = []
+    total_por_mes = []
 
-    total_faturado = _num(totals.get("total_faturado"))
-    total_recebido = _num(totals.get("total_recebido"))
-    total_pendente = float(total_faturado - total_recebido)
-    total_pago = _num(totals.get("total_pago"))
-    total_nao_pago = _num(totals.get("total_nao_pago"))
-    total_agendamentos = int(totals.get("total_agendamentos") or 0)
+    for r in cur.fetchall():
+        conjunto = r["conjunto"]
+        if conjunto == "geral":
+            geral = r
+        elif conjunto == "forma_pagamento":
+            forma = r["forma_pagamento"] or "pendente"
+            total_por_forma_pagamento[forma] = total_por_forma_pagamento.get(forma, 0.0) + _num(r["total"])
+        elif conjunto == "status":
+            total_por_status[r["status"]] = _num(r["total"])
+        elif conjunto == "cliente":
+            total_por_cliente.append(
+                {"nome": r["nome"], "telefone": r["telefone"], "quantidade": r["quantidade"], "total": _num(r["total"])}
+            )
+        elif conjunto == "mes":
+            total_por_mes.append({"mes": r["mes"], "total": _num(r["total"])})
 
-    # 3) Por forma de pagamento
-    cur.execute(
-        f"""
-        SELECT forma_pagamento, COALESCE(SUM(valor), 0)::float AS total
-        FROM agendamentos
-        WHERE {where_sql}
-        GROUP BY forma_pagamento
-        """,
-        params,
-    )
-    total_por_forma_pagamento = {
-        (r["forma_pagamento"] or "pendente"): _num(r["total"]) for r in cur.fetchall()
+    if usar_rollup and not filtrado:
+        # Sem filtro nenhum: total acumulado por cliente. Não dá para deduzir isso de
+        # params vazios: pago=true e mes inválido filtram sem parâmetro
+        cur.execute(
+            """
+            SELECT COALESCE(c.nome, f.nome) AS nome, COALESCE(c.telefone, f.telefone) AS telefone,
+                   f.quantidade, f.total::float AS total
+            FROM financeiro_clientes f
+            LEFT JOIN clientes c ON c.id = f.cliente_id
+            ORDER BY f.total DESC
+            LIMIT 100
+            """
+        )
+        total_por_cliente = cur.fetchall()
+    elif usar_rollup:
+        cur.execute(
+            f"""
+            SELECT COALESCE(c.nome, g.nome) AS nome, COALESCE(c.telefone, g.telefone) AS telefone,
+                   g.quantidade, g.total
+            FROM (
+                SELECT MAX(cliente_id) AS cliente_id, MAX(nome) AS nome, MAX(telefone) AS telefone,
+                       COUNT(*)::int AS quantidade, COALESCE(SUM(valor), 0)::float AS total
+                FROM agendamentos
+                WHERE {where_sql}
+                GROUP BY {_CHAVE_CLIENTE}
+                ORDER BY total DESC
+                LIMIT 100
+            ) g
+            LEFT JOIN clientes c ON c.id = g.cliente_id
+            """,
+            params,
+        )
+        total_por_cliente = cur.fetchall()
+
+    total_por_cliente.sort(key=lambda c: c["total"], reverse=True)
+    total_por_mes.sort(key=lambda m: m["mes"], reverse=True)
+
+    total_faturado = _num(geral["total"])
+    total_pago = _num(geral["total_pago"])
+
+    return {
+        "total_faturado": total_faturado,
+        "total_recebido": total_pago,
+        "total_pendente": float(total_faturado - total_pago),
+        "total_agendamentos": int(geral["quantidade"] or 0),
+        "total_pago": total_pago,
+        "total_nao_pago": _num(geral["total_nao_pago"]),
+        "total_por_forma_pagamento": total_por_forma_pagamento,
+        "total_por_status": total_por_status,
+        "total_por_cliente": total_por_cliente[:100],
+        "total_por_mes": total_por_mes,
     }
 
-    # 4) Por status
-    cur.execute(
-        f"""
-        SELECT status, COALESCE(SUM(valor), 0)::float AS total
-        FROM agendamentos
-        WHERE {where_sql}
-        GROUP BY status
-        """,
-        params,
-    )
-    total_por_status = {r["status"]: _num(r["total"]) for r in cur.fetchall()}
 
-    # 5) Por cliente
-    cur.execute(
-        f"""
-        SELECT
-            nome,
-            telefone,
-            COUNT(*)::int AS quantidade,
-            COALESCE(SUM(valor), 0)::float AS total
-        FROM agendamentos
-        WHERE {where_sql}
-        GROUP BY nome, telefone
-        ORDER BY total DESC
-        LIMIT 100
-        """,
-        params,
-    )
-    total_por_cliente = cur.fetchall()
+@financeiro_bp.get("/api/admin/financeiro")
+@admin_required
+def obter_dados_financeiros():
+    """
+    ?detalhes=0 omite a lista de agendamentos (só o resumo: uma passada na tabela).
+    ?limite=N pagina a lista detalhada: a resposta traz proximo_cursor enquanto houver
+    mais linhas, e ?cursor=<proximo_cursor> devolve a página seguinte (sem o resumo,
+    que já veio na primeira). ?offset=M continua aceito.
+    """
+    where_sql, params = _build_filters(request.args)
 
-    # 6) Por mês
-    cur.execute(
-        f"""
-        SELECT
-            TO_CHAR(data, 'YYYY-MM') AS mes,
-            COALESCE(SUM(valor), 0)::float AS total
-        FROM agendamentos
-        WHERE {where_sql}
-        GROUP BY mes
-        ORDER BY mes DESC
-        """,
-        params,
-    )
-    total_por_mes = cur.fetchall()
-
-    conn.close()
-
-    return jsonify(
-        {
-            "agendamentos": agendamentos,
-            "resumo": {
-                "total_faturado": total_faturado,
-                "total_recebido": total_recebido,
-                "total_pendente": total_pendente,
-                "total_agendamentos": total_agendamentos,
-                "total_pago": total_pago,
-                "total_nao_pago": total_nao_pago,
-                "total_por_forma_pagamento": total_por_forma_pagamento,
-                "total_por_status": total_por_status,
-                "total_por_cliente": total_por_cliente,
-                "total_por_mes": total_por_mes,
-            },
-        }
-    ), 200
\ No newline at end of file
+    com_detalhes = request.args.get("detalhes", "1").strip().lower() not in ("0", "false")
+    try:
+        limite = int(request.args["limite"]) if request.args.get("limite") else None
+        offset = int(request.args.get("offset") or 0)
+    except ValueError:
+        return jsonify({"error": "limite/offset inválidos"}), 400
+
+    depois_de = None
+    if request.args.get("cursor"):
+        depois_de = cursor_paginacao.decodificar_keyset(request.args["cursor"])
+        if depois_de is None:
+            return jsonify({"error": "cursor inválido"}), 400
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        # 1) Lista detalhada (para a tabela), opcional/paginada
+        agendamentos = []
+        proximo_cursor = None
+        if com_detalhes:
+            lista_sql = where_sql
+            lista_params = params
+            if depois_de:
+                # Keyset na mesma ordem da lista: não relê as páginas anteriores
+                lista_sql += " AND (data, horario, id) < (%s::date, %s::time, %s)"
+                lista_params = params + depois_de
+
+            paginacao_sql = ""
+            paginacao_params = ()
+            if limite is not None:
+                # Uma linha a mais só para saber se existe a próxima página
+                paginacao_sql = "LIMIT %s OFFSET %s"
+                paginacao_params = (max(limite, 0) + 1, max(offset, 0))
+
+            cur.execute(
+                f"""
+                SELECT
+                    id,
+                    nome,
+                    telefone,
+                    servico,
+                    data::text AS data,
+                    horario::text AS horario,
+                    valor::float AS valor, -- importante: frontend consegue toFixed()
+                    status,
+                    forma_pagamento,
+                    pago,
+                    data_pagamento::text AS data_pagamento
+                FROM agendamentos
+                WHERE {lista_sql}
+                ORDER BY data DESC, horario DESC, id DESC
+                {paginacao_sql}
+                """,
+                lista_params + paginacao_params,
+            )
+            agendamentos = cur.fetchall()
+            if limite is not None and len(agendamentos) > limite:
+                agendamentos = agendamentos[:limite]
+                if agendamentos:
+                    proximo_cursor = cursor_paginacao.codificar_keyset(agendamentos[-1])
+
+        # 2) Totais e agrupamentos (do rollup diário quando não há filtro por cliente)
+        resumo = None
+        if not depois_de:
+            por_cliente = request.args.get("cliente") or request.args.get("cliente_id")
+            resumo = _resumo(
+                cur, where_sql, params, usar_rollup=not por_cliente, filtrado=not sem_filtro(request.args)
+            )
+
+    return jsonify({"agendamentos": agendamentos, "resumo": resumo, "proximo_cursor": proximo_cursor}), 200
+
+
+def _periodo(args):
+    """
+    [inicio, fim) do relatório: ?mes=YYYY-MM, ?data_inicio/&data_fim (inclusivos)
+    ou, sem nada, o mês atual. None se as datas forem inválidas.
+    """
+    try:
+        if args.get("mes"):
+            inicio = datetime.strptime(args["mes"], "%Y-%m").date()
+            return inicio, date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        if args.get("data_inicio") or args.get("data_fim"):
+            hoje = date.today()
+            inicio = datetime.strptime(args.get("data_inicio") or hoje.replace(day=1).isoformat(), "%Y-%m-%d").date()
+            fim = datetime.strptime(args.get("data_fim") or hoje.isoformat(), "%Y-%m-%d").date()
+            return inicio, fim + timedelta(days=1)
+    except ValueError:
+        return None
+
+    inicio = date.today().replace(day=1)
+    return inicio, date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+
+@financeiro_bp.get("/api/admin/financeiro/servicos")
+@admin_required
+def obter_financeiro_por_servico():
+    """
+    Por serviço no período: agendamentos, faturamento, minutos agendados e a fatia
+    que esses minutos representam do tempo de atendimento da grade (sem almoço).
+    Aceita os mesmos filtros de /api/admin/financeiro; sem ?status= os cancelados ficam de fora.
+    """
+    periodo = _periodo(request.args)
+    if periodo is None:
+        return jsonify({"error": "Período inválido"}), 400
+    inicio, fim = periodo
+
+    filtros = request.args.copy()
+    filtros.pop("mes", None)
+    filtros["data_inicio"] = inicio.isoformat()
+    filtros["data_fim"] = (fim - timedelta(days=1)).isoformat()
+    where_sql, params = _build_filters(filtros)
+    if not request.args.get("status"):
+        where_sql += " AND status IS DISTINCT FROM 'cancelado'"
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT MAX(i.servico_id) AS servico_id,
+                   COALESCE(MAX(s.nome), MAX(i.nome)) AS nome,
+                   COUNT(DISTINCT i.agendamento_id)::int AS quantidade,
+                   COALESCE(SUM(i.valor), 0)::float AS total,
+                   COALESCE(SUM(i.duracao_minutos), 0)::int AS minutos
+            FROM (SELECT id FROM agendamentos WHERE {where_sql}) a
+            JOIN agendamento_servicos i ON i.agendamento_id = a.id
+            LEFT JOIN servicos s ON s.id = i.servico_id
+            GROUP BY COALESCE(i.servico_id::text, i.nome)
+            ORDER BY total DESC
+            """,
+            params,
+        )
+        servicos = cur.fetchall()
+
+    minutos_disponiveis = obter_grade().minutos_abertos(inicio, fim)
+    for s in servicos:
+        s["ocupacao"] = round(s["minutos"] / minutos_disponiveis, 4) if minutos_disponiveis else None
+
+    return jsonify({
+        "data_inicio": inicio.isoformat(),
+        "data_fim": (fim - timedelta(days=1)).isoformat(),
+        "minutos_disponiveis": minutos_disponiveis,
+        "servicos": servicos,
+    }), 200
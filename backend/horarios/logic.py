@@ -1,9 +1,21 @@
-from datetime import datetime, timedelta
-from database import get_db_connection
+from datetime import date, datetime, timedelta
+from agendamentos import eventos
+from config import Config
+from config_horarios.grade import obter_grade, versao as versao_grade
+from database import db_connection
+from horarios.mapa_dia import MapaDia
+from horarios.snapshot import CANAL_DISPONIBILIDADE, SnapshotDisponibilidade
+from servicos.cache import mapa_servicos, versao as versao_servicos
+
+DURACAO_PADRAO = 60  # serviço desconhecido / sem serviço informado
+DURACAO_BLOQUEIO = 60  # cada horário bloqueado ocupa 1h
+INTERVALO_ENTRE_SERVICOS = 30  # folga antes e depois de cada agendamento
+INTERVALO_SLOTS = 30  # horários oferecidos de meia em meia hora
+ALTERNATIVAS_CONFLITO = 3  # horários sugeridos quando a reserva conflita
 
 
 def _to_minutes(hhmm: str) -> int:
-    h, m = hhmm.split(":")
+    h, m = hhmm.split(":")[:2]
     return int(h) * 60 + int(m)
 
 
@@ -11,109 +23,302 @@ def _to_hhmm(minutes: int) -> str:
     return f"{minutes // 60:02d}:{minutes % 60:02d}"
 
 
-def _slots(inicio: str, fim: str, intervalo: int = 30):
-    ini = _to_minutes(inicio)
-    end = _to_minutes(fim)
-    return [_to_hhmm(m) for m in range(ini, end, intervalo)]
+# "HH:MM" de cada minuto do dia, montado uma vez (evita formatar string por slot)
+_HORAS = [_to_hhmm(m) for m in range(24 * 60)]
 
 
-def calcular_horarios(data_str, servicos):
-    # 1) Busca duração dos serviços selecionados
-    conn = get_db_connection()
-    cur = conn.cursor()
+def _duracao_servicos(servicos, catalogo) -> int:
+    return sum(catalogo[s][1] if s in catalogo else DURACAO_PADRAO for s in servicos) or DURACAO_PADRAO
+
+
+def _servicos_do_texto(servico: str):
+    # agendamentos.servico guarda "Serviço A, Serviço B"
+    return [s.strip() for s in (servico or "").split(",") if s.strip()]
+
+
+def _intervalo_agendamento(row, catalogo):
+    """
+    Intervalo ocupado por um agendamento, já com a folga antes/depois.
+    A duração vem dos itens (agendamento_servicos); agendamento ainda não migrado
+    cai no texto de agendamentos.servico + catálogo atual.
+    """
+    ini = _to_minutes(row["horario"])
+    duracao = row["duracao"] or _duracao_servicos(_servicos_do_texto(row["servico"]), catalogo)
+    return ini - INTERVALO_ENTRE_SERVICOS, ini + duracao + INTERVALO_ENTRE_SERVICOS
+
+
+def _intervalo_reserva(row):
+    # Reserva temporária ocupa como um agendamento (com a folga), até vencer
+    ini = _to_minutes(row["horario"])
+    return ini - INTERVALO_ENTRE_SERVICOS, ini + row["duracao_minutos"] + INTERVALO_ENTRE_SERVICOS
+
+
+def _intervalo_bloqueio(horario: str):
+    ini = _to_minutes(horario)
+    return ini, ini + DURACAO_BLOQUEIO
+
+
+def _slots(janela):
+    """Inícios possíveis do dia: de meia em meia hora a partir da abertura."""
+    return range(janela.inicio, janela.fim, INTERVALO_SLOTS)
+
+
+def _mesclar(intervalos):
+    """Ordena e junta intervalos sobrepostos/adjacentes: O(n log n)."""
+    mesclados = []
+    for ini, fim in sorted(intervalos):
+        if mesclados and ini <= mesclados[-1][1]:
+            if fim > mesclados[-1][1]:
+                mesclados[-1][1] = fim
+        else:
+            mesclados.append([ini, fim])
+    return mesclados
+
+
+def _ocupacao_do_dia(janela, ocupados):
+    """Intervalos ocupados do dia (ocupados + almoço), ordenados e mesclados."""
+    intervalos = list(ocupados)
+    if janela.almoco_inicio is not None:
+        intervalos.append((janela.almoco_inicio, janela.almoco_fim))
+    return _mesclar(intervalos)
+
+
+def _inicios_livres(janela, ocupado, duracao_total):
+    """
+    Inícios (minutos) dos slots em que cabe um serviço de duracao_total minutos.
+    `ocupado` vem de _ocupacao_do_dia; os slots, já em ordem, são varridos junto
+    com os intervalos num único passe.
+    """
+    livres = []
+    i = 0
+    for inicio in _slots(janela):
+        fim = inicio + duracao_total
+        # Serviço precisa terminar até o fechamento
+        if fim > janela.fim:
+            break
+
+        # Descarta intervalos que já terminaram antes deste slot
+        while i < len(ocupado) and ocupado[i][1] <= inicio:
+            i += 1
+
+        # Como os intervalos são disjuntos e ordenados, basta olhar o próximo
+        if i < len(ocupado) and ocupado[i][0] < fim:
+            continue
+
+        livres.append(inicio)
+    return livres
+
+
+def _livres(janela, ocupado, duracao_total):
+    """Horários "HH:MM" do dia em que cabe um serviço de duracao_total minutos."""
+    if not janela.ativo:
+        return []
+    return [_HORAS[inicio] for inicio in _inicios_livres(janela, ocupado, duracao_total)]
+
+
+def _ocupados_periodo(data_inicio: date, data_fim: date, catalogo, ignorar_reserva=None):
+    """
+    ({dia: [intervalos ocupados]}, {dia: segundos até a primeira reserva vencer}) de
+    [data_inicio, data_fim): agendamentos e reservas temporárias com folga + bloqueios.
+    ignorar_reserva: token de reserva que não conta (a do próprio cliente).
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    duracao_total = 60
-    if servicos:
         cur.execute(
             """
-            SELECT nome, duracao_minutos
-            FROM servicos
-            WHERE ativo = TRUE
+            SELECT a.data, a.horario::text AS horario, a.servico, SUM(s.duracao_minutos)::int AS duracao
+            FROM agendamentos a
+            LEFT JOIN agendamento_servicos s ON s.agendamento_id = a.id
+            WHERE a.data >= %s AND a.data < %s AND a.status IN ('pendente', 'confirmado')
+            GROUP BY a.id
+            """,
+            (data_inicio, data_fim),
+        )
+        ocupados = {}
+        for r in cur.fetchall():
+            ocupados.setdefault(r["data"], []).append(_intervalo_agendamento(r, catalogo))
+
+        cur.execute(
             """
+            SELECT data, horario::text
+            FROM horarios_bloqueados
+            WHERE data >= %s AND data < %s
+            """,
+            (data_inicio, data_fim),
         )
-        dur_map = {r["nome"]: int(r["duracao_minutos"]) for r in cur.fetchall()}
-        duracao_total = sum(dur_map.get(s, 60) for s in servicos) or 60
-
-    # 2) Configuração do dia (fallback padrão)
-    data_obj = datetime.strptime(data_str, "%Y-%m-%d")
-    dia_semana = (data_obj.weekday() + 1) % 7  # 0=domingo
-
-    cur.execute(
-        """
-        SELECT horario_inicio::text, horario_fim::text,
-               tem_almoco, almoco_inicio::text, almoco_fim::text, ativo
-        FROM config_horarios
-        WHERE tipo='data_especifica' AND data_especifica=%s
-        LIMIT 1
-        """,
-        (data_str,),
-    )
-    cfg = cur.fetchone()
-
-    if not cfg:
+        for r in cur.fetchall():
+            ocupados.setdefault(r["data"], []).append(_intervalo_bloqueio(r["horario"]))
+
         cur.execute(
             """
-            SELECT horario_inicio::text, horario_fim::text,
-                   tem_almoco, almoco_inicio::text, almoco_fim::text, ativo
-            FROM config_horarios
-            WHERE tipo='dia_semana' AND dia_semana=%s
-            LIMIT 1
+            SELECT data, horario::text AS horario, duracao_minutos,
+                   EXTRACT(EPOCH FROM expira_em - LOCALTIMESTAMP)::float AS segundos
+            FROM reservas_horario
+            WHERE data >= %s AND data < %s AND expira_em > LOCALTIMESTAMP
+              AND token IS DISTINCT FROM %s
             """,
-            (dia_semana,),
+            (data_inicio, data_fim, ignorar_reserva),
         )
-        cfg = cur.fetchone()
-
-    if not cfg:
-        cfg = {
-            "horario_inicio": "08:00:00",
-            "horario_fim": "21:00:00",
-            "tem_almoco": True,
-            "almoco_inicio": "12:00:00",
-            "almoco_fim": "13:00:00",
-            "ativo": True,
-        }
-
-    if not cfg["ativo"]:
-        conn.close()
-        return {"data": data_str, "horarios": []}
-
-    inicio = cfg["horario_inicio"][:5]
-    fim = cfg["horario_fim"][:5]
-    base_slots = _slots(inicio, fim, 30)
-
-    # 3) Horários já ocupados/bloqueados
-    cur.execute(
-        """
-        SELECT horario::text
-        FROM agendamentos
-        WHERE data=%s AND status IN ('pendente', 'confirmado')
-        """,
-        (data_str,),
-    )
-    ocupados = {r["horario"][:5] for r in cur.fetchall()}
-
-    cur.execute("SELECT horario::text FROM horarios_bloqueados WHERE data=%s", (data_str,))
-    bloqueados = {r["horario"][:5] for r in cur.fetchall()}
-
-    conn.close()
-
-    # 4) Filtra almoço + ocupação simples (MVP)
-    livres = []
-    for h in base_slots:
-        if h in ocupados or h in bloqueados:
-            continue
+        vencimentos = {}
+        for r in cur.fetchall():
+            ocupados.setdefault(r["data"], []).append(_intervalo_reserva(r))
+            vencimentos[r["data"]] = min(r["segundos"], vencimentos.get(r["data"], r["segundos"]))
 
-        if cfg["tem_almoco"] and cfg["almoco_inicio"] and cfg["almoco_fim"]:
-            ai = cfg["almoco_inicio"][:5]
-            af = cfg["almoco_fim"][:5]
-            if _to_minutes(ai) <= _to_minutes(h) < _to_minutes(af):
-                continue
+    return ocupados, vencimentos
 
-        # Se duração > 30, valida se o horário final não passa do fechamento
-        fim_servico = _to_minutes(h) + duracao_total
-        if fim_servico > _to_minutes(fim):
-            continue
 
-        livres.append(h)
+def _carregar_periodo(data_inicio: date, data_fim: date, ignorar_reserva=None):
+    """({dia: (janela, intervalos ocupados)}, {dia: segundos até vencer}) de [data_inicio, data_fim), lido do banco."""
+    grade = obter_grade()
+    ocupados, vencimentos = _ocupados_periodo(data_inicio, data_fim, mapa_servicos(), ignorar_reserva)
+    mapas = {}
+    atual = data_inicio
+    while atual < data_fim:
+        janela = grade.janela(atual)
+        mapas[atual] = (janela, _ocupacao_do_dia(janela, ocupados.get(atual, ())) if janela.ativo else None)
+        atual += timedelta(days=1)
+    return mapas, vencimentos
+
+
+def _mapas_periodo(data_inicio: date, data_fim: date, ignorar_reserva=None):
+    """{dia: (janela, intervalos ocupados)} de [data_inicio, data_fim), lido do banco."""
+    return _carregar_periodo(data_inicio, data_fim, ignorar_reserva)[0]
+
+
+_snapshot = SnapshotDisponibilidade(
+    Config.DISPONIBILIDADE_DIAS, Config.DISPONIBILIDADE_SNAPSHOT_TTL, _carregar_periodo
+)
+_snapshot_escutando = False
+
+
+def escutar_disponibilidade():
+    """
+    Liga o snapshot aos NOTIFY de disponibilidade. Chamado uma vez na subida da
+    aplicação (create_app); sem isso o snapshot não é usado e tudo vem do banco.
+    """
+    global _snapshot_escutando
+    eventos.escutar_canal(CANAL_DISPONIBILIDADE, _snapshot.ao_notificar, _snapshot.invalidar_tudo)
+    _snapshot_escutando = True
+
+
+def _snapshot_valido():
+    return _snapshot_escutando and eventos.listener_ativo()
+
+
+def _mapas(data_inicio: date, data_fim: date):
+    """
+    {dia: (janela, intervalos ocupados)} para leitura pública: dias dentro do horizonte vêm do
+    snapshot; o resto (ou tudo, se o listener de NOTIFY não estiver de pé) vem do banco.
+    """
+    mapas = {}
+    eventos.iniciar_listener()
+    if _snapshot_valido():
+        mapas = _snapshot.mapas(data_inicio, data_fim)
+
+    faltando = [data_inicio + timedelta(days=n) for n in range((data_fim - data_inicio).days)]
+    faltando = [d for d in faltando if d not in mapas]
+    if faltando:
+        mapas.update(_mapas_periodo(faltando[0], faltando[-1] + timedelta(days=1)))
+    return mapas
+
+
+def versao_disponibilidade(data_inicio: date, data_fim: date):
+    """
+    Tupla que muda sempre que a disponibilidade de [data_inicio, data_fim) pode ter
+    mudado (catálogo, grade e dias do snapshot). None quando não dá para garantir
+    (listener fora do ar ou dias fora do horizonte do snapshot).
+    """
+    if not _snapshot_valido():
+        return None
+    dias = _snapshot.versoes(data_inicio, data_fim)
+    if dias is None:
+        return None
+    return versao_servicos(), versao_grade(), dias
+
+
+def versao_agendamentos(data_inicio: date, data_fim: date):
+    """
+    Muda sempre que um agendamento ou bloqueio de [data_inicio, data_fim) muda (NOTIFY
+    de disponibilidade), em qualquer data. None sem listener: quem usa cai só no TTL.
+    """
+    if not _snapshot_valido():
+        return None
+    return _snapshot.versao_intervalo(data_inicio, data_fim)
+
+
+def calcular_horarios(data_str, servicos):
+    # 1) Duração dos serviços selecionados
+    duracao_total = _duracao_servicos(servicos, mapa_servicos())
+
+    # 2) Janela + ocupação do dia (snapshot em memória ou banco)
+    dia = datetime.strptime(data_str, "%Y-%m-%d").date()
+    janela, ocupado = _mapas(dia, dia + timedelta(days=1))[dia]
+
+    # 3) Slots onde o serviço cabe
+    return {"data": data_str, "horarios": _livres(janela, ocupado, duracao_total)}
+
+
+def horario_valido(data_str, horario, servicos) -> bool:
+    """
+    Validação de um novo agendamento/reserva: horário na grade, dentro do expediente,
+    fora do almoço e dos bloqueios. Conflito com outros agendamentos e reservas não é
+    checado aqui: quem garante é o INSERT (horarios_ocupados_sem_sobreposicao).
+    Um horário só: o dia vira um MapaDia e o teste é um cabe(), sem varrer os slots.
+    """
+    try:
+        inicio = _to_minutes(horario)
+    except (ValueError, AttributeError):
+        return False
+
+    dia = datetime.strptime(data_str, "%Y-%m-%d").date()
+    janela = obter_grade().janela(dia)
+    if not janela.ativo or inicio not in _slots(janela):
+        return False
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT horario::text AS horario FROM horarios_bloqueados WHERE data = %s", (dia,))
+        bloqueios = [_intervalo_bloqueio(r["horario"]) for r in cur.fetchall()]
+
+    return MapaDia.do_dia(janela, bloqueios).cabe(inicio, _duracao_servicos(servicos, mapa_servicos()))
+
+
+def horarios_alternativos(data_str, horario, servicos, limite=ALTERNATIVAS_CONFLITO, ignorar_reserva=None):
+    """
+    Horários livres do mesmo dia mais próximos do pedido (para a resposta 409).
+    Lê do banco: logo após um conflito o snapshot pode ainda não ter recebido o aviso.
+    """
+    try:
+        pedido = _to_minutes(horario)
+    except (ValueError, AttributeError):
+        pedido = 0
+
+    dia = datetime.strptime(data_str, "%Y-%m-%d").date()
+    janela, ocupado = _mapas_periodo(dia, dia + timedelta(days=1), ignorar_reserva)[dia]
+    if not janela.ativo:
+        return []
+
+    livres = _inicios_livres(janela, ocupado, _duracao_servicos(servicos, mapa_servicos()))
+    return [_HORAS[inicio] for inicio in sorted(livres, key=lambda m: (abs(m - pedido), m))[:limite]]
+
+
+def calcular_disponibilidade_periodo(data_inicio: date, data_fim: date, servicos=None):
+    """
+    Versão em lote de calcular_horarios para o intervalo [data_inicio, data_fim).
+
+    Dias dentro do horizonte do snapshot não consultam o banco; os demais são
+    lidos com um número fixo de queries (agendamentos e bloqueios).
+    Retorna {"YYYY-MM-DD": ["HH:MM", ...]} com o mesmo resultado do cálculo por dia.
+    """
+    duracao_total = _duracao_servicos(servicos or [], mapa_servicos())
+    mapas = _mapas(data_inicio, data_fim)
+
+    disponibilidade = {}
+    atual = data_inicio
+    while atual < data_fim:
+        janela, ocupado = mapas[atual]
+        disponibilidade[atual.isoformat()] = _livres(janela, ocupado, duracao_total)
+        atual += timedelta(days=1)
 
-    return {"data": data_str, "horarios": livres}
\ No newline at end of file
+    return disponibilidade
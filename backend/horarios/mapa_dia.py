@@ -0,0 +1,60 @@
+MINUTOS_DIA = 24 * 60
+_DIA_INTEIRO = (1 << MINUTOS_DIA) - 1
+
+
+def _faixa(inicio, fim):
+    """Máscara com os bits [inicio, fim) ligados (limitada ao dia)."""
+    inicio, fim = max(inicio, 0), min(fim, MINUTOS_DIA)
+    if inicio >= fim:
+        return 0
+    return ((1 << (fim - inicio)) - 1) << inicio
+
+
+class MapaDia:
+    """
+    Ocupação de um dia como um inteiro de 1440 bits: bit m ligado = minuto m
+    (desde 00:00) ocupado.
+
+    ocupar/liberar e cabe são operações de bits sobre um inteiro de tamanho fixo
+    (~23 palavras de máquina), ou seja, custo constante e nenhuma string criada.
+    Usado para validar um horário (horarios.logic.horario_valido); a lista de
+    horários livres do dia continua na varredura de intervalos, que é tão rápida
+    quanto e mais simples.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def do_dia(cls, janela, ocupados=()):
+        """
+        Mapa de um dia de trabalho: fora da janela (config_horarios.grade.JanelaDia),
+        almoço e cada intervalo de `ocupados` ficam marcados como ocupados.
+        """
+        bits = _DIA_INTEIRO & ~_faixa(janela.inicio, janela.fim)
+        if janela.almoco_inicio is not None:
+            bits |= _faixa(janela.almoco_inicio, janela.almoco_fim)
+        for inicio, fim in ocupados:
+            if inicio < 0:
+                inicio = 0
+            if fim > inicio:
+                bits |= ((1 << (fim - inicio)) - 1) << inicio
+        return cls(bits & _DIA_INTEIRO)
+
+    def ocupar(self, inicio, fim):
+        self.bits |= _faixa(inicio, fim)
+
+    def liberar(self, inicio, fim):
+        self.bits &= ~_faixa(inicio, fim)
+
+    def minutos_ocupados(self, inicio, fim):
+        """Quantos minutos de [inicio, fim) estão ocupados."""
+        return (self.bits & _faixa(inicio, fim)).bit_count()
+
+    def cabe(self, inicio, duracao):
+        """Um serviço de `duracao` minutos começando em `inicio` cabe sem sobrepor nada?"""
+        if inicio < 0 or inicio + duracao > MINUTOS_DIA:
+            return False
+        return not (self.bits >> inicio) & ((1 << duracao) - 1)
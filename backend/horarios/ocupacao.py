@@ -0,0 +1,167 @@
+"""
+Mapa de ocupação (dia da semana x meia hora) para um intervalo de datas.
+
+Cada dia vira uma linha de 1440 minutos em matrizes NumPy:
+- capacidade: dentro da janela da grade, fora do almoço e dos horários bloqueados;
+- ocupado: coberto por algum agendamento (duração dos serviços, sem a folga entre eles).
+As linhas são somadas por faixa de 30 min e acumuladas por dia da semana.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+from config import Config
+from config_horarios.grade import obter_grade, versao as versao_grade
+from database import db_connection
+from horarios.logic import (
+    DURACAO_BLOQUEIO,
+    _duracao_servicos,
+    _servicos_do_texto,
+    _to_hhmm,
+    versao_agendamentos,
+)
+from servicos.cache import mapa_servicos, versao as versao_servicos
+
+MINUTOS_DIA = 24 * 60
+FAIXA = 30  # minutos por coluna do mapa
+MAXIMO_DIAS = 731
+# Agendamentos que ocupam a agenda: os ativos (como em horarios_ocupados) e os já realizados
+STATUS_OCUPANDO = ("pendente", "confirmado", "concluido")
+
+_lock = threading.Lock()
+# (inicio, fim, versões de grade/catálogo/agendamentos) -> (resultado, expira_em em time.monotonic())
+_cache = OrderedDict()
+
+
+def _pintar(n_dias, dias, inicios, fins):
+    """Matriz (n_dias, 1440) com True nos minutos cobertos por algum intervalo [inicio, fim)."""
+    delta = np.zeros((n_dias, MINUTOS_DIA + 1), dtype=np.int32)
+    np.add.at(delta, (dias, np.clip(inicios, 0, MINUTOS_DIA)), 1)
+    np.add.at(delta, (dias, np.clip(fins, 0, MINUTOS_DIA)), -1)
+    return np.cumsum(delta, axis=1)[:, :MINUTOS_DIA] > 0
+
+
+def _janelas(grade, inicio, n_dias):
+    """Início/fim do expediente e do almoço de cada dia, em minutos (0/0 = fechado/sem almoço)."""
+    janelas = np.zeros((n_dias, 4), dtype=np.int32)
+    dia = inicio
+    for i in range(n_dias):
+        j = grade.janela(dia)
+        if j.ativo and j.inicio is not None and j.fim is not None:
+            janelas[i, 0], janelas[i, 1] = j.inicio, j.fim
+            if j.almoco_inicio is not None:
+                janelas[i, 2], janelas[i, 3] = j.almoco_inicio, j.almoco_fim
+        dia += timedelta(days=1)
+    return janelas
+
+
+def _carregar_intervalos(inicio, fim):
+    catalogo = mapa_servicos()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT (a.data - %s::date) AS dia,
+                   (EXTRACT(HOUR FROM a.horario) * 60 + EXTRACT(MINUTE FROM a.horario))::int AS minuto,
+                   a.servico, SUM(s.duracao_minutos)::int AS duracao
+            FROM agendamentos a
+            LEFT JOIN agendamento_servicos s ON s.agendamento_id = a.id
+            WHERE a.data >= %s AND a.data < %s AND a.status IN %s
+            GROUP BY a.id
+            """,
+            (inicio, inicio, fim, STATUS_OCUPANDO),
+        )
+        agendamentos = cur.fetchall()
+
+        cur.execute(
+            """
+            SELECT (data - %s::date) AS dia,
+                   (EXTRACT(HOUR FROM horario) * 60 + EXTRACT(MINUTE FROM horario))::int AS minuto
+            FROM horarios_bloqueados
+            WHERE data >= %s AND data < %s
+            """,
+            (inicio, inicio, fim),
+        )
+        bloqueios = cur.fetchall()
+
+    ag = np.array(
+        [
+            (
+                r["dia"],
+                r["minuto"],
+                r["duracao"] or _duracao_servicos(_servicos_do_texto(r["servico"]), catalogo),
+            )
+            for r in agendamentos
+        ],
+        dtype=np.int32,
+    ).reshape(-1, 3)
+    bl = np.array([(r["dia"], r["minuto"]) for r in bloqueios], dtype=np.int32).reshape(-1, 2)
+    return ag, bl
+
+
+def _calcular(inicio, fim):
+    n_dias = (fim - inicio).days
+    minutos = np.arange(MINUTOS_DIA, dtype=np.int32)
+
+    janelas = _janelas(obter_grade(), inicio, n_dias)
+    aberto = (minutos >= janelas[:, 0:1]) & (minutos < janelas[:, 1:2])
+    aberto &= ~((minutos >= janelas[:, 2:3]) & (minutos < janelas[:, 3:4]))
+
+    ag, bl = _carregar_intervalos(inicio, fim)
+    bloqueado = _pintar(n_dias, bl[:, 0], bl[:, 1], bl[:, 1] + DURACAO_BLOQUEIO)
+    capacidade = aberto & ~bloqueado
+    ocupado = _pintar(n_dias, ag[:, 0], ag[:, 1], ag[:, 1] + ag[:, 2]) & capacidade
+
+    # Minutos por faixa de cada dia e depois soma por dia da semana (0 = domingo, como em config_horarios)
+    cap_faixas = capacidade.reshape(n_dias, -1, FAIXA).sum(axis=2)
+    ocu_faixas = ocupado.reshape(n_dias, -1, FAIXA).sum(axis=2)
+    # toordinal() % 7 é 1 na segunda-feira e 0 no domingo
+    dia_semana = (np.arange(inicio.toordinal(), fim.toordinal()) % 7).astype(np.intp)
+
+    cap = np.zeros((7, MINUTOS_DIA // FAIXA), dtype=np.int64)
+    ocu = np.zeros_like(cap)
+    np.add.at(cap, dia_semana, cap_faixas)
+    np.add.at(ocu, dia_semana, ocu_faixas)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilizacao = np.where(cap > 0, np.round(ocu / cap, 4), np.nan)
+
+    return {
+        "data_inicio": inicio.isoformat(),
+        "data_fim": (fim - timedelta(days=1)).isoformat(),
+        "faixas": [_to_hhmm(m) for m in range(0, MINUTOS_DIA, FAIXA)],
+        "dias_semana": list(range(7)),
+        "capacidade_minutos": cap.tolist(),
+        "ocupado_minutos": ocu.tolist(),
+        "utilizacao": [[None if np.isnan(v) else float(v) for v in linha] for linha in utilizacao],
+    }
+
+
+def mapa_ocupacao(inicio, fim):
+    """
+    Mapa para [inicio, fim). Resultados ficam em cache por OCUPACAO_CACHE_TTL segundos;
+    grade, catálogo ou agendamentos/bloqueios do intervalo alterados geram outra chave
+    (as versões entram na chave).
+    """
+    chave = (inicio, fim, versao_grade(), versao_servicos(), versao_agendamentos(inicio, fim))
+    agora = time.monotonic()
+
+    with _lock:
+        item = _cache.get(chave)
+        if item is not None and item[1] > agora:
+            _cache.move_to_end(chave)
+            return item[0]
+
+    resultado = _calcular(inicio, fim)
+
+    with _lock:
+        _cache[chave] = (resultado, agora + Config.OCUPACAO_CACHE_TTL)
+        _cache.move_to_end(chave)
+        while len(_cache) > Config.OCUPACAO_CACHE_TAMANHO:
+            _cache.popitem(last=False)
+
+    return resultado
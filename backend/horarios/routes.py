@@ -1,6 +1,9 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from flask import Blueprint, request, jsonify
-from .logic import calcular_horarios
+from auth.decorators import admin_required
+from utils.http_cache import resposta_json_com_etag
+from .logic import calcular_horarios, calcular_disponibilidade_periodo, versao_disponibilidade
+from .ocupacao import MAXIMO_DIAS, mapa_ocupacao
 
 horarios_bp = Blueprint("horarios", __name__)
 
@@ -11,9 +14,19 @@ def horarios_disponiveis():
     if not data:
         return jsonify({"error": "Data é obrigatória"}), 400
 
+    try:
+        dia = datetime.strptime(data, "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({"error": "Data inválida"}), 400
+
     servicos_param = request.args.get("servicos", "")
     servicos = [s.strip() for s in servicos_param.split(",") if s.strip()]
-    return jsonify(calcular_horarios(data, servicos)), 200
+
+    versao = versao_disponibilidade(dia, dia + timedelta(days=1))
+    return resposta_json_com_etag(
+        lambda: calcular_horarios(data, servicos),
+        versao and ("horarios", data, tuple(servicos)) + versao,
+    )
 
 
 @horarios_bp.get("/api/disponibilidade-mes")
@@ -27,13 +40,27 @@ def disponibilidade_mes():
     mes_i = int(mes)
     ano_i = int(ano)
 
-    atual = datetime(ano_i, mes_i, 1)
-    fim = datetime(ano_i + (1 if mes_i == 12 else 0), 1 if mes_i == 12 else mes_i + 1, 1)
+    inicio = date(ano_i, mes_i, 1)
+    fim = date(ano_i + (1 if mes_i == 12 else 0), 1 if mes_i == 12 else mes_i + 1, 1)
+
+    versao = versao_disponibilidade(inicio, fim)
+    return resposta_json_com_etag(
+        lambda: {"disponibilidade": calcular_disponibilidade_periodo(inicio, fim, [])},
+        versao and ("mes", inicio) + versao,
+    )
+
+
+@horarios_bp.get("/api/admin/ocupacao")
+@admin_required
+def ocupacao():
+    """Mapa dia da semana x meia hora entre data_inicio e data_fim (inclusivos)."""
+    try:
+        inicio = datetime.strptime(request.args.get("data_inicio", ""), "%Y-%m-%d").date()
+        fim = datetime.strptime(request.args.get("data_fim", ""), "%Y-%m-%d").date() + timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "data_inicio e data_fim (YYYY-MM-DD) são obrigatórios"}), 400
 
-    disponibilidade = {}
-    while atual < fim:
-        ds = atual.strftime("%Y-%m-%d")
-        disponibilidade[ds] = calcular_horarios(ds, [])["horarios"]
-        atual += timedelta(days=1)
+    if fim <= inicio or (fim - inicio).days > MAXIMO_DIAS:
+        return jsonify({"error": f"Intervalo deve ter entre 1 e {MAXIMO_DIAS} dias"}), 400
 
-    return jsonify({"disponibilidade": disponibilidade}), 200
\ No newline at end of file
+    return jsonify(mapa_ocupacao(inicio, fim)), 200
@@ -0,0 +1,147 @@
+"""
+Snapshot em memória da ocupação dos próximos dias: (janela, intervalos ocupados) por data.
+
+As leituras públicas (/api/horarios-disponiveis, /api/disponibilidade-mes) respondem
+daqui sem consultar agendamentos. Triggers no banco mandam NOTIFY no canal
+"disponibilidade" a cada alteração:
+
+- "YYYY-MM-DD"        agendamento ou bloqueio mudou naquele dia;
+- "grade:YYYY-MM-DD"  exceção de config_horarios para aquele dia;
+- "grade:*"           modelo semanal de config_horarios (refaz tudo).
+
+O listener de agendamentos.eventos repassa cada aviso para ao_notificar em todos
+os workers; só o dia afetado é recalculado, na próxima leitura.
+
+Reservas temporárias (reservas_horario) vencem sem gerar aviso: o carregamento informa
+em quantos segundos vence a primeira reserva de cada dia, e o dia é recalculado na
+primeira leitura depois disso.
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+from config_horarios import grade
+
+CANAL_DISPONIBILIDADE = "disponibilidade"
+
+
+class SnapshotDisponibilidade:
+    def __init__(self, dias, ttl, carregar):
+        self.dias = dias
+        self._ttl = ttl
+        self._carregar = carregar  # (inicio, fim) -> ({dia: (janela, intervalos)}, {dia: segundos até vencer})
+        self._lock = threading.Lock()
+        self._mapas = {}
+        self._vence_em = {}  # dia -> time.monotonic() em que a primeira reserva temporária vence
+        self._versoes = {}  # dia -> quantas vezes foi invalidado
+        self.versao_global = 0
+        self._expira_em = 0.0
+
+    def horizonte(self):
+        """[1º dia do mês atual, hoje + dias): o mês corrente inteiro entra na visão do calendário."""
+        hoje = date.today()
+        return hoje.replace(day=1), hoje + timedelta(days=self.dias)
+
+    def versao_dia(self, dia):
+        return self.versao_global, self._versoes.get(dia, 0)
+
+    def invalidar_dia(self, dia):
+        with self._lock:
+            self._invalidar_dia(dia)
+
+    def _invalidar_dia(self, dia):
+        # Chamar com o lock
+        self._mapas.pop(dia, None)
+        self._vence_em.pop(dia, None)
+        self._versoes[dia] = self._versoes.get(dia, 0) + 1
+
+    def invalidar_tudo(self):
+        with self._lock:
+            self._mapas.clear()
+            self._vence_em.clear()
+            self._versoes.clear()
+            self.versao_global += 1
+
+    def ao_notificar(self, payload):
+        if payload.startswith("grade:"):
+            grade.invalidar()
+            payload = payload[len("grade:"):]
+        if payload == "*":
+            self.invalidar_tudo()
+            return
+        try:
+            self.invalidar_dia(date.fromisoformat(payload))
+        except ValueError:
+            self.invalidar_tudo()
+
+    def _expirar_se_preciso(self):
+        # Rede de segurança para avisos perdidos (ex.: alteração feita com triggers desligados).
+        # Chamar com o lock.
+        agora = time.monotonic()
+        if agora >= self._expira_em:
+            self._mapas.clear()
+            self._vence_em.clear()
+            self._versoes.clear()
+            self.versao_global += 1
+            self._expira_em = agora + self._ttl
+            return
+        for dia in [d for d, vence in self._vence_em.items() if agora >= vence]:
+            self._invalidar_dia(dia)
+
+    def versao_intervalo(self, inicio, fim):
+        """
+        Versão dos avisos recebidos para [inicio, fim), em qualquer data (também fora do
+        horizonte). Os contadores por dia só crescem até o próximo versao_global, então
+        a soma deles muda sempre que algum dia do intervalo é invalidado.
+        """
+        with self._lock:
+            self._expirar_se_preciso()
+            return self.versao_global, sum(v for d, v in self._versoes.items() if inicio <= d < fim)
+
+    def versoes(self, inicio, fim):
+        """
+        Versão do conteúdo de [inicio, fim): muda quando qualquer dia do intervalo é
+        invalidado. None se o intervalo sai do horizonte (parte vem direto do banco).
+        """
+        h_inicio, h_fim = self.horizonte()
+        if inicio < h_inicio or fim > h_fim:
+            return None
+        with self._lock:
+            self._expirar_se_preciso()
+            return self.versao_global, tuple(
+                self._versoes.get(inicio + timedelta(days=n), 0) for n in range((fim - inicio).days)
+            )
+
+    def mapas(self, inicio, fim):
+        """
+        {dia: (janela, intervalos ocupados)} para os dias de [inicio, fim) dentro do horizonte.
+        Os que faltam são carregados juntos (uma ida ao banco) fora do lock.
+        """
+        h_inicio, h_fim = self.horizonte()
+        inicio, fim = max(inicio, h_inicio), min(fim, h_fim)
+        if inicio >= fim:
+            return {}
+        dias = [inicio + timedelta(days=n) for n in range((fim - inicio).days)]
+
+        with self._lock:
+            self._expirar_se_preciso()
+            resultado = {d: self._mapas[d] for d in dias if d in self._mapas}
+            faltando = [d for d in dias if d not in resultado]
+            versoes = {d: self.versao_dia(d) for d in faltando}
+
+        if not faltando:
+            return resultado
+
+        carregados, vencimentos = self._carregar(faltando[0], faltando[-1] + timedelta(days=1))
+        agora = time.monotonic()
+        with self._lock:
+            for d in faltando:
+                # Invalidado enquanto carregava: usa nesta resposta, mas não guarda
+                if self.versao_dia(d) == versoes[d]:
+                    self._mapas[d] = carregados[d]
+                    if d in vencimentos:
+                        self._vence_em[d] = agora + vencimentos[d]
+                resultado[d] = carregados[d]
+
+        return resultado
@@ -0,0 +1,322 @@
+"""
+Migra o banco SQLite antigo (agendamento.db, do appbkp.py) para o PostgreSQL.
+
+Cada tabela é lida em lotes por faixa de id. O lote e o checkpoint (último id
+migrado, na tabela migracao_sqlite) são gravados na mesma transação: se o processo
+cair, rodar de novo continua do lote seguinte, sem duplicar nada.
+
+- servicos, config_horarios, horarios_bloqueados: execute_values; o que já existe
+  no PostgreSQL (mesmo nome / mesmo dia / mesma data e horário) é mantido;
+- admin_sessions: só as sessões ainda válidas. Usuário e senha do admin não ficam
+  no SQLite (ADMIN_USERNAME / ADMIN_PASSWORD_HASH), não há o que migrar;
+- agendamentos: COPY pela mesma rotina da importação em lote
+  (agendamentos/importacao.py), com as mesmas validações; as linhas rejeitadas
+  aparecem no relatório de cada lote. pix_qrcode/pix_copia_cola não são migrados.
+
+Horários no formato antigo ("8:00", "08:00:00", "08h00", "08:00 - 09:30") viram "HH:MM"
+do início do período. Agendamentos antigos guardavam o nome do período ("manhã",
+"tarde", "noite"): viram o primeiro horário dele em PERIODOS do appbkp.py.
+
+Uso (dentro de backend/):
+    python -m migracao.sqlite_legado [caminho/agendamento.db] [tamanho_do_lote] [--reiniciar]
+"""
+
+import csv
+import io
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+
+import psycopg2.extras
+
+from agendamentos import importacao
+from database import db_connection
+
+LOTE_PADRAO = 5000
+DB_LEGADO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agendamento.db")
+ERROS_POR_LOTE = 10  # linhas rejeitadas de agendamentos mostradas por lote
+
+_HORARIO = re.compile(r"(\d{1,2})\s*[:hH]\s*(\d{2})")
+
+# Primeiro horário de cada período de PERIODOS (appbkp.py), chave sem acento
+_PERIODOS = {"manha": "08:00", "tarde": "14:00", "noite": "17:00"}
+
+
+def _sem_acento(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def _horario(valor):
+    """Início do horário legado em "HH:MM", ou None se não der para ler."""
+    if valor is None:
+        return None
+    periodo = _PERIODOS.get(_sem_acento(str(valor)).strip().lower())
+    if periodo:
+        return periodo
+    achado = _HORARIO.search(str(valor))
+    if not achado:
+        return None
+    horas, minutos = int(achado.group(1)), int(achado.group(2))
+    if horas > 23 or minutos > 59:
+        return None
+    return f"{horas:02d}:{minutos:02d}"
+
+
+def _booleano(valor, padrao):
+    if valor is None or valor == "":
+        return padrao
+    if isinstance(valor, str):
+        return valor.strip().lower() in ("1", "true", "t", "sim", "s")
+    return bool(valor)
+
+
+def _campo(row, coluna, padrao=None):
+    # Bancos antigos podem não ter as colunas criadas depois (forma_pagamento, pago...)
+    return row[coluna] if coluna in row.keys() else padrao
+
+
+def _inserir(cur, sql, valores, template):
+    if not valores:
+        return 0
+    return len(psycopg2.extras.execute_values(cur, sql, valores, template=template, fetch=True))
+
+
+def _migrar_servicos(cur, rows):
+    valores = [
+        (
+            r["nome"], r["valor"], r["duracao_minutos"], _booleano(_campo(r, "ativo"), True),
+            _campo(r, "created_at"), _campo(r, "updated_at"),
+        )
+        for r in rows
+    ]
+    return _inserir(
+        cur,
+        """
+        INSERT INTO servicos (nome, valor, duracao_minutos, ativo, created_at, updated_at)
+        VALUES %s
+        ON CONFLICT (nome) DO NOTHING
+        RETURNING id
+        """,
+        valores,
+        "(%s, %s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP), COALESCE(%s::timestamp, CURRENT_TIMESTAMP))",
+    )
+
+
+def _migrar_config_horarios(cur, rows):
+    valores = []
+    for r in rows:
+        inicio, fim = _horario(r["horario_inicio"]), _horario(r["horario_fim"])
+        if inicio is None or fim is None:
+            continue
+        valores.append((
+            r["tipo"], r["dia_semana"], r["data_especifica"], inicio, fim,
+            _booleano(_campo(r, "tem_almoco"), True),
+            _horario(_campo(r, "almoco_inicio")), _horario(_campo(r, "almoco_fim")),
+            _booleano(_campo(r, "ativo"), True),
+        ))
+    # UNIQUE(tipo, dia_semana, data_especifica) não pega NULL: a checagem é explícita
+    return _inserir(
+        cur,
+        """
+        INSERT INTO config_horarios (tipo, dia_semana, data_especifica, horario_inicio, horario_fim,
+                                     tem_almoco, almoco_inicio, almoco_fim, ativo)
+        SELECT * FROM (VALUES %s) v (tipo, dia_semana, data_especifica, horario_inicio, horario_fim,
+                                     tem_almoco, almoco_inicio, almoco_fim, ativo)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM config_horarios c
+            WHERE c.tipo = v.tipo
+              AND c.dia_semana IS NOT DISTINCT FROM v.dia_semana
+              AND c.data_especifica IS NOT DISTINCT FROM v.data_especifica
+        )
+        RETURNING id
+        """,
+        valores,
+        "(%s, %s::int, %s::date, %s::time, %s::time, %s::boolean, %s, %s, %s::boolean)",
+    )
+
+
+def _migrar_horarios_bloqueados(cur, rows):
+    valores = [
+        (r["data"], _horario(r["horario"]), _campo(r, "motivo"))
+        for r in rows
+        if _horario(r["horario"]) is not None
+    ]
+    return _inserir(
+        cur,
+        """
+        INSERT INTO horarios_bloqueados (data, horario, motivo)
+        VALUES %s
+        ON CONFLICT (data, horario) DO NOTHING
+        RETURNING id
+        """,
+        valores,
+        "(%s::date, %s::time, %s)",
+    )
+
+
+def _migrar_admin_sessions(cur, rows):
+    valores = [(r["session_token"], r["username"], r["expires_at"], _campo(r, "created_at")) for r in rows]
+    return _inserir(
+        cur,
+        """
+        INSERT INTO admin_sessions (session_token, username, expires_at, created_at)
+        SELECT * FROM (VALUES %s) v (session_token, username, expires_at, created_at)
+        WHERE v.expires_at > NOW()
+        ON CONFLICT (session_token) DO NOTHING
+        RETURNING id
+        """,
+        valores,
+        "(%s, %s, %s::timestamp, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))",
+    )
+
+
+def _migrar_agendamentos(cur, rows):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(importacao.COLUNAS)
+    for r in rows:
+        pago = _campo(r, "pago")
+        escritor.writerow([
+            r["id"], r["nome"], r["telefone"], r["servico"], r["data"],
+            # Horário ilegível vai como está: a importação rejeita e mostra no relatório
+            _horario(r["horario"]) or r["horario"], r["valor"], _campo(r, "status"),
+            _campo(r, "forma_pagamento"), _campo(r, "data_pagamento"),
+            None if pago is None else ("true" if _booleano(pago, False) else "false"),
+            _campo(r, "created_at"),
+        ])
+
+    relatorio = importacao.importar_na_transacao(cur.connection, io.BytesIO(buffer.getvalue().encode()), "csv")
+    for motivo in relatorio["motivos"]:
+        print(f"   ⚠️ {motivo['quantidade']} rejeitado(s): {motivo['erro']}")
+    for erro in relatorio["erros"][:ERROS_POR_LOTE]:
+        print(f"      id {erro['id_origem']}: {erro['erro']}")
+    return relatorio["inseridos"]
+
+
+# Ordem importa: agendamentos por último, com o catálogo de serviços já migrado
+# (duração usada na checagem de sobreposição e nos itens de agendamento_servicos)
+TABELAS = [
+    ("servicos", _migrar_servicos),
+    ("config_horarios", _migrar_config_horarios),
+    ("horarios_bloqueados", _migrar_horarios_bloqueados),
+    ("admin_sessions", _migrar_admin_sessions),
+    ("agendamentos", _migrar_agendamentos),
+]
+
+
+def _preparar_checkpoint(conn, reiniciar):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS migracao_sqlite (
+            tabela TEXT PRIMARY KEY,
+            ultimo_id INTEGER NOT NULL,
+            lidos INTEGER NOT NULL DEFAULT 0,
+            inseridos INTEGER NOT NULL DEFAULT 0,
+            atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    if reiniciar:
+        cur.execute("DELETE FROM migracao_sqlite")
+    cur.execute("SELECT tabela, ultimo_id FROM migracao_sqlite")
+    checkpoints = {r["tabela"]: r["ultimo_id"] for r in cur.fetchall()}
+    conn.commit()
+    return checkpoints
+
+
+def _gravar_checkpoint(cur, tabela, ultimo_id, lidos, inseridos):
+    cur.execute(
+        """
+        INSERT INTO migracao_sqlite (tabela, ultimo_id, lidos, inseridos)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (tabela) DO UPDATE SET
+            ultimo_id = EXCLUDED.ultimo_id,
+            lidos = migracao_sqlite.lidos + EXCLUDED.lidos,
+            inseridos = migracao_sqlite.inseridos + EXCLUDED.inseridos,
+            atualizado_em = CURRENT_TIMESTAMP
+        """,
+        (tabela, ultimo_id, lidos, inseridos),
+    )
+
+
+def _migrar_tabela(legado, conn, tabela, migrar, ultimo_id, lote):
+    existe = legado.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)
+    ).fetchone()
+    if not existe:
+        print(f"➖ {tabela}: não existe no banco antigo")
+        return 0, 0
+
+    cur = conn.cursor()
+    lidos = inseridos = 0
+    inicio = time.monotonic()
+    while True:
+        rows = legado.execute(
+            f"SELECT * FROM {tabela} WHERE id > ? ORDER BY id LIMIT ?", (ultimo_id, lote)
+        ).fetchall()
+        if not rows:
+            break
+
+        inicio_lote = time.monotonic()
+        novos = migrar(cur, rows)
+        ultimo_id = rows[-1]["id"]
+        _gravar_checkpoint(cur, tabela, ultimo_id, len(rows), novos)
+        conn.commit()
+
+        lidos += len(rows)
+        inseridos += novos
+        duracao = time.monotonic() - inicio_lote
+        print(
+            f"   {tabela}: até id {ultimo_id} — {len(rows)} lida(s), {novos} inserida(s) "
+            f"({len(rows) / duracao:.0f} linhas/s)"
+        )
+
+    duracao = time.monotonic() - inicio
+    taxa = f", {lidos / duracao:.0f} linhas/s" if lidos else ""
+    print(
+        f"✅ {tabela}: {lidos} lida(s), {inseridos} inserida(s), "
+        f"{lidos - inseridos} ignorada(s) em {duracao:.2f}s{taxa}"
+    )
+    return lidos, inseridos
+
+
+def executar(caminho=DB_LEGADO, lote=LOTE_PADRAO, reiniciar=False):
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Banco antigo não encontrado: {caminho}")
+
+    # Só leitura: o arquivo antigo fica intacto para conferência (verificar_banco.py)
+    legado = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    legado.row_factory = sqlite3.Row
+    try:
+        with db_connection() as conn:
+            checkpoints = _preparar_checkpoint(conn, reiniciar)
+            total_lidos = total_inseridos = 0
+            for tabela, migrar in TABELAS:
+                if tabela in checkpoints:
+                    print(f"↪️ {tabela}: retomando depois do id {checkpoints[tabela]}")
+                lidos, inseridos = _migrar_tabela(
+                    legado, conn, tabela, migrar, checkpoints.get(tabela, 0), lote
+                )
+                total_lidos += lidos
+                total_inseridos += inseridos
+    finally:
+        legado.close()
+
+    return total_lidos, total_inseridos
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if a != "--reiniciar"]
+    caminho = argumentos[0] if argumentos else DB_LEGADO
+    lote = int(argumentos[1]) if len(argumentos) > 1 else LOTE_PADRAO
+    inicio = time.time()
+    lidos, inseridos = executar(caminho, lote, reiniciar="--reiniciar" in sys.argv)
+    duracao = time.time() - inicio
+    print(
+        f"✅ migração: {lidos} linha(s) lida(s), {inseridos} inserida(s) em {duracao:.2f}s "
+        f"({lidos / duracao if duracao else 0:.0f} linhas/s)"
+    )
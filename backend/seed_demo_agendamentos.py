@@ -126,28 +126,34 @@ def main():
                 delta = random.randint(0, 2)
                 data_pagamento = current + timedelta(days=delta)
 
-            cur.execute("""
-                INSERT INTO agendamentos (
-                    nome, telefone, servico, data, horario, valor, status,
-                    forma_pagamento, pago, data_pagamento
-                )
-                VALUES (%s, %s, %s, %s, %s::time, %s, %s, %s, %s, %s)
-                ON CONFLICT (data, horario) DO NOTHING
-                RETURNING id
-            """, (
-                nome,
-                telefone,
-                servico_nome,
-                current.isoformat(),
-                horario,
-                valor,
-                status,
-                forma_pagamento,
-                pago,
-                data_pagamento.isoformat() if data_pagamento else None,
-            ))
-
-            inserted = cur.fetchone()
+            # Sobreposição com outro agendamento ativo (horarios_ocupados_sem_sobreposicao)
+            # só desfaz esta linha
+            cur.execute("SAVEPOINT demo")
+            try:
+                cur.execute("""
+                    INSERT INTO agendamentos (
+                        nome, telefone, servico, data, horario, valor, status,
+                        forma_pagamento, pago, data_pagamento
+                    )
+                    VALUES (%s, %s, %s, %s, %s::time, %s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING  -- mesmo horário
+                    RETURNING id
+                """, (
+                    nome,
+                    telefone,
+                    servico_nome,
+                    current.isoformat(),
+                    horario,
+                    valor,
+                    status,
+                    forma_pagamento,
+                    pago,
+                    data_pagamento.isoformat() if data_pagamento else None,
+                ))
+                inserted = cur.fetchone()
+            except psycopg2.IntegrityError:
+                cur.execute("ROLLBACK TO SAVEPOINT demo")
+                inserted = None
             if inserted:
                 total_inseridos += 1
 
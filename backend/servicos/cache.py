@@ -0,0 +1,50 @@
+from config import Config
+from database import db_connection
+from utils.cache import CacheVersionado
+
+
+def _carregar():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, nome, valor, duracao_minutos
+            FROM servicos
+            WHERE ativo = TRUE
+            ORDER BY nome
+            """
+        )
+        linhas = cur.fetchall()
+
+    return {
+        "linhas": linhas,
+        "mapa": {r["nome"]: (float(r["valor"]), int(r["duracao_minutos"])) for r in linhas},
+        "ids": {r["nome"]: r["id"] for r in linhas},
+    }
+
+
+_catalogo = CacheVersionado(_carregar, ttl=Config.SERVICOS_CACHE_TTL)
+
+
+def listar_ativos():
+    """Linhas de servicos ativos (id, nome, valor, duracao_minutos), ordenadas por nome."""
+    return _catalogo.obter()["linhas"]
+
+
+def mapa_servicos():
+    """{nome: (valor, duracao_minutos)} dos serviços ativos. Não alterar o dict retornado."""
+    return _catalogo.obter()["mapa"]
+
+
+def ids_servicos():
+    """{nome: id} dos serviços ativos. Não alterar o dict retornado."""
+    return _catalogo.obter()["ids"]
+
+
+def versao():
+    _catalogo.obter()
+    return _catalogo.versao
+
+
+def invalidar():
+    _catalogo.invalidar()
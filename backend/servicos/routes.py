@@ -2,42 +2,40 @@ from flask import Blueprint, request, jsonify
 from psycopg2 import IntegrityError
 
 from auth.decorators import admin_required
-from database import get_db_connection
+from config import Config
+from database import db_connection
+from servicos import cache as servicos_cache
+from utils.http_cache import resposta_json_com_etag
 
 servicos_bp = Blueprint("servicos", __name__)
 
 
 @servicos_bp.get("/api/servicos")
 def listar_servicos_publico():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT nome, valor, duracao_minutos
-        FROM servicos
-        WHERE ativo = TRUE
-        ORDER BY nome
-        """
+    return resposta_json_com_etag(
+        lambda: [
+            {"nome": r["nome"], "valor": r["valor"], "duracao_minutos": r["duracao_minutos"]}
+            for r in servicos_cache.listar_ativos()
+        ],
+        ("servicos", servicos_cache.versao()),
+        Config.CACHE_SERVICOS_MAX_AGE,
+        Config.CACHE_STALE_WHILE_REVALIDATE,
     )
-    rows = cur.fetchall()
-    conn.close()
-    return jsonify(rows), 200
 
 
 @servicos_bp.get("/api/admin/servicos")
 @admin_required
 def listar_servicos_admin():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, nome, valor, duracao_minutos, ativo, created_at, updated_at
-        FROM servicos
-        ORDER BY nome
-        """
-    )
-    rows = cur.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, nome, valor, duracao_minutos, ativo, created_at, updated_at
+            FROM servicos
+            ORDER BY nome
+            """
+        )
+        rows = cur.fetchall()
     return jsonify(rows), 200
 
 
@@ -57,25 +55,24 @@ def criar_servico():
     if duracao is None or int(duracao) <= 0:
         return jsonify({"error": "Duração inválida"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO servicos (nome, valor, duracao_minutos, ativo, updated_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            RETURNING id
-            """,
-            (nome, valor, duracao, ativo),
-        )
-        new_id = cur.fetchone()["id"]
-        conn.commit()
-        return jsonify({"success": True, "id": new_id}), 201
-    except IntegrityError:
-        conn.rollback()
-        return jsonify({"error": "Já existe serviço com esse nome"}), 400
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO servicos (nome, valor, duracao_minutos, ativo, updated_at)
+                VALUES (%s, %s, %s, %s, NOW())
+                RETURNING id
+                """,
+                (nome, valor, duracao, ativo),
+            )
+            new_id = cur.fetchone()["id"]
+            conn.commit()
+            servicos_cache.invalidar()
+            return jsonify({"success": True, "id": new_id}), 201
+        except IntegrityError:
+            conn.rollback()
+            return jsonify({"error": "Já existe serviço com esse nome"}), 400
 
 
 @servicos_bp.patch("/api/admin/servicos/<int:servico_id>")
@@ -114,12 +111,12 @@ def atualizar_servico(servico_id):
     campos.append("updated_at = NOW()")
     valores.append(servico_id)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(f"UPDATE servicos SET {', '.join(campos)} WHERE id = %s RETURNING id", tuple(valores))
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE servicos SET {', '.join(campos)} WHERE id = %s RETURNING id", tuple(valores))
+        row = cur.fetchone()
+        conn.commit()
+    servicos_cache.invalidar()
 
     if not row:
         return jsonify({"error": "Serviço não encontrado"}), 404
@@ -130,12 +127,12 @@ def atualizar_servico(servico_id):
 @servicos_bp.delete("/api/admin/servicos/<int:servico_id>")
 @admin_required
 def deletar_servico(servico_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM servicos WHERE id = %s RETURNING id", (servico_id,))
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM servicos WHERE id = %s RETURNING id", (servico_id,))
+        row = cur.fetchone()
+        conn.commit()
+    servicos_cache.invalidar()
 
     if not row:
         return jsonify({"error": "Serviço não encontrado"}), 404
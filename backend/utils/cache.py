@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+class CacheVersionado:
+    """
+    Guarda um único valor carregado sob demanda, com TTL.
+
+    - invalidar() força recarga na próxima leitura (usado pelos handlers que alteram dados);
+    - o TTL cobre alterações feitas por outros workers do gunicorn;
+    - versao muda sempre que o conteúdo carregado muda (útil para ETag).
+    """
+
+    def __init__(self, carregar, ttl):
+        self._carregar = carregar
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._valor = None
+        self._expira_em = 0.0
+        self.versao = 0
+
+    def obter(self):
+        if time.monotonic() < self._expira_em:
+            return self._valor
+
+        with self._lock:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock
+            if time.monotonic() < self._expira_em:
+                return self._valor
+
+            novo = self._carregar()
+            if novo != self._valor:
+                self.versao += 1
+            self._valor = novo
+            self._expira_em = time.monotonic() + self._ttl
+            return novo
+
+    def invalidar(self):
+        with self._lock:
+            self._expira_em = 0.0
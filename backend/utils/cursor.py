@@ -0,0 +1,30 @@
+import base64
+import json
+
+
+def codificar(valores):
+    """Cursor opaco de paginação: a lista de valores em JSON, em base64 url-safe."""
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+def decodificar(cursor):
+    """Lista de valores de um cursor de codificar(); None se o cursor for inválido."""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def codificar_keyset(row):
+    """Cursor da paginação de agendamentos por (data, horario, id), a partir da última linha."""
+    return codificar([row["data"], row["horario"], row["id"]])
+
+
+def decodificar_keyset(cursor):
+    """(data, horario, id) de um cursor de codificar_keyset(); None se inválido."""
+    try:
+        data, horario, ag_id = decodificar(cursor)
+        return str(data), str(horario), int(ag_id)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,54 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+_TAMANHO_MEMO = 256
+
+_lock = threading.Lock()
+# versão -> (etag, corpo JSON já serializado)
+_memo = OrderedDict()
+
+
+def resposta_json_com_etag(gerar, versao, max_age=None, stale_while_revalidate=0):
+    """
+    Resposta JSON com ETag forte, If-None-Match (304) e Cache-Control.
+
+    Com max_age=None sai "no-cache": o navegador/proxy guarda a resposta mas revalida
+    a cada uso (If-None-Match -> 304), para dados que mudam a qualquer momento como a
+    disponibilidade. max_age só para o catálogo, que quase não muda.
+
+    A ETag é o hash do corpo, então é a mesma em qualquer worker do gunicorn.
+    `versao` é uma tupla que muda sempre que o conteúdo pode ter mudado (contadores
+    de versão deste processo); enquanto ela não muda, corpo e ETag saem do memo sem
+    chamar `gerar`. Com versao=None o corpo é sempre gerado.
+    """
+    item = None
+    if versao is not None:
+        with _lock:
+            item = _memo.get(versao)
+            if item is not None:
+                _memo.move_to_end(versao)
+
+    if item is None:
+        corpo = current_app.json.dumps(gerar())
+        etag = hashlib.sha256(corpo.encode()).hexdigest()[:32]
+        item = (etag, corpo)
+        if versao is not None:
+            with _lock:
+                _memo[versao] = item
+                while len(_memo) > _TAMANHO_MEMO:
+                    _memo.popitem(last=False)
+
+    etag, corpo = item
+    if max_age is None:
+        cache_control = "no-cache"
+    else:
+        cache_control = f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+    cabecalhos = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+
+    # If-None-Match usa comparação fraca (RFC 9110), para aceitar a ETag vinda de proxy como W/"..."
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=cabecalhos)
+    return Response(corpo, status=200, mimetype="application/json", headers=cabecalhos)
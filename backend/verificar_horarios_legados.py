@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Verifica a leitura dos horários do banco SQLite antigo (migracao/sqlite_legado.py).
+
+Não acessa banco nenhum: passa cada formato que o appbkp.py gravava por _horario()
+e confere o "HH:MM" resultante, inclusive os nomes de período (PERIODOS).
+
+Uso (dentro de backend/):
+    python verificar_horarios_legados.py
+"""
+
+import sys
+
+from migracao.sqlite_legado import _horario
+
+# (valor gravado no SQLite, horário esperado no PostgreSQL)
+CASOS = [
+    ("08:00", "08:00"),
+    ("8:00", "08:00"),
+    ("08:00:00", "08:00"),
+    ("08h00", "08:00"),
+    ("14:30 - 16:00", "14:30"),
+    ("manhã", "08:00"),
+    ("Manhã", "08:00"),
+    ("manha", "08:00"),
+    (" tarde ", "14:00"),
+    ("NOITE", "17:00"),
+    ("madrugada", None),
+    ("25:00", None),
+    ("", None),
+    (None, None),
+]
+
+
+def main():
+    falhas = 0
+    for valor, esperado in CASOS:
+        obtido = _horario(valor)
+        if obtido == esperado:
+            print(f"✅ {valor!r} -> {obtido!r}")
+        else:
+            falhas += 1
+            print(f"❌ {valor!r} -> {obtido!r} (esperado {esperado!r})")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Verifica (via EXPLAIN) que os filtros do financeiro usam índice.
+
+Só roda num banco descartável, em VERIFICACAO_DATABASE_URL (nunca no DATABASE_URL):
+cria o schema do sistema num schema temporário, insere uma massa de agendamentos,
+roda ANALYZE, confere o plano de cada filtro de _build_filters e apaga o schema no final.
+
+Uso (dentro de backend/):
+    VERIFICACAO_DATABASE_URL=postgresql://.../rascunho python verificar_indices_financeiro.py
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+from werkzeug.datastructures import MultiDict
+
+from database import _criar_schema
+from financeiro.routes import _build_filters
+
+TOTAL_LINHAS = 50000
+
+# (descrição, filtros da querystring, índices aceitos no plano)
+CASOS = [
+    ("mês", {"mes": "2021-03"}, ("idx_agendamentos_data_status", "idx_agendamentos_keyset")),
+    ("mês + status", {"mes": "2021-03", "status": "cancelado"}, ("idx_agendamentos_data_status",)),
+    ("período", {"data_inicio": "2021-03-01", "data_fim": "2021-03-10"},
+     ("idx_agendamentos_data_status", "idx_agendamentos_keyset")),
+    ("forma de pagamento", {"forma_pagamento": "pix"}, ("idx_agendamentos_forma_data",)),
+    ("pago + mês", {"pago": "true", "mes": "2021-03"},
+     ("idx_agendamentos_pago_data", "idx_agendamentos_data_status", "idx_agendamentos_keyset")),
+    ("cliente", {"cliente": "cliente 4242"}, ("idx_agendamentos_nome_trgm",)),
+]
+
+
+def _popular(cur):
+    # 48 horários por dia (meia em meia hora) a partir de 2020-01-01; ~3% pix/pago, ~5% cancelado
+    cur.execute(
+        """
+        INSERT INTO agendamentos (nome, telefone, servico, data, horario, valor, status, forma_pagamento, pago)
+        SELECT 'Cliente ' || i, '119' || LPAD(i::text, 8, '0'), 'Corte',
+               DATE '2020-01-01' + (i / 48),
+               TIME '00:00' + (i %% 48) * INTERVAL '30 minutes',
+               50,
+               CASE WHEN i %% 20 = 0 THEN 'cancelado' ELSE 'concluido' END,
+               CASE WHEN i %% 33 = 0 THEN 'pix' ELSE 'dinheiro' END,
+               i %% 33 = 0
+        FROM generate_series(1, %s) AS i
+        """,
+        (TOTAL_LINHAS,),
+    )
+    cur.execute("ANALYZE agendamentos")
+
+
+def _url_descartavel():
+    url = os.getenv("VERIFICACAO_DATABASE_URL")
+    if not url:
+        print("❌ Defina VERIFICACAO_DATABASE_URL com um banco descartável (o script insere dados)")
+        return None
+    if url == os.getenv("DATABASE_URL"):
+        print("❌ VERIFICACAO_DATABASE_URL é o mesmo banco do DATABASE_URL; use um banco descartável")
+        return None
+    return url
+
+
+@contextmanager
+def schema_descartavel(prefixo):
+    """
+    Conexão com o schema do sistema criado num schema temporário do banco de
+    VERIFICACAO_DATABASE_URL, apagado na saída. None se o banco não for descartável.
+    """
+    url = _url_descartavel()
+    if not url:
+        yield None
+        return
+
+    conn = psycopg2.connect(url, cursor_factory=psycopg2.extras.RealDictCursor)
+    schema = f"{prefixo}_{os.getpid()}"
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}, public")
+    conn.commit()
+    try:
+        _criar_schema(conn)
+        yield conn
+    finally:
+        conn.rollback()
+        conn.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+def main():
+    with schema_descartavel("verificacao_indices") as conn:
+        if conn is None:
+            return 2
+        return _verificar(conn)
+
+
+def _verificar(conn):
+    falhas = 0
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    tem_trgm = cur.fetchone() is not None
+
+    _popular(cur)
+
+    for descricao, filtros, indices in CASOS:
+        if "idx_agendamentos_nome_trgm" in indices and not tem_trgm:
+            print(f"⏭️  {descricao}: pg_trgm não instalado, ignorado")
+            continue
+
+        where_sql, params = _build_filters(MultiDict(filtros))
+        cur.execute(f"EXPLAIN SELECT * FROM agendamentos WHERE {where_sql}", params)
+        plano = "\n".join(linha["QUERY PLAN"] for linha in cur.fetchall())
+
+        if any(indice in plano for indice in indices):
+            print(f"✅ {descricao}")
+        else:
+            falhas += 1
+            print(f"❌ {descricao}: nenhum de {indices} no plano")
+            print("   " + plano.replace("\n", "\n   "))
+
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Verifica que o resumo do financeiro é coerente com o filtro pedido: para cada
+combinação de filtros, a soma do ranking por cliente tem de bater com o total
+faturado e com o total de agendamentos (inclusive quando o ranking vem do rollup).
+
+Só roda num banco descartável, em VERIFICACAO_DATABASE_URL (nunca no DATABASE_URL),
+num schema temporário apagado no final.
+
+Uso (dentro de backend/):
+    VERIFICACAO_DATABASE_URL=postgresql://.../rascunho python verificar_resumo_financeiro.py
+"""
+
+import sys
+
+from werkzeug.datastructures import MultiDict
+
+from financeiro.routes import _build_filters, _resumo, sem_filtro
+from verificar_indices_financeiro import schema_descartavel
+
+# (descrição, filtros da querystring)
+CASOS = [
+    ("sem filtro", {}),
+    ("pago", {"pago": "true"}),
+    ("não pago", {"pago": "false"}),
+    ("mês", {"mes": "2024-02"}),
+    ("mês inválido", {"mes": "2024-13"}),
+    ("status", {"status": "cancelado"}),
+    ("forma de pagamento", {"forma_pagamento": "pix"}),
+    ("período", {"data_inicio": "2024-01-10", "data_fim": "2024-02-10"}),
+    ("cliente", {"cliente": "ana"}),
+]
+
+
+def _popular(cur):
+    # 4 clientes, um agendamento por dia, misturando pago/status/forma e dois meses
+    cur.execute(
+        """
+        INSERT INTO agendamentos (nome, telefone, servico, data, horario, valor, status, forma_pagamento, pago)
+        SELECT (ARRAY['Ana', 'Bia', 'Carla', 'Duda'])[i % 4 + 1],
+               '1199999000' || (i % 4),
+               'Corte',
+               DATE '2024-01-01' + i,
+               TIME '10:00',
+               10 + i,
+               CASE WHEN i % 5 = 0 THEN 'cancelado' ELSE 'concluido' END,
+               CASE WHEN i % 3 = 0 THEN 'pix' ELSE 'dinheiro' END,
+               i % 2 = 0
+        FROM generate_series(0, 59) AS i
+        """
+    )
+
+
+def _verificar(conn):
+    falhas = 0
+    cur = conn.cursor()
+    _popular(cur)
+
+    for descricao, filtros in CASOS:
+        args = MultiDict(filtros)
+        where_sql, params = _build_filters(args)
+        por_cliente = bool(args.get("cliente") or args.get("cliente_id"))
+        resumo = _resumo(cur, where_sql, params, usar_rollup=not por_cliente, filtrado=not sem_filtro(args))
+
+        ranking = resumo["total_por_cliente"]
+        total = round(sum(c["total"] for c in ranking), 2)
+        quantidade = sum(c["quantidade"] for c in ranking)
+        esperado = (round(resumo["total_faturado"], 2), resumo["total_agendamentos"])
+
+        if (total, quantidade) == esperado:
+            print(f"✅ {descricao}: {quantidade} agendamento(s), R$ {total:.2f}")
+        else:
+            falhas += 1
+            print(f"❌ {descricao}: ranking soma {(total, quantidade)}, resumo diz {esperado}")
+
+    return 1 if falhas else 0
+
+
+def main():
+    with schema_descartavel("verificacao_resumo") as conn:
+        if conn is None:
+            return 2
+        return _verificar(conn)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,8 @@ const toNumber = (v) => Number(v ?? 0);
 const toMoneyNumber = (v) => Number(v ?? 0);
 
 let agendamentos = [];
+let cursorAlteracoes = null;
+let streamAtivo = false;
 let filtros = {
   dataInicio: null,
   dataFim: null,
@@ -40,6 +42,9 @@ async function carregarAgendamentos() {
     if (filtros.nome) params.append("nome", filtros.nome);
     if (filtros.telefone) params.append("telefone", filtros.telefone);
 
+    // Lista completa (sem paginação por cursor)
+    params.append("todos", "1");
+
     // Adicionar timestamp para evitar cache
     params.append("_t", Date.now());
 
@@ -178,6 +183,157 @@ async function carregarAgendamentos() {
   }
 }
 
+// Consultar só o que mudou desde o último cursor; recarrega a lista apenas se algo mudou
+async function verificarAlteracoes() {
+  try {
+    const token = localStorage.getItem("admin_token");
+    const headers = {};
+    if (token) {
+      headers["Authorization"] = `Bearer ${token}`;
+    }
+
+    const params = new URLSearchParams();
+    if (cursorAlteracoes) params.append("since", cursorAlteracoes);
+
+    const response = await fetch(
+      `${API_URL}/admin/agendamentos/changes?${params.toString()}`,
+      {
+        credentials: "include",
+        method: "GET",
+        headers: headers,
+        cache: "no-store",
+        mode: "cors",
+      },
+    );
+
+    if (!response.ok) {
+      if (response.status === 401) {
+        window.location.href = "login.html";
+      }
+      return;
+    }
+
+    const data = await response.json();
+    const primeiraConsulta = !cursorAlteracoes;
+    cursorAlteracoes = data.cursor;
+
+    if (primeiraConsulta) return;
+
+    if (data.recarregar) {
+      await carregarAgendamentos();
+    } else if (data.alterados.length > 0 || data.removidos.length > 0) {
+      if (DEBUG) console.log("🔄 Alterações detectadas:", data);
+      aplicarAlteracoes(data.alterados, data.removidos);
+    }
+  } catch (error) {
+    if (DEBUG) console.error("❌ Erro ao verificar alterações:", error);
+  }
+}
+
+// Mesmos filtros do backend (data, status, nome/telefone com ILIKE)
+function correspondeAosFiltros(ag) {
+  if (filtros.dataInicio && ag.data < filtros.dataInicio) return false;
+  if (filtros.dataFim && ag.data > filtros.dataFim) return false;
+  if (filtros.status && ag.status !== filtros.status) return false;
+  if (
+    filtros.nome &&
+    !(ag.nome || "").toLowerCase().includes(filtros.nome.toLowerCase())
+  )
+    return false;
+  if (filtros.telefone && !(ag.telefone || "").includes(filtros.telefone))
+    return false;
+  return true;
+}
+
+// Aplica o delta do feed na lista carregada, sem buscar a lista inteira de novo
+function aplicarAlteracoes(alterados, removidos) {
+  const porId = new Map(agendamentos.map((ag) => [ag.id, ag]));
+  removidos.forEach((id) => porId.delete(id));
+  alterados.forEach((ag) => {
+    if (correspondeAosFiltros(ag)) {
+      porId.set(ag.id, ag);
+    } else {
+      porId.delete(ag.id); // saiu do filtro (ex.: mudou de status)
+    }
+  });
+
+  // Mesma ordem da listagem: data DESC, horario DESC
+  agendamentos = [...porId.values()].sort((a, b) =>
+    a.data !== b.data
+      ? b.data.localeCompare(a.data)
+      : b.horario.localeCompare(a.horario),
+  );
+  renderizarAgendamentos();
+  atualizarStats();
+}
+
+// Stream de eventos (SSE): enquanto conectado, o poll de alterações fica parado.
+// O EventSource não manda o header Authorization: cada conexão usa um ticket de uso
+// único, então a reconexão é feita aqui (novo ticket + last_event_id), não pelo navegador.
+let ultimoEventoId = null;
+let esperaReconexao = 5000;
+
+async function pedirTicketStream() {
+  const token = localStorage.getItem("admin_token");
+  if (!token) return null;
+  const response = await fetch(`${API_URL}/admin/agendamentos/stream/ticket`, {
+    credentials: "include",
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+    mode: "cors",
+  });
+  if (!response.ok) return null;
+  return (await response.json()).ticket;
+}
+
+async function iniciarStreamAgendamentos() {
+  if (!window.EventSource) return;
+
+  let ticket = null;
+  try {
+    ticket = await pedirTicketStream();
+  } catch (error) {
+    if (DEBUG) console.error("❌ Erro ao pedir ticket do stream:", error);
+  }
+  if (!ticket) {
+    setTimeout(iniciarStreamAgendamentos, esperaReconexao);
+    return;
+  }
+
+  const params = new URLSearchParams({ ticket });
+  if (ultimoEventoId) params.append("last_event_id", ultimoEventoId);
+  const fonte = new EventSource(
+    `${API_URL}/admin/agendamentos/stream?${params.toString()}`,
+    { withCredentials: true },
+  );
+
+  // Vários eventos em sequência geram uma única consulta ao feed de alterações
+  let consulta = null;
+  const agendarConsulta = (evento) => {
+    if (DEBUG) console.log("📡 Evento recebido:", evento.type, evento.data);
+    if (evento.lastEventId) ultimoEventoId = evento.lastEventId;
+    clearTimeout(consulta);
+    consulta = setTimeout(verificarAlteracoes, 500);
+  };
+
+  fonte.onopen = () => {
+    streamAtivo = true;
+    esperaReconexao = 5000;
+  };
+  // Fim do stream, erro ou 503 (limite de streams): o poll assume até reconectar
+  fonte.onerror = () => {
+    fonte.close();
+    streamAtivo = false;
+    setTimeout(iniciarStreamAgendamentos, esperaReconexao);
+    esperaReconexao = Math.min(esperaReconexao * 2, 60000);
+  };
+
+  ["criado", "atualizado", "removido", "limpeza", "importacao"].forEach((tipo) =>
+    fonte.addEventListener(tipo, agendarConsulta),
+  );
+  fonte.addEventListener("recarregar", () => carregarAgendamentos());
+}
+
 // Renderizar agendamentos na tabela
 function renderizarAgendamentos() {
   const tbody = document.getElementById("agendamentos-tbody");
@@ -1344,6 +1500,8 @@ async function deletarAgendamento(id) {
     }
   }
 
+  // Cursor do feed de alterações antes da carga completa, para não perder nada entre as duas
+  await verificarAlteracoes();
   await carregarAgendamentos();
 
   // Verificar autenticação periodicamente (a cada 5 minutos)
@@ -1355,6 +1513,11 @@ async function deletarAgendamento(id) {
     }
   }, 300000);
 
-  // Auto-atualizar agendamentos a cada 30 segundos
-  setInterval(carregarAgendamentos, 30000);
+  // Atualizações em tempo real via SSE
+  iniciarStreamAgendamentos();
+
+  // Sem stream conectado, a cada 30 segundos consulta só as alterações
+  setInterval(() => {
+    if (!streamAtivo) verificarAlteracoes();
+  }, 30000);
 })();
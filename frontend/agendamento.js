@@ -18,6 +18,8 @@ let servicosSelecionados = []; // Mudança: agora é uma lista para múltiplos s
 let servicoSelecionado = null; // Manter para compatibilidade temporária
 let dataSelecionada = null;
 let horarioSelecionado = null;
+let reservaToken = null; // reserva temporária do horário escolhido (/reservas-horario)
+let chaveIdempotencia = null; // Idempotency-Key: reenvios do mesmo formulário não duplicam
 let mesAtual = new Date().getMonth();
 let anoAtual = new Date().getFullYear();
 const anoLimite = anoAtual + 2; // Permitir até 2 anos à frente (março em diante)
@@ -656,7 +658,10 @@ async function mostrarSelecaoHorario() {
     document.body.appendChild(modal);
 
     modal.querySelectorAll(".horario-btn-modal").forEach((btn) => {
-      btn.addEventListener("click", () => {
+      btn.addEventListener("click", async () => {
+        // Segura o horário enquanto o formulário é preenchido
+        const reservado = await reservarHorario(btn.dataset.horario);
+        if (!reservado) return;
         // Salvar o horário específico selecionado
         horarioSelecionado = btn.dataset.horario;
         document.body.removeChild(modal);
@@ -680,8 +685,57 @@ async function mostrarSelecaoHorario() {
   }
 }
 
+// Reserva temporária: o horário fica segurado por alguns minutos para este cliente.
+// Retorna false só quando o horário já foi pego; falha de rede segue sem reserva.
+async function reservarHorario(horario) {
+  try {
+    const response = await fetch(`${API_URL}/reservas-horario`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        data: dataSelecionada,
+        horario: horario,
+        servicos: servicosSelecionados,
+        substituir: reservaToken,
+      }),
+    });
+    const result = await response.json();
+
+    if (response.status === 409) {
+      mostrarMensagem(mensagemConflito(result), "error");
+      return false;
+    }
+    reservaToken = response.ok ? result.token : null;
+  } catch (error) {
+    if (DEBUG) console.error("Erro ao reservar horário:", error);
+    reservaToken = null;
+  }
+  return true;
+}
+
+function liberarReserva() {
+  if (!reservaToken) return;
+  fetch(`${API_URL}/reservas-horario/${encodeURIComponent(reservaToken)}`, {
+    method: "DELETE",
+  }).catch(() => {});
+  reservaToken = null;
+}
+
+function mensagemConflito(result) {
+  const alternativas = result.alternativas || [];
+  let texto = result.error || "Horário indisponível";
+  if (alternativas.length > 0) {
+    texto += `. Horários próximos livres: ${alternativas.join(", ")}`;
+  }
+  return texto;
+}
+
 // Mostrar formulário
 function mostrarFormulario() {
+  chaveIdempotencia = window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
   const dataObj = new Date(dataSelecionada + "T00:00:00");
   const dataFormatada = dataObj.toLocaleDateString("pt-BR", {
     weekday: "long",
@@ -711,6 +765,7 @@ function mostrarFormulario() {
 
 // Cancelar seleção
 cancelBtn.addEventListener("click", () => {
+  liberarReserva();
   bookingFormContainer.style.display = "none";
   dataSelecionada = null;
   horarioSelecionado = null;
@@ -745,6 +800,7 @@ form.addEventListener("submit", async function (e) {
     servicos: servicosSelecionados, // Mudança: enviar lista de serviços
     data: dataSelecionada,
     horario: horarioSelecionado,
+    reserva: reservaToken,
   };
 
   // Debug: verificar formData antes de enviar
@@ -783,6 +839,7 @@ form.addEventListener("submit", async function (e) {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "Idempotency-Key": chaveIdempotencia,
       },
       body: jsonBody,
     });
@@ -852,8 +909,12 @@ form.addEventListener("submit", async function (e) {
       form.reset();
       dataSelecionada = null;
       horarioSelecionado = null;
+      reservaToken = null;
+      chaveIdempotencia = null;
       servicosSelecionados = [];
       servicoSelecionado = null;
+    } else if (response.status === 409) {
+      mostrarMensagem(mensagemConflito(result), "error");
     } else {
       mostrarMensagem(result.error || "Erro ao realizar agendamento", "error");
     }
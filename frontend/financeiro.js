@@ -38,14 +38,13 @@ async function verificarAutenticacao() {
 
 // Variáveis globais
 let dadosFinanceiros = null;
+let agendamentosCarregados = [];
+let proximoCursor = null;
+let filtrosLista = null; // filtros da lista em exibição (o cursor só vale para eles)
+const TAMANHO_PAGINA = 50;
 
-// Carregar dados financeiros
-async function carregarDadosFinanceiros() {
-  const token = localStorage.getItem("admin_token");
-  const loading = document.getElementById("loading");
-  const tabela = document.getElementById("tabela-detalhada");
-
-  // Obter filtros
+// Query string com os filtros da tela
+function montarFiltros() {
   const cliente = document.getElementById("filter-cliente").value.trim();
   const mes = document.getElementById("filter-mes").value;
   const formaPagamento = document.getElementById(
@@ -65,27 +64,62 @@ async function carregarDadosFinanceiros() {
   if (pago) params.append("pago", pago);
   if (dataInicio) params.append("data_inicio", dataInicio);
   if (dataFim) params.append("data_fim", dataFim);
+  return params;
+}
 
-  try {
-    const headers = {
-      Authorization: `Bearer ${token}`,
-      "Cache-Control": "no-cache",
-    };
+// GET autenticado em /admin/financeiro{caminho}
+async function buscarFinanceiro(caminho, params) {
+  const token = localStorage.getItem("admin_token");
+  const headers = {
+    Authorization: `Bearer ${token}`,
+    "Cache-Control": "no-cache",
+  };
 
-    const response = await fetch(
-      `${API_URL}/admin/financeiro?${params.toString()}`,
-      {
-        method: "GET",
-        credentials: "include",
-        headers: headers,
-      },
-    );
+  const response = await fetch(
+    `${API_URL}/admin/financeiro${caminho}?${params.toString()}`,
+    {
+      method: "GET",
+      credentials: "include",
+      headers: headers,
+    },
+  );
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+// Carregar dados financeiros: resumo, serviços e a primeira página da lista.
+// manterLista: na auto-atualização, se já foram abertas outras páginas,
+// só o resumo é recarregado, para não perder a lista que está sendo lida.
+async function carregarDadosFinanceiros({ manterLista = false } = {}) {
+  const loading = document.getElementById("loading");
+  const tabela = document.getElementById("tabela-detalhada");
 
-    dadosFinanceiros = await response.json();
+  const params = montarFiltros();
+  const soResumo =
+    manterLista && agendamentosCarregados.length > TAMANHO_PAGINA;
+  const paramsLista = soResumo ? new URLSearchParams(filtrosLista) : params;
+  const paramsConsulta = new URLSearchParams(paramsLista);
+  if (soResumo) {
+    paramsConsulta.append("detalhes", "0");
+  } else {
+    paramsConsulta.append("limite", TAMANHO_PAGINA);
+  }
+
+  try {
+    const [dados] = await Promise.all([
+      buscarFinanceiro("", paramsConsulta),
+      carregarServicos(paramsLista),
+    ]);
+    dadosFinanceiros = dados;
+    if (!soResumo) {
+      filtrosLista = params.toString();
+      agendamentosCarregados = dados.agendamentos;
+      proximoCursor = dados.proximo_cursor;
+    }
 
     // Atualizar interface
     atualizarResumo();
@@ -100,6 +134,42 @@ async function carregarDadosFinanceiros() {
   }
 }
 
+// Próxima página da lista detalhada (cursor devolvido pela API)
+async function carregarMaisAgendamentos() {
+  if (!proximoCursor) return;
+
+  const botao = document.getElementById("btn-carregar-mais");
+  botao.disabled = true;
+
+  const params = new URLSearchParams(filtrosLista);
+  params.append("limite", TAMANHO_PAGINA);
+  params.append("cursor", proximoCursor);
+
+  try {
+    const dados = await buscarFinanceiro("", params);
+    agendamentosCarregados = agendamentosCarregados.concat(dados.agendamentos);
+    proximoCursor = dados.proximo_cursor;
+    atualizarTabelaDetalhada();
+  } catch (error) {
+    console.error("Erro ao carregar mais agendamentos:", error);
+  } finally {
+    botao.disabled = false;
+  }
+}
+
+// Faturamento e ocupação por serviço (sem mês/datas a API usa o mês atual)
+async function carregarServicos(params) {
+  const tbody = document.getElementById("tabela-servico");
+  try {
+    const dados = await buscarFinanceiro("/servicos", params);
+    atualizarTabelaServicos(dados);
+  } catch (error) {
+    console.error("Erro ao carregar financeiro por serviço:", error);
+    tbody.innerHTML =
+      '<tr><td colspan="5" class="empty-state">Erro ao carregar</td></tr>';
+  }
+}
+
 // Atualizar cards de resumo
 function atualizarResumo() {
   if (!dadosFinanceiros || !dadosFinanceiros.resumo) return;
@@ -278,12 +348,49 @@ function atualizarTabelasResumo() {
   }
 }
 
+// Atualizar tabela por serviço
+function atualizarTabelaServicos(dados) {
+  const tbody = document.getElementById("tabela-servico");
+  const servicos = dados.servicos || [];
+
+  const formatarData = (data) =>
+    new Date(data + "T00:00:00").toLocaleDateString("pt-BR");
+  document.getElementById("periodo-servico").textContent =
+    `${formatarData(dados.data_inicio)} a ${formatarData(dados.data_fim)}`;
+
+  if (servicos.length === 0) {
+    tbody.innerHTML =
+      '<tr><td colspan="5" class="empty-state">Nenhum dado</td></tr>';
+    return;
+  }
+
+  tbody.innerHTML = servicos
+    .map((servico) => {
+      const ocupacao =
+        servico.ocupacao === null
+          ? "-"
+          : `${(servico.ocupacao * 100).toFixed(1).replace(".", ",")}%`;
+      return `
+                <tr>
+                    <td>${servico.nome}</td>
+                    <td>${servico.quantidade}</td>
+                    <td>${servico.minutos}</td>
+                    <td>${ocupacao}</td>
+                    <td class="valor">${formatarMoeda(servico.total)}</td>
+                </tr>
+            `;
+    })
+    .join("");
+}
+
 // Atualizar tabela detalhada
 function atualizarTabelaDetalhada() {
-  if (!dadosFinanceiros || !dadosFinanceiros.agendamentos) return;
-
   const tbody = document.getElementById("tabela-detalhada-body");
-  const agendamentos = dadosFinanceiros.agendamentos;
+  const agendamentos = agendamentosCarregados;
+
+  document.getElementById("btn-carregar-mais").style.display = proximoCursor
+    ? "inline-block"
+    : "none";
 
   if (agendamentos.length === 0) {
     tbody.innerHTML = `
@@ -384,5 +491,5 @@ function formatarMoeda(valor) {
   await carregarDadosFinanceiros();
 
   // Auto-atualizar a cada 30 segundos
-  setInterval(carregarDadosFinanceiros, 30000);
+  setInterval(() => carregarDadosFinanceiros({ manterLista: true }), 30000);
 })();